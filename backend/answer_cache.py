@@ -0,0 +1,270 @@
+"""
+Semantic Answer Cache
+LLM answers to /ask reused across farmers asking the same thing about soil in the same condition
+
+An answer is looked up by the question's embedding (cosine similarity at
+least the threshold for the embedding model) within a partition that
+must match exactly:
+    - the configured LLM provider
+    - the embedding model (vectors from different models are not comparable)
+    - the state bucket: status_n / status_p / status_k, moisture band and crop
+    - the nutrient and crop words in the question, so "kitna urea dalu?" never
+      returns the answer to "kitna DAP dalu?" however close the vectors are
+    - the retrieval filter (metadata_filter), which also carries the region
+
+Answers are shared between farmers, so a cacheable answer must depend on
+nothing but its key: /ask then describes the soil to the LLM through
+``describe_bucket`` (status bands and the moisture range) instead of the
+farmer's exact readings, which never reach another user.
+
+Entries expire after ANSWER_CACHE_TTL seconds and are evicted least
+recently used first once there are more than ANSWER_CACHE_MAX_ENTRIES or
+their estimated size exceeds ANSWER_CACHE_MAX_BYTES. The cache is per API
+process and in memory only; answers drawn from an older knowledge base
+age out within one TTL of re-indexing.
+"""
+
+import os
+import re
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from pathway_pipeline.metadata_filter import CROP_ALIASES, CROP_WORDS, NUTRIENT_WORDS, describe
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") != "0"
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2048"))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# Minimum cosine similarity for a hit. Hashing embeddings score spelling variants
+# ("dalu" / "daalu") around 0.85 and different questions at most ~0.75; dense
+# models put unrelated farming questions higher, so they need a higher bar.
+DEFAULT_SIMILARITY = 0.92
+SIMILARITY_BY_PROVIDER = {"mock": 0.85}
+SIMILARITY_OVERRIDE = os.getenv("ANSWER_CACHE_SIMILARITY")
+# Moisture band edges (%): soil_twin_state's low/high and the rule engine's dry/saturated
+MOISTURE_EDGES = (15, 30, 35, 80)
+# status column -> (label, low, high) in kg/ha, as in soil_twin_state.THRESHOLDS
+NUTRIENT_BANDS = {
+    "status_n": ("Nitrogen", 280, 560),
+    "status_p": ("Phosphorus", 11, 22),
+    "status_k": ("Potassium", 120, 280),
+}
+ENTRY_OVERHEAD_BYTES = 256          # dict, tuple and key objects per entry, roughly
+
+WORD_RE = re.compile(r"\w+")
+CUE_WORDS = {cue: nutrient for nutrient, cues in NUTRIENT_WORDS.items() for cue in cues}
+CUE_WORDS.update({crop: CROP_ALIASES.get(crop, crop) for crop in CROP_WORDS})
+
+
+def state_bucket(state: Optional[dict]) -> tuple:
+    """The parts of the live soil state an answer depends on, discretised."""
+    state = state if isinstance(state, dict) else {}
+    try:
+        moisture = bisect_right(MOISTURE_EDGES, float(state.get("moisture")))
+    except (TypeError, ValueError):
+        moisture = None
+    return (
+        str(state.get("status_n", "")).lower(),
+        str(state.get("status_p", "")).lower(),
+        str(state.get("status_k", "")).lower(),
+        moisture,
+        str(state.get("crop") or "").lower(),
+    )
+
+
+def describe_bucket(bucket: tuple) -> str:
+    """Prompt lines for a state bucket: bands and ranges, never the readings themselves."""
+    lines = []
+    for (label, low, high), status in zip(NUTRIENT_BANDS.values(), bucket[:3]):
+        band = {
+            "red": f"low (below {low} kg/ha) (red)",
+            "yellow": f"medium ({low}-{high} kg/ha) (yellow)",
+            "green": f"sufficient (above {high} kg/ha) (green)",
+        }.get(status, "unknown")
+        lines.append(f"{label}: {band}")
+    moisture = bucket[3]
+    if moisture is None:
+        lines.append("Moisture: unknown")
+    else:
+        edges = (None,) + MOISTURE_EDGES + (None,)
+        low, high = edges[moisture], edges[moisture + 1]
+        band = f"below {high}%" if low is None else f"above {low}%" if high is None else f"{low}-{high}%"
+        lines.append(f"Moisture: {band}")
+    if bucket[4]:
+        lines.append(f"Crop: {bucket[4]}")
+    return "\n".join(lines)
+
+
+def question_cues(text: str) -> tuple:
+    """Nutrients and crops the question names (urea -> nitrogen, paddy -> rice)."""
+    return tuple(sorted({CUE_WORDS[word] for word in WORD_RE.findall(text.lower()) if word in CUE_WORDS}))
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(WORD_RE.findall(text.lower()))
+
+
+class _Entry:
+    __slots__ = ("partition", "question", "vector", "response", "created", "compute_seconds", "size", "hits")
+
+    def __init__(self, partition, question, vector, response, compute_seconds):
+        self.partition = partition
+        self.question = question
+        self.vector = vector
+        self.response = response
+        self.created = time.monotonic()
+        self.compute_seconds = compute_seconds
+        self.size = (ENTRY_OVERHEAD_BYTES + len(question.encode("utf-8"))
+                     + (vector.nbytes if vector is not None else 0)
+                     + sum(len(str(value).encode("utf-8")) for value in response.values()))
+        self.hits = 0
+
+
+class AnswerCache:
+    """
+    ``lookup`` returns a cached response (with ``cached: True``) or None;
+    ``store`` records a freshly computed one with the seconds it took, which
+    is what each later hit is counted as saving.
+    """
+
+    def __init__(self, ttl: float = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 max_bytes: int = ANSWER_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()     # LRU order, oldest first
+        # partition -> entry ids, and the stacked unit vectors of those that have one
+        self._partitions: Dict[tuple, Dict[int, _Entry]] = {}
+        self._matrices: Dict[tuple, Tuple[list, np.ndarray]] = {}
+        self._next_id = 0
+        self.bytes = 0
+
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_seconds = 0.0
+        self.lookup_seconds = 0.0
+
+    @staticmethod
+    def threshold(embedding_provider: Optional[str]) -> float:
+        if SIMILARITY_OVERRIDE:
+            return float(SIMILARITY_OVERRIDE)
+        return SIMILARITY_BY_PROVIDER.get(embedding_provider, DEFAULT_SIMILARITY)
+
+    @staticmethod
+    def partition(llm_provider: str, embedding_model: Optional[str], state: Optional[dict], question: str,
+                  filters: Optional[dict] = None) -> tuple:
+        return (llm_provider, embedding_model, state_bucket(state), question_cues(question), describe(filters or {}))
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        self.bytes -= entry.size
+        members = self._partitions[entry.partition]
+        del members[entry_id]
+        if not members:
+            del self._partitions[entry.partition]
+        self._matrices.pop(entry.partition, None)
+
+    def _matrix(self, partition: tuple) -> Tuple[list, Optional[np.ndarray]]:
+        cached = self._matrices.get(partition)
+        if cached is None:
+            ids = [entry_id for entry_id, entry in self._partitions[partition].items() if entry.vector is not None]
+            matrix = np.stack([self._entries[i].vector for i in ids]) if ids else None
+            cached = self._matrices[partition] = (ids, matrix)
+        return cached
+
+    def lookup(self, partition: tuple, question: str, vector=None, threshold: float = DEFAULT_SIMILARITY) -> Optional[dict]:
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                members = self._partitions.get(partition)
+                best = None
+                if members:
+                    now = time.monotonic()
+                    for entry_id in [i for i, entry in members.items() if now - entry.created > self.ttl]:
+                        self._remove(entry_id)
+                        self.expirations += 1
+                    members = self._partitions.get(partition)
+                if members:
+                    text = normalize_question(question)
+                    best = next((i for i, entry in members.items() if entry.question == text), None)
+                    similarity = 1.0
+                    if best is not None:
+                        self.exact_hits += 1
+                    elif vector is not None:
+                        ids, matrix = self._matrix(partition)
+                        query = _unit(vector)
+                        if matrix is not None and query is not None and query.shape[0] == matrix.shape[1]:
+                            scores = matrix @ query
+                            top = int(np.argmax(scores))
+                            if scores[top] >= threshold:
+                                best, similarity = ids[top], float(scores[top])
+                if best is None:
+                    self.misses += 1
+                    return None
+                entry = self._entries[best]
+                self._entries.move_to_end(best)
+                entry.hits += 1
+                self.hits += 1
+                self.saved_seconds += entry.compute_seconds
+                return {**entry.response, "cached": True, "similarity": round(similarity, 4)}
+        finally:
+            self.lookup_seconds += time.perf_counter() - start
+
+    def store(self, partition: tuple, question: str, vector, response: dict, compute_seconds: float):
+        entry = _Entry(partition, normalize_question(question), _unit(vector), dict(response), compute_seconds)
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._partitions.setdefault(partition, {})[entry_id] = entry
+            self._matrices.pop(partition, None)
+            self.bytes += entry.size
+            now = time.monotonic()
+            while self._entries:
+                oldest_id, oldest = next(iter(self._entries.items()))
+                if now - oldest.created > self.ttl:
+                    self.expirations += 1
+                elif len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                    self.evictions += 1
+                else:
+                    break
+                self._remove(oldest_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "partitions": len(self._partitions),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "exact_hits": self.exact_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "avg_saved_ms": round(self.saved_seconds / self.hits * 1000, 1) if self.hits else None,
+            "avg_lookup_ms": round(self.lookup_seconds / lookups * 1000, 3) if lookups else None,
+        }
+
+
+def _unit(vector) -> Optional[np.ndarray]:
+    if vector is None:
+        return None
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else None
@@ -1,19 +1,33 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Request
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Request, Response, Query
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List
 from datetime import datetime
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+import asyncio
 import json
 import os
+import time
 import boto3
 import uuid
 from botocore.exceptions import NoCredentialsError
 from fastapi import File, UploadFile, Form
 
 # Local imports
-from .simulation_engine import process_event
+from .simulation_engine import (
+    apply_event, simulate_cached, state_vector, STATE_FIELDS,
+    project_rain_uncertainty, PROJECTION_BANDS, MOISTURE_IRRIGATE_BELOW,
+)
+from pathway_pipeline.weather_api import get_daily_rain_forecast
+from .state_index import SoilStateIndex
+from .pipeline_client import PipelineStateClient, PipelineUnavailable
+from .event_writer import EventWriter
+from .state_latency import StateLatencyTracker
+from .answer_cache import AnswerCache, ANSWER_CACHE_ENABLED, describe_bucket, state_bucket
+from pathway_pipeline.vector_index import rag_index
+from pathway_pipeline.metadata_filter import filter_from_state, describe as describe_filter
+from pathway_pipeline.event_log import EventLog, encode_cursor, decode_cursor
 from .auth import (
     authenticate_user,
     create_access_token,
@@ -30,15 +44,23 @@ router = APIRouter()
 # Rate limiter for API endpoints
 limiter = Limiter(key_func=get_remote_address)
 
-# Output file for Pathway state
+# Live state comes from the pipeline's query endpoint; the CSV sink is only
+# a fallback for when the pipeline is down or runs without the endpoint
+pipeline_client = PipelineStateClient()
 OUTPUT_FILE = "./data/current_state.csv"
+state_index = SoilStateIndex(OUTPUT_FILE)
+
+# Segmented event log shared with the Pathway pipeline (replaces the per-type JSONL files)
+event_log = EventLog()
+# All request handlers append through this one background writer
+event_writer = EventWriter(event_log)
+# Event ingest -> first state row that reflects it (see GET /events/latency)
+state_latency = StateLatencyTracker()
+# /ask answers reused for near-identical questions about soil in the same condition (see GET /ask/cache)
+answer_cache = AnswerCache()
 
 # S3 Configuration for soil report uploads
-<<<<<<< HEAD
 S3_BUCKET = "soiltwin-farmers-reports"        # Replace with your actual bucket name
-=======
-S3_BUCKET = "soiltwin-uploads"        # Replace with your actual bucket name
->>>>>>> a56eb9e9a4584140f3a4cf2900e4e33289fe194a
 S3_REGION = "ap-south-1"              # Replace with your bucket's region
 s3_client = boto3.client('s3', region_name=S3_REGION)
 
@@ -47,12 +69,50 @@ class Event(BaseModel):
     type: str
     amount: Optional[float] = 0.0
     data: Optional[dict] = {}
+    timestamp: Optional[str] = None  # only honoured by /events/batch (replays)
+
+    @field_validator('timestamp')
+    @classmethod
+    def validate_timestamp(cls, v):
+        if v is not None:
+            datetime.fromisoformat(v)
+        return v
+
+MAX_EVENT_BATCH = 5000
+
+class EventBatch(BaseModel):
+    events: List[Event]
+
+    @field_validator('events')
+    @classmethod
+    def validate_batch_size(cls, v):
+        if not v:
+            raise ValueError('Batch must contain at least one event')
+        if len(v) > MAX_EVENT_BATCH:
+            raise ValueError(f'Batch must contain at most {MAX_EVENT_BATCH} events')
+        return v
 
 class Question(BaseModel):
     text: str
 
+class ScheduledEvent(BaseModel):
+    day: int
+    type: str
+    amount: Optional[float] = 0.0
+    subtype: Optional[str] = None  # fertilizer / amendment type, or crop for harvest
+
+MAX_SIMULATION_DAYS = 365
+
 class SimulateRequest(BaseModel):
     days: int
+    events: List[ScheduledEvent] = []
+
+    @field_validator('days')
+    @classmethod
+    def validate_days(cls, v):
+        if not 1 <= v <= MAX_SIMULATION_DAYS:
+            raise ValueError(f'days must be between 1 and {MAX_SIMULATION_DAYS}')
+        return v
 
 
 # ============================================================================
@@ -62,28 +122,6 @@ class SimulateRequest(BaseModel):
 @router.post("/login")
 @limiter.limit("5/minute")  # Max 5 login attempts per minute
 async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
-<<<<<<< HEAD
-        """
-        User login endpoint.
-        Returns JWT access token and refresh token for authentication.
-        
-        Credentials:
-        - Username: admin, Password: admin123 (admin role)
-        - Username: farmer, Password: farmer123 (farmer role)
-        """
-        user = authenticate_user(form_data.username, form_data.password)
-        if not user:
-            raise HTTPException(
-                status_code=400,
-                detail="Incorrect username or password"
-            )
-        
-        # Create JWT access token (short-lived, 30 minutes)
-        access_token = create_access_token(data={"sub": user["username"]})
-        
-        # Create refresh token (long-lived, 30 days)
-        refresh_token_info = create_refresh_token(str(user["_id"]))
-=======
     """
     User login endpoint.
     Returns JWT access token and refresh token for authentication.
@@ -178,7 +216,6 @@ async def register_user(request: Request, data: RegisterRequest):
             password=data.password,
             role="farmer"
         )
->>>>>>> a56eb9e9a4584140f3a4cf2900e4e33289fe194a
         
         return {
             "message": "Registration successful",
@@ -192,210 +229,6 @@ async def register_user(request: Request, data: RegisterRequest):
         )
 
 
-<<<<<<< HEAD
-class RegisterRequest(BaseModel):
-        username: str
-        email: EmailStr
-        fullname: str
-        password: str
-
-@router.post("/register")
-@limiter.limit("3/minute")  # Max 3 registration attempts per minute
-async def register_user(request: Request, data: RegisterRequest):
-        """
-        User registration endpoint.
-        Creates new user account with farmer role.
-        
-        Validation:
-        - Username: 3-20 characters, alphanumeric
-        - Password: Minimum 8 characters
-        - Email: Valid format
-        - Unique username and email
-        """
-        # Validate username length
-        if len(data.username) < 3 or len(data.username) > 20:
-            raise HTTPException(
-                status_code=400,
-                detail="Username must be between 3-20 characters"
-            )
-        
-        # Validate password strength
-        if len(data.password) < 8:
-            raise HTTPException(
-                status_code=400,
-                detail="Password must be at least 8 characters"
-            )
-        
-        # Check if password has at least one number
-        if not any(char.isdigit() for char in data.password):
-            raise HTTPException(
-                status_code=400,
-                detail="Password must contain at least one number"
-            )
-        
-        # Check if username already exists
-        if get_user_by_username(data.username):
-            raise HTTPException(
-                status_code=400,
-                detail="Username already taken"
-            )
-        
-        # Check if email already exists
-        if get_user_by_email(data.email):
-            raise HTTPException(
-                status_code=400,
-                detail="Email already registered"
-            )
-        
-        try:
-            # Create new user with farmer role
-            user = create_user(
-                username=data.username,
-                email=data.email,
-                fullname=data.fullname,
-                password=data.password,
-                role="farmer"
-            )
-            
-            return {
-                "message": "Registration successful",
-                "username": data.username,
-                "email": data.email
-            }
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Registration failed: {str(e)}"
-            )
-
-
-class ForgotPasswordRequest(BaseModel):
-        email: EmailStr
-
-@router.post("/forgot-password")
-@limiter.limit("3/minute")  # Max 3 forgot password attempts per minute
-async def forgot_password(request: Request, data: ForgotPasswordRequest):
-        """
-        Forgot password endpoint.
-        Generates a 6-digit reset token for the user.
-        
-        In production, this would send an email with the token.
-        For development, the token is returned in the response.
-        """
-        # Find user by email
-        user = get_user_by_email(data.email)
-        if not user:
-            # Don't reveal if email exists - return success anyway
-            return {
-                "message": "If that email exists, a reset code has been sent",
-                "token": None  # In production, don't return token
-            }
-        
-        try:
-            # Create reset token
-            token_info = create_reset_token(user["_id"])
-            
-            # In production: Send email with token_info["token"]
-            # For now, return it in response for testing
-            
-            return {
-                "message": "Reset code generated successfully",
-                "token": token_info["token"],  # Remove in production
-                "expires_in": "15 minutes"
-            }
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to generate reset token: {str(e)}"
-            )
-
-
-class ResetPasswordRequest(BaseModel):
-        email: EmailStr
-        token: str
-        new_password: str
-
-@router.post("/reset-password")
-@limiter.limit("5/minute")  # Max 5 reset attempts per minute
-async def reset_password(request: Request, data: ResetPasswordRequest):
-        """
-        Reset password endpoint.
-        Verifies the reset token and updates the password.
-        """
-        # Find user by email
-        user = get_user_by_email(data.email)
-        if not user:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid email or token"
-            )
-        
-        # Validate new password
-        if len(data.new_password) < 8:
-            raise HTTPException(
-                status_code=400,
-                detail="Password must be at least 8 characters"
-            )
-        
-        if not any(char.isdigit() for char in data.new_password):
-            raise HTTPException(
-                status_code=400,
-                detail="Password must contain at least one number"
-            )
-        
-        # Verify reset token
-        if not verify_reset_token(user["_id"], data.token):
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid or expired reset token"
-            )
-        
-        try:
-            # Update password
-            update_user_password(user["_id"], data.new_password)
-            
-            # Mark token as used
-            mark_token_used(user["_id"], data.token)
-            
-            return {
-                "message": "Password reset successful",
-                "username": user["username"]
-            }
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Password reset failed: {str(e)}"
-            )
-
-
-class RefreshTokenRequest(BaseModel):
-        refresh_token: str
-
-@router.post("/refresh")
-async def refresh_access_token(data: RefreshTokenRequest):
-        """
-        Refresh access token endpoint.
-        Takes a valid refresh token and returns a new access token.
-        """
-        # Verify refresh token
-        token_doc = verify_refresh_token(data.refresh_token)
-        if not token_doc:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid or expired refresh token"
-            )
-        
-        # Get user by ID
-        user = get_user_by_id(token_doc["user_id"])
-        if not user:
-            raise HTTPException(
-                status_code=404,
-                detail="User not found"
-            )
-        
-        # Create new access token
-        access_token = create_access_token(data={"sub": user["username"]})
-=======
 class ForgotPasswordRequest(BaseModel):
     email: EmailStr
 
@@ -424,7 +257,6 @@ async def forgot_password(request: Request, data: ForgotPasswordRequest):
         
         # In production: Send email with token_info["token"]
         # For now, return it in response for testing
->>>>>>> a56eb9e9a4584140f3a4cf2900e4e33289fe194a
         
         return {
             "message": "Reset code generated successfully",
@@ -438,15 +270,6 @@ async def forgot_password(request: Request, data: ForgotPasswordRequest):
         )
 
 
-<<<<<<< HEAD
-@router.post("/logout")
-async def logout(data: RefreshTokenRequest):
-        """
-        Logout endpoint.
-        Revokes the refresh token to prevent future refreshes.
-        """
-        revoked = revoke_refresh_token(data.refresh_token)
-=======
 class ResetPasswordRequest(BaseModel):
     email: EmailStr
     token: str
@@ -493,7 +316,6 @@ async def reset_password(request: Request, data: ResetPasswordRequest):
         
         # Mark token as used
         mark_token_used(user["_id"], data.token)
->>>>>>> a56eb9e9a4584140f3a4cf2900e4e33289fe194a
         
         return {
             "message": "Password reset successful",
@@ -506,15 +328,6 @@ async def reset_password(request: Request, data: ResetPasswordRequest):
         )
 
 
-<<<<<<< HEAD
-@router.get("/me")
-async def read_users_me(current_user: dict = Depends(get_current_active_user)):
-        """
-        Get current authenticated user profile.
-        Requires valid JWT token.
-        """
-        return current_user
-=======
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
@@ -548,7 +361,6 @@ async def refresh_access_token(data: RefreshTokenRequest):
         "token_type": "bearer",
         "expires_in": 1800  # 30 minutes
     }
->>>>>>> a56eb9e9a4584140f3a4cf2900e4e33289fe194a
 
 
 @router.post("/logout")
@@ -581,27 +393,6 @@ async def read_users_me(current_user: dict = Depends(get_current_active_user)):
 
 @router.get("/profile")
 def get_profile(current_user: str = Depends(get_current_user)):
-<<<<<<< HEAD
-        """
-        Returns the current farmer profile.
-        """
-        # For now, we still read the single profile.json but could easily multiplex
-        if not os.path.exists("./data/profile.json"):
-            return {"status": "No profile", "data": None}
-        
-        with open("./data/profile.json", "r") as f:
-            data = json.load(f)
-            # Mock override for farmer2 to show different location
-            if isinstance(current_user, dict):
-                c_username = current_user.get("username")
-            else:
-                c_username = current_user
-
-            if c_username == "farmer2": 
-                data["location"] = "Ludhiana,IN"
-                data["name"] = "Suresh Singh"
-            return {"status": "Found", "data": data}
-=======
     """
     Returns the current farmer profile.
     """
@@ -622,7 +413,6 @@ def get_profile(current_user: str = Depends(get_current_user)):
             data["name"] = "Suresh Singh"
         return {"status": "Found", "data": data}
     
->>>>>>> a56eb9e9a4584140f3a4cf2900e4e33289fe194a
 
 @router.post("/upload-soil-report")
 async def upload_soil_report(
@@ -675,306 +465,410 @@ async def upload_soil_report(
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+def read_state(user_id: str) -> tuple:
+    """
+    Latest state row for a user as (ready, row): asked of the pipeline's
+    in-memory table first, falling back to the CSV audit sink when the
+    query endpoint is unavailable. ``ready`` is False if neither exists yet.
+    """
+    try:
+        row = pipeline_client.get_state(user_id)
+        state_latency.observe(user_id, row, "pipeline")
+        return True, row
+    except PipelineUnavailable:
+        pass
+    # Index tails the CSV from its last offset and folds retractions (diff=-1),
+    # so this stays O(1) no matter how long the pipeline has been appending.
+    if not state_index.refresh():
+        return False, None
+    row = state_index.get(user_id)
+    state_latency.observe(user_id, row, "csv")
+    return True, row
+
+def observe_pending_state(user_ids: list):
+    """
+    State check behind state_latency.watch, run every 100 ms: tails the CSV
+    sink into state_index (which also keeps /events' optimistic state
+    current) and confirms users with pending events whose row changed. With
+    the sink turned off (PIPELINE_STATE_CSV=0) it asks the pipeline for
+    those users' rows instead.
+    """
+    if state_index.refresh():
+        changed = state_index.pop_changed()
+        for user_id in user_ids:
+            if user_id in changed:
+                state_latency.observe(user_id, state_index.get(user_id), "csv")
+        return
+    for user_id in user_ids:
+        try:
+            state_latency.observe(user_id, pipeline_client.get_state(user_id), "pipeline")
+        except PipelineUnavailable:
+            return
+
 @router.get("/soil-state")
 def get_soil_state(current_user: str = Depends(get_current_user)):
-<<<<<<< HEAD
-        """
-        Get current soil state. Requires authentication.
-        Returns the latest computed soil state for the logged-in user.
-        """
-        if not os.path.exists(OUTPUT_FILE):
-            return {"status": "Initializing...", "data": None}
-        
-        # Parse CSV 
-        import csv
-        with open(OUTPUT_FILE, 'r') as f:
-            reader = csv.DictReader(f)
-            # Filter for current user's state
-            # user_id column is now in CSV from pipeline
-            if isinstance(current_user, dict):
-                target_user = current_user.get("username")
-            else:
-                target_user = current_user
-                
-            # We need the LATEST state for this user.
-            # Since CSV in Pathway writes updates, we scan all rows (or read reversed if large).
-            # For small demo file, reading all is fine.
-            user_rows = [row for row in reader if row.get("user_id") == target_user]
-            
-            if user_rows:
-                return user_rows[-1] # Return last (latest) state
-                
-        return {"status": "No data", "data": None}
-
-@router.post("/events")
-def trigger_event(event: Event, current_user: str = Depends(get_current_user)):
-        """
-        Manually inject an event into the stream. Requires authentication.
-        """
-        # We append to the JSON files that Pathway is watching!
-        
-        target_file = ""
-        entry = {}
-        
-        import datetime
-        ts = datetime.datetime.now().isoformat()
-        
-        # Get user_id
-        if isinstance(current_user, dict):
-            user_id = current_user.get("username")
-        else:
-            user_id = current_user
-
-        # Handle aliases from frontend
-        if event.type == "rain25":
-            event.type = "rain"
-            if not event.data: event.data = {}
-            event.data["amount"] = 25.0
-            
-        common_fields = {"timestamp": ts, "note": "Manual trigger", "user_id": user_id}
-
-        if event.type == "rain":
-            target_file = "./data/simulated_streams/rainfall_stream.jsonl"
-            entry = {**common_fields, "rain_mm": float(event.data.get("amount", 0))}
-            
-        elif event.type == "irrigation":
-            target_file = "./data/simulated_streams/irrigation_events.jsonl"
-            entry = {**common_fields, "water_liters": float(event.data.get("liters", 0))}
-            
-        elif event.type == "fertilizer":
-            target_file = "./data/simulated_streams/fertilizer_events.jsonl"
-            entry = {
-                **common_fields,
-                "amount_kg": float(event.data.get("amount", 0)), 
-                "type": event.data.get("type", "Urea")
-            }
-
-        elif event.type == "harvest":
-            target_file = "./data/simulated_streams/crop_events.json" # Not migrated yet
-            entry = {
-                **common_fields,
-                "event": "harvest",
-                "crop_name": event.data.get("crop", "Wheat"),
-                "yield_tons": 4.0
-            }
-
-        elif event.type == "amendment":
-            target_file = "./data/simulated_streams/soil_amendments.json" # Not migrated
-            entry = {
-                **common_fields,
-                "type": event.data.get("type", "manure"),
-                "amount_kg": float(event.data.get("amount", 0))
-            }
-        
-        if target_file and entry:
-            # Append to JSONL file (Efficient)
-            try:
-                with open(target_file, 'a') as f:
-                    f.write(json.dumps(entry) + "\n")
-                
-                # FAST PATH: Optimistic UI Update.
-                # We calculate what the state *should* be and return it immediately.
-                # The actual persistent state will be updated by Pathway (Single Source of Truth) asynchronously.
-                new_state = process_event(event.type, event.data)
-                
-                return {"status": "Event Injected", "event": entry, "new_state": new_state}
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
-                
-        return {"status": "Ignored", "detail": "Unknown event type"}
-
-@router.get("/history")
-def get_history_log(limit: int = 50, current_user: str = Depends(get_current_user)):
-        """
-        Fetch aggregated history of all simulated events (Rain, Irrigation, Fertilizer).
-        Reads from local JSONL files.
-        """
-        events = []
-        if isinstance(current_user, dict):
-            target_user = current_user.get("username", "farmer")
-=======
     """
     Get current soil state. Requires authentication.
     Returns the latest computed soil state for the logged-in user.
     """
-    if not os.path.exists(OUTPUT_FILE):
+    if isinstance(current_user, dict):
+        target_user = current_user.get("username")
+    else:
+        target_user = current_user
+
+    ready, row = read_state(target_user)
+    if not ready:
         return {"status": "Initializing...", "data": None}
-    
-    # Parse CSV 
-    import csv
-    with open(OUTPUT_FILE, 'r') as f:
-        reader = csv.DictReader(f)
-        # Filter for current user's state
-        # user_id column is now in CSV from pipeline
-        if isinstance(current_user, dict):
-            target_user = current_user.get("username")
->>>>>>> a56eb9e9a4584140f3a4cf2900e4e33289fe194a
-        else:
-            target_user = current_user
-            
-        # We need the LATEST state for this user.
-        # Since CSV in Pathway writes updates, we scan all rows (or read reversed if large).
-        # For small demo file, reading all is fine.
-        user_rows = [row for row in reader if row.get("user_id") == target_user]
-        
-        if user_rows:
-            return user_rows[-1] # Return last (latest) state
+    if row:
+        return row
             
     return {"status": "No data", "data": None}
 
-@router.post("/events")
-def trigger_event(event: Event, current_user: str = Depends(get_current_user)):
+def build_event_entry(event: Event, user_id: str, ts: str) -> tuple:
     """
-    Manually inject an event into the stream. Requires authentication.
+    Map an API event onto its event-log stream and record.
+    Returns ("", {}) for unknown event types.
     """
-    # We append to the JSON files that Pathway is watching!
-    
-    target_file = ""
+    stream = ""
     entry = {}
-    
-    import datetime
-    ts = datetime.datetime.now().isoformat()
-    
-    # Get user_id
-    if isinstance(current_user, dict):
-        user_id = current_user.get("username")
-    else:
-        user_id = current_user
 
     # Handle aliases from frontend
     if event.type == "rain25":
         event.type = "rain"
         if not event.data: event.data = {}
         event.data["amount"] = 25.0
-        
+
+    data = event.data or {}
     common_fields = {"timestamp": ts, "note": "Manual trigger", "user_id": user_id}
 
     if event.type == "rain":
-        target_file = "./data/simulated_streams/rainfall_stream.jsonl"
-        entry = {**common_fields, "rain_mm": float(event.data.get("amount", 0))}
+        stream = "rain"
+        entry = {**common_fields, "rain_mm": float(data.get("amount", 0))}
         
     elif event.type == "irrigation":
-        target_file = "./data/simulated_streams/irrigation_events.jsonl"
-        entry = {**common_fields, "water_liters": float(event.data.get("liters", 0))}
+        stream = "irrigation"
+        entry = {**common_fields, "water_liters": float(data.get("liters", 0))}
         
     elif event.type == "fertilizer":
-        target_file = "./data/simulated_streams/fertilizer_events.jsonl"
+        stream = "fertilizer"
         entry = {
             **common_fields,
-            "amount_kg": float(event.data.get("amount", 0)), 
-            "type": event.data.get("type", "Urea")
+            "amount_kg": float(data.get("amount", 0)), 
+            "type": data.get("type", "Urea")
         }
 
     elif event.type == "harvest":
-        target_file = "./data/simulated_streams/crop_events.json" # Not migrated yet
+        stream = "harvest"
         entry = {
             **common_fields,
             "event": "harvest",
-            "crop_name": event.data.get("crop", "Wheat"),
+            "crop_name": data.get("crop", "Wheat"),
             "yield_tons": 4.0
         }
 
     elif event.type == "amendment":
-        target_file = "./data/simulated_streams/soil_amendments.json" # Not migrated
+        stream = "amendment"
         entry = {
             **common_fields,
-            "type": event.data.get("type", "manure"),
-            "amount_kg": float(event.data.get("amount", 0))
+            "type": data.get("type", "manure"),
+            "amount_kg": float(data.get("amount", 0))
         }
+
+    return stream, entry
+
+@router.post("/simulate")
+def simulate(req: SimulateRequest, current_user: str = Depends(get_current_user)):
+    """
+    What-if projection: step the user's current soil state forward ``days``
+    days under a schedule of planned events (rain, irrigation, fertilizer,
+    harvest, amendment), using the same rules as the live pipeline.
+    Returns one state per day; day 0 is today.
+    """
+    if isinstance(current_user, dict):
+        target_user = current_user.get("username")
+    else:
+        target_user = current_user
+
+    ready, row = read_state(target_user)
+    if not ready:
+        return {"status": "Initializing...", "data": None}
+    if not row:
+        return {"status": "No data", "data": None}
+
+    events = [e.model_dump() for e in req.events]
+    trajectory = simulate_cached([state_vector(row)], req.days, events)[:, 0]
+    return {
+        "days": req.days,
+        "trajectory": [
+            {"day": day, **{field: round(float(v), 2) for field, v in zip(STATE_FIELDS, values)}}
+            for day, values in enumerate(trajectory)
+        ]
+    }
+
+@router.get("/soil-state/projection")
+def get_soil_projection(
+    days: int = Query(5, ge=1, le=14),
+    samples: int = Query(2000, ge=100, le=20000),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    "Will I need to irrigate this week?" Samples rainfall paths around the
+    weather forecast for the user's location and returns P10/P50/P90 bands
+    for moisture and nitrogen, plus the chance moisture drops below the
+    irrigation threshold on each day. Days past the forecast use climatology.
+    """
+    if isinstance(current_user, dict):
+        target_user = current_user.get("username")
+    else:
+        target_user = current_user
+
+    ready, row = read_state(target_user)
+    if not ready:
+        return {"status": "Initializing...", "data": None}
+    if not row:
+        return {"status": "No data", "data": None}
+
+    location = row.get("location") or "Karnal,IN"
+    forecast = get_daily_rain_forecast(location, days)
+    bands = project_rain_uncertainty(
+        [state_vector(row)],
+        [d["rain_mm"] for d in forecast],
+        [d["rain_probability"] for d in forecast],
+        days=days,
+        samples=samples,
+    )
+
+    def band_rows(values):
+        return {f"p{p}": [round(float(v), 2) for v in series] for p, series in zip(PROJECTION_BANDS, values)}
+
+    return {
+        "location": location,
+        "days": days,
+        "samples": samples,
+        "forecast_days": len(forecast),
+        "irrigation_threshold": MOISTURE_IRRIGATE_BELOW,
+        "rain_mm": band_rows(bands["rain"]),
+        "moisture": band_rows(bands["moisture"][:, :, 0]),
+        "nitrogen": band_rows(bands["nitrogen"][:, :, 0]),
+        "irrigate_probability": [round(float(v), 3) for v in bands["irrigate_probability"][:, 0]],
+    }
+
+@router.post("/events")
+async def trigger_event(event: Event, current_user: str = Depends(get_current_user)):
+    """
+    Manually inject an event into the stream. Requires authentication.
+    """
+    # We append to the event log that Pathway is tailing!
+    import datetime
+    ts = datetime.datetime.now().isoformat()
+    
+    # Get user_id
+    if isinstance(current_user, dict):
+        user_id = current_user.get("username")
+    else:
+        user_id = current_user
+
+    try:
+        stream, entry = build_event_entry(event, user_id, ts)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    if target_file and entry:
-        # Append to JSONL file (Efficient)
+    if stream and entry:
+        state_latency.stamp(user_id, entry)
+        # Hand the record to the background writer; it is on disk within a
+        # few milliseconds, coalesced with whatever else arrived meanwhile.
+        # A failed flush is retried there (see GET /events/writer)
         try:
-            with open(target_file, 'a') as f:
-                f.write(json.dumps(entry) + "\n")
-            
-            # FAST PATH: Optimistic UI Update.
-            # We calculate what the state *should* be and return it immediately.
-            # The actual persistent state will be updated by Pathway (Single Source of Truth) asynchronously.
-            new_state = process_event(event.type, event.data)
-            
-            return {"status": "Event Injected", "event": entry, "new_state": new_state}
+            await event_writer.submit(stream, entry)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
+
+        # FAST PATH: Optimistic UI Update.
+        # We calculate what the state *should* be and return it immediately, from
+        # the in-memory state index that the state watcher keeps current (no file
+        # reads on the request path). The actual persistent state will be updated
+        # by Pathway (Single Source of Truth) asynchronously.
+        row = state_index.get(user_id)
+        new_state = apply_event(row, event.type, event.data) if row else None
+
+        return {"status": "Event Injected", "event": entry, "new_state": new_state}
             
     return {"status": "Ignored", "detail": "Unknown event type"}
 
+@router.post("/events/batch")
+async def trigger_event_batch(batch: EventBatch, current_user: str = Depends(get_current_user)):
+    """
+    Inject many events in one request (field gateways, replay tooling). Requires authentication.
+
+    All accepted events go to the background writer as one unit and are
+    acknowledged once their group commit (one write, one fsync) is done. The optimistic state update is
+    skipped; the pipeline picks the events up from the log as usual.
+    Returns one acknowledgement per submitted event, in order.
+    """
+    import datetime
+    ts = datetime.datetime.now().isoformat()
+
+    if isinstance(current_user, dict):
+        user_id = current_user.get("username")
+    else:
+        user_id = current_user
+
+    acks = []
+    accepted = []
+    for i, event in enumerate(batch.events):
+        try:
+            stream, entry = build_event_entry(event, user_id, event.timestamp or ts)
+        except (TypeError, ValueError) as e:
+            acks.append({"index": i, "status": "Rejected", "detail": str(e)})
+            continue
+        if not (stream and entry):
+            acks.append({"index": i, "status": "Ignored", "detail": "Unknown event type"})
+            continue
+        state_latency.stamp(user_id, entry)
+        acks.append({"index": i, "status": "Event Injected", "stream": stream, "event_id": entry["event_id"]})
+        accepted.append((len(acks) - 1, stream, entry))
+
+    try:
+        offsets = await event_writer.submit_many(
+            [(stream, entry) for _, stream, entry in accepted], wait=True, sync=True
+        ) if accepted else []
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    for (ack_index, _, _), (segment, position) in zip(accepted, offsets):
+        acks[ack_index]["offset"] = f"{segment}:{position}"
+
+    return {"accepted": len(accepted), "rejected": len(acks) - len(accepted), "results": acks}
+
+@router.get("/events/writer")
+def get_event_writer_stats(current_user: str = Depends(get_current_user)):
+    """Queue depth and flush latency of this process's background event writer."""
+    return event_writer.stats()
+
+@router.get("/events/latency")
+def get_event_latency(current_user: str = Depends(get_current_user)):
+    """
+    Event-to-state latency seen by this API process: p50/p95/p99 ms from
+    accepting an event to the first state row that reflects it, overall
+    and per source (pipeline query endpoint vs current_state.csv fallback).
+    """
+    return state_latency.stats()
+
+@router.get("/rag/stats")
+def get_rag_stats(current_user: str = Depends(get_current_user)):
+    """Retrieval index size and reloads, plus embedding cache hit rate and latency, for this process."""
+    return rag_index.stats()
+
+@router.get("/ask/cache")
+def get_answer_cache_stats(current_user: str = Depends(get_current_user)):
+    """/ask answer cache hit rate, LLM time saved, size and evictions, for this process."""
+    return answer_cache.stats()
+
+def _answer_cache_key(question: str, state: dict, llm_provider: str, rag_filter: dict):
+    """(partition, question embedding, similarity threshold) for the answer cache."""
+    rag_index.refresh()
+    embedder = rag_index.embedder
+    vector = embedder.embed(question)
+    partition = AnswerCache.partition(llm_provider, getattr(embedder, "model_name", None), state, question, rag_filter)
+    return partition, vector, AnswerCache.threshold(embedder.provider)
+
+# stream -> (frontend label, subtype, amount field, unit, operator)
+HISTORY_FORMAT = {
+    "rain": ("Rainfall", "Natural", "rain_mm", "mm", "Cloud Node"),
+    "irrigation": ("Irrigation", "Tube Well", "water_liters", "L", "Smart Valve"),
+    "fertilizer": ("Fertilizer", "Standard", "amount_kg", "kg", "User/System"),
+    "harvest": ("Harvest", None, "yield_tons", "t", "User/System"),
+    "amendment": ("Amendment", None, "amount_kg", "kg", "User/System"),
+}
+
+def format_history_event(data: dict) -> dict:
+    """Normalize an event-log record for the frontend history table."""
+    label, subtype, amount_key, unit, operator = HISTORY_FORMAT[data["stream"]]
+    if subtype is None:
+        subtype = data.get("crop_name") or data.get("type") or "General"
+    return {
+        "id": str(int(float(datetime.fromisoformat(data["timestamp"]).timestamp() * 1000))), # diverse ID
+        "timestamp": data["timestamp"],
+        "type": label,
+        "subtype": subtype,
+        "amount": f"{data.get(amount_key, 0)} {unit}",
+        "status": "Logged",
+        "operator": operator
+    }
+
+def parse_history_bound(value: Optional[str], name: str) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"'{name}' must be an ISO timestamp")
+
 @router.get("/history")
-def get_history_log(limit: int = 50, current_user: str = Depends(get_current_user)):
+def get_history_log(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    current_user: str = Depends(get_current_user)
+):
     """
-    Fetch aggregated history of all simulated events (Rain, Irrigation, Fertilizer).
-    Reads from local JSONL files.
+    Fetch aggregated history of all simulated events (Rain, Irrigation, Fertilizer, Harvest, Amendment).
+
+    Newest first, one page at a time. Every event carries an opaque ``cursor``;
+    pass the last one as ``?before=`` for the next (older) page, or the first
+    one as ``?after=`` to pick up newer events. ``from``/``to`` restrict the
+    page to an ISO time range. ``X-Next-Cursor`` is set while older events remain.
     """
     events = []
     if isinstance(current_user, dict):
         target_user = current_user.get("username", "farmer")
     else:
         target_user = current_user
-    
-    # helper to read jsonl
-    def read_jsonl(filepath, event_type, subtype_key=None, amount_key=None):
-        if not os.path.exists(filepath): return
-        
-        with open(filepath, 'r') as f:
-            for line in f:
-                try:
-                    data = json.loads(line.strip())
-                    
-                    # Filter by user
-                    if data.get("user_id", "farmer") != target_user:
-                        continue
-                        
-                    # Normalize for frontend
-                    evt = {
-                        "id": str(int(float(datetime.fromisoformat(data["timestamp"]).timestamp() * 1000))), # diverse ID
-                        "timestamp": data["timestamp"],
-                        "type": event_type,
-                        "subtype": data.get(subtype_key, "General") if subtype_key else "Standard",
-                        "amount": f"{data.get(amount_key, 0)}", # keep simple
-                        "status": "Logged",
-                        "operator": "User/System"
-                    }
-                    
-                    # Custom formatting for specific types
-                    if event_type == "Rainfall":
-                        evt["subtype"] = "Natural"
-                        evt["amount"] = f"{data.get('rain_mm', 0)} mm"
-                        evt["operator"] = "Cloud Node"
-                    elif event_type == "Irrigation":
-                        evt["subtype"] = "Tube Well"
-                        evt["amount"] = f"{data.get('water_liters', 0)} L"
-                        evt["operator"] = "Smart Valve"
-                    elif event_type == "Fertilizer":
-                        # fertilizer_events.jsonl: {"amount_kg": 20, ...} 
-                        evt["amount"] = f"{data.get('amount_kg', 0)} kg"
-                        
-                    events.append(evt)
-                except Exception as e:
-                    # print(f"Error parsing line in {filepath}: {e}")
-                    continue
-
-    # Read all streams
-    read_jsonl("./data/simulated_streams/rainfall_stream.jsonl", "Rainfall", amount_key="rain_mm")
-    read_jsonl("./data/simulated_streams/irrigation_events.jsonl", "Irrigation", amount_key="water_liters")
-    read_jsonl("./data/simulated_streams/fertilizer_events.jsonl", "Fertilizer", amount_key="amount_kg")
-    
-    # Sort by timestamp desc
-    events.sort(key=lambda x: x["timestamp"], reverse=True)
-    
-    return events[:limit]
+
+    try:
+        before_entry = decode_cursor(before) if before else None
+        after_entry = decode_cursor(after) if after else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Newer-than-cursor pages are read oldest-first so they stay adjacent to
+    # the cursor, then flipped to match the newest-first order of every page
+    records = event_log.iter_user(
+        target_user,
+        reverse=after_entry is None,
+        start_ts=parse_history_bound(start, "from"),
+        end_ts=parse_history_bound(end, "to"),
+        before=before_entry,
+        after=after_entry,
+    )
+
+    has_more = False
+    for entry, data in records:
+        if len(events) == limit:
+            has_more = True
+            break
+        try:
+            event = format_history_event(data)
+        except Exception as e:
+            print(f"⚠️  Skipping unreadable history event for {target_user}: {e}")
+            continue
+        event["cursor"] = encode_cursor(entry)
+        events.append(event)
+    records.close()
+
+    if after_entry is not None:
+        events.reverse()
+    elif has_more and events:
+        response.headers["X-Next-Cursor"] = events[-1]["cursor"]
+
+    return events
 
 
 @router.get("/external/ogd/{resource_id}")
 async def get_ogd_data(resource_id: str):
-<<<<<<< HEAD
-        """
-        Proxy to fetch data from data.gov.in using the server-side API key.
-        Usage: GET /api/external/ogd/<resource_id>
-        """
-        api_key =os.getenv("DATA_GOV_IN_API_KEY")
-        if not api_key:
-            raise HTTPException(status_code=500, detail="OGD API Key not configured on server")
-=======
     """
     Proxy to fetch data from data.gov.in using the server-side API key.
     Usage: GET /api/external/ogd/<resource_id>
@@ -988,7 +882,6 @@ async def get_ogd_data(resource_id: str):
     try:
         import urllib.request
         import json
->>>>>>> a56eb9e9a4584140f3a4cf2900e4e33289fe194a
         
         with urllib.request.urlopen(url) as response:
             if response.status != 200:
@@ -1002,14 +895,6 @@ async def get_ogd_data(resource_id: str):
 
 @router.get("/external/weather")
 async def get_weather_data(location: str = "Ludhiana,IN"):
-<<<<<<< HEAD
-        """
-        Fetches real-time weather from OpenWeatherMap.
-        """
-        api_key = os.getenv("OPENWEATHER_API_KEY")
-        if not api_key:
-            # Fallback for demo if key missing
-=======
     """
     Fetches real-time weather from OpenWeatherMap.
     """
@@ -1052,7 +937,6 @@ async def get_weather_data(location: str = "Ludhiana,IN"):
             elif hum < 30: impact = "High Evaporation Risk"
             elif hum > 80: impact = "Fungal Risk High"
             
->>>>>>> a56eb9e9a4584140f3a4cf2900e4e33289fe194a
             return {
                 "temp": data.get("main", {}).get("temp"),
                 "humidity": hum,
@@ -1077,17 +961,6 @@ async def get_weather_data(location: str = "Ludhiana,IN"):
 @router.post("/ask")
 @limiter.limit("10/minute")  # Max 10 questions per minute
 async def ask_question(request: Request, q: Question, current_user: str = Depends(get_current_user)):
-<<<<<<< HEAD
-        """
-        RAG-based Question Answering with Pathway-Native Vector Retrieval.
-        Uses Pathway's streaming vector engine for semantic search.
-        Requires authentication.
-        RAG-based Question Answering with Pathway-Native Vector Retrieval.
-        Uses Pathway's streaming vector engine for semantic search.
-        """
-        # 1. Get Current State
-        state = get_soil_state()
-=======
     """
     RAG-based Question Answering with Pathway-Native Vector Retrieval.
     Uses Pathway's streaming vector engine for semantic search.
@@ -1095,29 +968,37 @@ async def ask_question(request: Request, q: Question, current_user: str = Depend
     RAG-based Question Answering with Pathway-Native Vector Retrieval.
     Uses Pathway's streaming vector engine for semantic search.
     """
-    # 1. Get Current State
-    state = get_soil_state()
+    started = time.perf_counter()
+    # 1. Get Current State (a blocking pipeline query, so off the event loop)
+    state = await asyncio.to_thread(get_soil_state, current_user)
+    llm_provider = os.getenv("LLM_PROVIDER", "openai").lower()
+    rag_filter = filter_from_state(state, q.text)
+
+    # Same question (by embedding similarity) about soil in the same status/moisture
+    # bucket, answered by the same provider: reuse the answer, skipping retrieval and the LLM
+    cache_key = None
+    if ANSWER_CACHE_ENABLED:
+        try:
+            cache_key = await asyncio.to_thread(_answer_cache_key, q.text, state, llm_provider, rag_filter)
+            cached = answer_cache.lookup(cache_key[0], q.text, cache_key[1], cache_key[2])
+            if cached is not None:
+                print(f"⚡ Answer cache hit (similarity {cached['similarity']})")
+                return cached
+        except Exception as e:
+            print(f"⚠️  Answer cache unavailable: {e}")
     
-    # 2. RAG Retrieval - Use Pathway vector store
+    # 2. RAG Retrieval - in-process index over the precomputed chunk embeddings
+    # (cache/rag_index/, memory-mapped and hot-reloaded) fused with BM25 over docs/ and the
+    # seed knowledge base; no vector server round trip. Chunks tagged for another
+    # nutrient, crop or region than this farmer's are pruned before scoring.
     try:
-        from pathway_pipeline.rag_store import query_vector_store, setup_rag_store
->>>>>>> a56eb9e9a4584140f3a4cf2900e4e33289fe194a
-        
-        # Initialize vector store (cached after first call)
-        if not hasattr(ask_question, 'vector_store'):
-            print("🔧 Initializing Pathway vector store...")
-            ask_question.vector_store = setup_rag_store("./docs")
-        
-        # Query for relevant documents
-        relevant_chunks = query_vector_store (ask_question.vector_store, q.text, k=3)
-        
-        if relevant_chunks:
-            guidelines = "\n\n".join(relevant_chunks)
-            print(f"✅ Retrieved {len(relevant_chunks)} chunks via Pathway vector search")
-        else:
-            # Fallback if no results
-            guidelines = "Agricultural guidelines unavailable."
-            
+        print(f"🔎 Retrieval filter: {describe_filter(rag_filter)}")
+        relevant_chunks = await asyncio.to_thread(rag_index.hybrid_query, q.text, 3, rag_filter)
+        if not relevant_chunks:
+            raise LookupError("hybrid retrieval returned no chunks")
+        guidelines = "\n\n".join(relevant_chunks)
+        print(f"✅ Retrieved {len(relevant_chunks)} chunks (vector + BM25)")
+
     except Exception as e:
         print(f"RAG Error: {e}. Using direct file loading...")
         # Ultimate fallback: direct file reading
@@ -1130,16 +1011,22 @@ async def ask_question(request: Request, q: Question, current_user: str = Depend
         except:
             guidelines = "Guidelines unavailable."
 
-    # 3. Build shared prompt (used by all LLM providers)
+    # 3. Build shared prompt (used by all LLM providers). A cacheable answer is shared
+    # with every farmer in the same bucket, so it only sees the bucket, not this
+    # farmer's readings.
+    if cache_key is not None:
+        soil_status = describe_bucket(state_bucket(state))
+    else:
+        soil_status = f"""Nitrogen: {state.get('nitrogen')} kg/ha ({state.get('status_n')})
+Phosphorus: {state.get('phosphorus')} kg/ha ({state.get('status_p')})
+Potassium: {state.get('potassium')} kg/ha ({state.get('status_k')})
+Moisture: {state.get('moisture')}%"""
     prompt_system = "You are an agricultural expert helping an Indian farmer."
     prompt_user = f"""
 You are an agricultural expert helping an Indian farmer.
 
 Current Soil Status (Live from Pathway Streaming Engine):
-Nitrogen: {state.get('nitrogen')} kg/ha ({state.get('status_n')})
-Phosphorus: {state.get('phosphorus')} kg/ha ({state.get('status_p')})
-Potassium: {state.get('potassium')} kg/ha ({state.get('status_k')})
-Moisture: {state.get('moisture')}%
+{soil_status}
 
 Relevant Agricultural Knowledge (from Pathway Vector RAG):
 {guidelines[:3000]}
@@ -1156,7 +1043,6 @@ Instructions:
 
     # 4. Multi-LLM Router: select provider via LLM_PROVIDER env var.
     # Supported values: 'openai' (default) | 'gemini' | 'claude'
-    llm_provider = os.getenv("LLM_PROVIDER", "openai").lower()
     answer_text = None
     used_provider = llm_provider
 
@@ -1217,11 +1103,14 @@ Instructions:
 
     # ── LLM succeeded ─────────────────────────────────────────────────────────
     if answer_text:
-        return {
+        response = {
             "answer": answer_text,
             "cost_saving": "Calculated in advice",
             "provider": used_provider
         }
+        if cache_key is not None:
+            answer_cache.store(cache_key[0], q.text, cache_key[1], response, time.perf_counter() - started)
+        return {**response, "cached": False}
 
     # ── FALLBACK: Rule-Based Expert System (Offline Mode) ─────────────────────
     # Activates when ALL LLM providers are unavailable (rate-limited / no key).
@@ -1269,6 +1158,7 @@ Instructions:
     return {
         "answer": " ".join(advice_parts),
         "cost_saving": saving_text,
-        "provider": "rule-engine"
+        "provider": "rule-engine",
+        "cached": False
     }
 
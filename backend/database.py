@@ -34,6 +34,10 @@ class MockCollection:
     def insert_one(self, document):
         self.data.append(document)
         return type("InsertResult", (), {"inserted_id": "mock_id"})()
+
+    def insert_many(self, documents, ordered=True):
+        self.data.extend(documents)
+        return type("InsertManyResult", (), {"inserted_ids": ["mock_id"] * len(documents)})()
     
     def update_one(self, query, update):
         # Basic mock update
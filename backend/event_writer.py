@@ -0,0 +1,163 @@
+"""
+Background Event Writer
+One asyncio task per API process that owns the event log's append handle and flushes queued events in batches
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+from pathway_pipeline.event_log import EventLog
+
+COALESCE_WINDOW = float(os.getenv("EVENT_WRITER_WINDOW_MS", "2")) / 1000  # wait for more events before a flush
+MAX_BATCH = 1000            # events per flush
+QUEUE_SIZE = 10000          # pending submissions before submit() waits for the writer
+LATENCY_SAMPLES = 512       # flushes kept for the latency percentiles
+FLUSH_RETRIES = 4           # further attempts at a failed flush before its events are given up
+RETRY_BACKOFF = 0.1         # seconds before the first retry, doubled for each one after
+
+
+class EventWriter:
+    """
+    Request handlers hand events to ``submit`` and return immediately; a
+    single writer task drains the queue, coalesces whatever arrives within
+    COALESCE_WINDOW into one ``append_many`` call and runs it in a worker
+    thread so the event loop never blocks on disk.
+
+    Cross-process safety comes from EventLog itself: every flush holds the
+    log's flock and writes through an O_APPEND descriptor, so several
+    uvicorn workers can share the log without interleaving records.
+
+    A failed flush leaves the log untouched (append_many rolls back), so
+    the batch is retried with backoff; newer events queue up behind it.
+    Only when every retry fails are its events dropped: waiters get the
+    exception, and fire-and-forget events, already acknowledged, are
+    counted in ``lost_events`` with the error in ``last_error``.
+    """
+
+    def __init__(self, log: EventLog, window: float = COALESCE_WINDOW, max_batch: int = MAX_BATCH):
+        self.log = log
+        self.window = window
+        self.max_batch = max_batch
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.events_written = 0
+        self.batches_written = 0
+        self.errors = 0
+        self.lost_events = 0
+        self.last_error: Optional[str] = None
+        self.flush_ms = deque(maxlen=LATENCY_SAMPLES)
+
+    # ── Producer side ───────────────────────────────────────────────────────
+    async def submit(self, stream: str, entry: dict, wait: bool = False, sync: bool = False):
+        """
+        Queue one event. With ``wait=True`` returns its (segment, position)
+        once it is on disk (fsynced as part of its batch if ``sync``);
+        otherwise returns None as soon as it is queued.
+        """
+        offsets = await self.submit_many([(stream, entry)], wait, sync)
+        return offsets[0] if offsets else None
+
+    async def submit_many(self, events: List[Tuple[str, dict]], wait: bool = False, sync: bool = False):
+        """Queue several events as one unit; they always land in the same flush."""
+        self.start()
+        future = asyncio.get_running_loop().create_future() if wait else None
+        await self.queue.put((events, future, sync))
+        if future is not None:
+            return await future
+        return None
+
+    # ── Writer task ─────────────────────────────────────────────────────────
+    async def run(self):
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.window
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+                size += len(batch[-1][0])
+            # Anything already queued rides along without waiting further
+            while size < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                size += len(batch[-1][0])
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[List[Tuple[str, dict]], Optional[asyncio.Future], bool]]):
+        events = [event for item_events, _, _ in batch for event in item_events]
+        sync = any(item_sync for _, _, item_sync in batch)
+        start = time.perf_counter()
+        try:
+            for attempt in range(FLUSH_RETRIES + 1):
+                try:
+                    offsets = await asyncio.to_thread(self.log.append_many, events, sync)
+                    break
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    if attempt < FLUSH_RETRIES:
+                        delay = RETRY_BACKOFF * 2 ** attempt
+                        print(f"⚠️  Event writer failed to flush {len(events)} events ({e}); retrying in {delay:g}s")
+                        await asyncio.sleep(delay)
+                        continue
+                    lost = sum(len(item_events) for item_events, future, _ in batch if future is None)
+                    self.lost_events += lost
+                    print(f"❌ Event writer gave up on {len(events)} events ({lost} already acknowledged): {e}")
+                    for _, future, _ in batch:
+                        if future is not None and not future.done():
+                            future.set_exception(e)
+                    return
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
+        self.flush_ms.append((time.perf_counter() - start) * 1000)
+        self.events_written += len(events)
+        self.batches_written += 1
+        for item_events, future, _ in batch:
+            item_offsets, offsets = offsets[:len(item_events)], offsets[len(item_events):]
+            if future is not None and not future.done():
+                future.set_result(item_offsets)
+
+    # ── Lifecycle ───────────────────────────────────────────────────────────
+    def start(self):
+        if self._task is None:
+            self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Flush everything still queued, then stop the writer task."""
+        if self._task is None:
+            return
+        await self.queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        samples = sorted(self.flush_ms)
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3) if samples else None
+
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "events_written": self.events_written,
+            "batches_written": self.batches_written,
+            "avg_batch": round(self.events_written / self.batches_written, 1) if self.batches_written else 0,
+            "errors": self.errors,
+            "lost_events": self.lost_events,
+            "last_error": self.last_error,
+            "flush_ms": {"p50": pct(0.5), "p99": pct(0.99), "max": pct(1.0)},
+        }
@@ -0,0 +1,247 @@
+"""
+Live Soil-State Push Server
+WebSocket endpoint that streams per-user deltas of the pipeline's final_state and events_log
+
+Run alongside the REST API (nginx proxies /ws/ to this port):
+    uvicorn backend.live_stream:app --host 0.0.0.0 --port 8765
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set
+
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+import uvicorn
+from dotenv import load_dotenv
+
+from backend.auth import get_current_user
+from backend.state_index import CsvTail, SoilStateIndex, META_COLUMNS
+
+load_dotenv()
+
+STATE_FILE = "./data/current_state.csv"
+EVENTS_FILE = "./data/recent_events.csv"
+
+POLL_INTERVAL = float(os.getenv("LIVE_POLL_INTERVAL", "0.5"))        # seconds between file checks
+HEARTBEAT_INTERVAL = float(os.getenv("LIVE_HEARTBEAT_INTERVAL", "15"))  # seconds of silence before a ping
+BACKLOG_SIZE = 256      # messages kept per user for resume-after-reconnect
+QUEUE_SIZE = 64         # undelivered messages before a slow client is resynced
+SNAPSHOT_EVENTS = 20    # events included in a fresh snapshot
+
+
+class LiveStateHub:
+    """
+    Single watcher per process, fanned out to every connected dashboard.
+
+    The hub tails both Pathway CSV sinks once (not once per client), diffs
+    each user's new state row against the last one it published and assigns
+    a per-user version number to every message. Clients reconnect with
+    ``since=<version>`` and get only the messages they missed, or a fresh
+    snapshot if the backlog no longer reaches back that far. The epoch a
+    client sees names the user too, so a version another user's session
+    saw in the same tab is never taken for this user's.
+    """
+
+    def __init__(self, state_path: str = STATE_FILE, events_path: str = EVENTS_FILE):
+        self.state_index = SoilStateIndex(state_path)
+        self.events_tail = CsvTail(events_path)
+        # Changes on every restart so stale client versions are never trusted
+        self.epoch = str(int(time.time() * 1000))
+
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self.versions: Dict[str, int] = {}
+        self.published: Dict[str, dict] = {}
+        self.backlog: Dict[str, deque] = {}
+        self.recent_events: Dict[str, deque] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._poll_lock = threading.Lock()
+
+    # ── Subscription management ─────────────────────────────────────────────
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(user_id)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def user_epoch(self, user_id: str) -> str:
+        """Epoch sent to (and expected back from) ``user_id``'s clients."""
+        return f"{self.epoch}:{user_id}"
+
+    def resume(self, user_id: str, since: Optional[int], epoch: Optional[str]) -> List[dict]:
+        """Messages a (re)connecting client needs to catch up."""
+        backlog = self.backlog.get(user_id)
+        if since is not None and epoch == self.user_epoch(user_id):
+            current = self.versions.get(user_id, 0)
+            if since == current:
+                return []
+            if backlog and backlog[0]["version"] <= since + 1 and since < current:
+                return [m for m in backlog if m["version"] > since]
+        return [self.snapshot(user_id)]
+
+    def snapshot(self, user_id: str) -> dict:
+        return {
+            "type": "snapshot",
+            "epoch": self.user_epoch(user_id),
+            "version": self.versions.get(user_id, 0),
+            "state": self.published.get(user_id),
+            "events": list(self.recent_events.get(user_id, ())),
+        }
+
+    def heartbeat(self, user_id: str) -> dict:
+        return {"type": "heartbeat", "epoch": self.user_epoch(user_id), "version": self.versions.get(user_id, 0)}
+
+    # ── Change detection ────────────────────────────────────────────────────
+    def poll(self) -> List[tuple]:
+        """
+        Read whatever the pipeline appended and turn it into versioned
+        messages. Runs in a worker thread; only touches file handles and the
+        hub's own dicts, never the subscriber queues.
+        """
+        with self._poll_lock:
+            return self._poll()
+
+    def _poll(self) -> List[tuple]:
+        messages = []
+
+        self.state_index.refresh()
+        for user_id in self.state_index.pop_changed():
+            row = self.state_index.get(user_id)
+            state = {k: v for k, v in row.items() if k not in META_COLUMNS} if row else None
+            previous = self.published.get(user_id)
+            if state == previous:
+                continue
+            self.published[user_id] = state
+
+            if state is None or previous is None:
+                body = {"type": "state", "state": state}
+            else:
+                changes = {k: v for k, v in state.items() if previous.get(k) != v}
+                body = {"type": "delta", "changes": changes}
+            messages.append((user_id, self._stamp(user_id, body)))
+
+        rows = self.events_tail.read_new() or []
+        if self.events_tail.rotated:
+            self.recent_events.clear()
+        for row in rows:
+            user_id = row.get("user_id")
+            if not user_id or row.get("diff", "1").startswith("-"):
+                continue
+            event = {k: v for k, v in row.items() if k not in META_COLUMNS}
+            self.recent_events.setdefault(user_id, deque(maxlen=SNAPSHOT_EVENTS)).appendleft(event)
+            messages.append((user_id, self._stamp(user_id, {"type": "event", "event": event})))
+
+        return messages
+
+    def _stamp(self, user_id: str, body: dict) -> dict:
+        version = self.versions.get(user_id, 0) + 1
+        self.versions[user_id] = version
+        message = {**body, "epoch": self.user_epoch(user_id), "version": version}
+        self.backlog.setdefault(user_id, deque(maxlen=BACKLOG_SIZE)).append(message)
+        return message
+
+    def publish(self, user_id: str, message: dict):
+        for queue in list(self.subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Client is not keeping up: drop what it has not read and
+                # let it start over from a full snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.snapshot(user_id))
+
+    async def run(self):
+        """Background watcher loop; idles cheaply while nobody is connected."""
+        while True:
+            try:
+                if self.subscribers:
+                    for user_id, message in await asyncio.to_thread(self.poll):
+                        self.publish(user_id, message)
+            except Exception as e:
+                print(f"⚠️  Live stream watcher error: {e}")
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+
+hub = LiveStateHub()
+
+app = FastAPI(title="SoilTwin Live Stream", version="1.0.0")
+
+
+@app.on_event("startup")
+async def start_hub():
+    hub.start()
+
+
+@app.websocket("/live")
+async def live_state(websocket: WebSocket, token: str, since: Optional[int] = None, epoch: Optional[str] = None):
+    """
+    Push channel for the dashboard.
+
+    Browsers cannot set an Authorization header on a WebSocket, so the JWT
+    comes in as ``?token=``. Pass the last seen ``version`` and ``epoch`` to
+    resume after a reconnect.
+
+    Messages: snapshot | state | delta | event | heartbeat, each carrying
+    the user's monotonically increasing ``version``.
+    """
+    try:
+        user_id = await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    queue = hub.subscribe(user_id)
+    try:
+        # Catch up on the latest file contents before the first message
+        for uid, message in await asyncio.to_thread(hub.poll):
+            hub.publish(uid, message)
+
+        sent = since if epoch == hub.user_epoch(user_id) and since is not None else -1
+        for message in hub.resume(user_id, since, epoch):
+            await websocket.send_json(message)
+            sent = message["version"]
+
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                message = hub.heartbeat(user_id)
+            else:
+                # Already covered by the catch-up above
+                if message["type"] != "snapshot" and message["version"] <= sent:
+                    continue
+            await websocket.send_json(message)
+            sent = max(sent, message["version"])
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"⚠️  Live stream connection closed: {e}")
+    finally:
+        hub.unsubscribe(user_id, queue)
+
+
+@app.get("/")
+def root():
+    return {
+        "message": "SoilTwin Live Stream",
+        "subscribers": sum(len(q) for q in hub.subscribers.values()),
+        "epoch": hub.epoch
+    }
+
+
+if __name__ == "__main__":
+    uvicorn.run("backend.live_stream:app", host="0.0.0.0", port=8765)
@@ -3,7 +3,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from backend.api_routes import router as api_router
+import asyncio
+from backend.api_routes import router as api_router, event_log, event_writer, state_latency, observe_pending_state
+from backend.metrics import instrument, instrument_router
+from pathway_pipeline.event_log import migrate_legacy_streams
 import uvicorn
 from dotenv import load_dotenv
 import os
@@ -28,7 +31,26 @@ app.add_middleware(
 )
 
 # Include routers
+# Per-route latency / size / error metrics on /metrics, sampled cProfile of slow requests
+instrument_router(api_router, prefix="/api")
 app.include_router(api_router, prefix="/api")
+instrument(app)
+
+@app.on_event("startup")
+async def start_event_writer():
+    # One-time import of the old per-type JSONL streams, before any new event is written
+    await asyncio.to_thread(migrate_legacy_streams, event_log)
+    event_writer.start()
+
+@app.on_event("startup")
+async def start_state_latency_watch():
+    # Confirms event-to-state latency as soon as new state rows appear (GET /api/events/latency)
+    app.state.latency_watch = asyncio.create_task(state_latency.watch(observe_pending_state))
+
+@app.on_event("shutdown")
+async def stop_event_writer():
+    # Drain queued events so an acknowledged event is never lost on restart
+    await event_writer.stop()
 
 @app.get("/")
 def root():
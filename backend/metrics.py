@@ -0,0 +1,338 @@
+"""
+Request Metrics
+Prometheus text-format metrics for the API (per-route latency, sizes, errors, in-flight) and cProfile captures of slow requests
+
+Routes are labelled by their path template (/api/history, not
+/api/history?limit=50), so label cardinality stays bounded. /metrics is
+mounted on the app root, outside the /api/ prefix nginx exposes. The
+profile endpoints show the server's code paths and need a login token.
+
+Profiling: a sampled fraction of requests runs its endpoint under
+cProfile; if the whole request took longer than SLOW_REQUEST_MS the
+profile is kept, and only the PROFILES_KEPT slowest are retained. The
+profiler runs in the thread that executes the endpoint (FastAPI's
+threadpool for sync routes, the event loop for async ones), so async
+profiles also include whatever else the loop ran meanwhile.
+"""
+
+import asyncio
+import contextvars
+import cProfile
+import functools
+import heapq
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse, Response
+from fastapi.routing import APIRoute
+
+from backend.auth import get_current_user
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)     # seconds
+SIZE_BUCKETS = (128, 1024, 8192, 65536, 524288, 4194304)                                # bytes
+
+PROFILE_SAMPLE_RATE = float(os.getenv("METRICS_PROFILE_SAMPLE_RATE", "0.05"))
+SLOW_REQUEST_MS = float(os.getenv("METRICS_SLOW_REQUEST_MS", "500"))
+PROFILES_KEPT = int(os.getenv("METRICS_PROFILES_KEPT", "20"))
+PROFILE_LINES = 30           # functions shown in a profile's text summary
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, values: tuple, amount: float):
+        series = self._series.get(values)
+        if series is None:
+            series = self._series[values] = [[0] * (len(self.buckets) + 1), 0.0]
+        i = 0
+        while i < len(self.buckets) and amount > self.buckets[i]:
+            i += 1
+        series[0][i] += 1
+        series[1] += amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total) in sorted(self._series.items()):
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + (le,))} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {running}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, values: tuple, amount: float = 1):
+        self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labels, v)} {n:g}" for v, n in sorted(self._values.items())]
+        return lines
+
+
+class SlowProfiles:
+    """The PROFILES_KEPT slowest sampled requests and their profilers."""
+
+    def __init__(self, keep: int = PROFILES_KEPT):
+        self.keep = keep
+        self._heap = []                  # (duration_ms, id, entry), smallest first
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, method: str, route: str, status: int, duration_ms: float, profiler: cProfile.Profile):
+        with self._lock:
+            if len(self._heap) >= self.keep and duration_ms <= self._heap[0][0]:
+                return
+        entry = {
+            "id": next(self._ids),
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round(duration_ms, 3),
+            "captured_at": time.time(),
+            "profiler": profiler,
+        }
+        with self._lock:
+            heapq.heappush(self._heap, (duration_ms, entry["id"], entry))
+            if len(self._heap) > self.keep:
+                heapq.heappop(self._heap)
+
+    def list(self) -> list:
+        with self._lock:
+            entries = [entry for _, _, entry in sorted(self._heap, reverse=True)]
+        return [{k: v for k, v in entry.items() if k != "profiler"} for entry in entries]
+
+    def get(self, profile_id: int) -> Optional[dict]:
+        with self._lock:
+            for _, _, entry in self._heap:
+                if entry["id"] == profile_id:
+                    return entry
+        return None
+
+
+# Set by the middleware on sampled requests; the endpoint wrapper fills it in
+_active_profile: contextvars.ContextVar = contextvars.ContextVar("active_profile", default=None)
+# A thread has one profiler slot, so only one async endpoint is profiled at a time
+_loop_profiler = threading.Lock()
+
+
+def profile_endpoint(call):
+    """
+    Wrap an endpoint so that it runs under cProfile when its request was
+    sampled. Keeps the endpoint sync or async, so FastAPI still runs sync
+    endpoints in its threadpool and the profile covers that thread.
+    """
+    def start():
+        holder = _active_profile.get()
+        if holder is None or holder:
+            return None
+        profiler = cProfile.Profile()
+        holder.append(profiler)
+        return profiler
+
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def wrapper(*args, **kwargs):
+            if _active_profile.get() is None or not _loop_profiler.acquire(blocking=False):
+                return await call(*args, **kwargs)
+            try:
+                profiler = start()
+                if profiler is None:
+                    return await call(*args, **kwargs)
+                profiler.enable()
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    profiler.disable()
+            finally:
+                _loop_profiler.release()
+    else:
+        @functools.wraps(call)
+        def wrapper(*args, **kwargs):
+            profiler = start()
+            if profiler is None:
+                return call(*args, **kwargs)
+            profiler.enable()
+            try:
+                return call(*args, **kwargs)
+            finally:
+                profiler.disable()
+    wrapper.__profiled__ = True
+    return wrapper
+
+
+class RequestMetrics:
+    def __init__(self):
+        labels = ("method", "route")
+        self.latency = Histogram("soiltwin_http_request_duration_seconds", "Request latency by route", labels, LATENCY_BUCKETS)
+        self.response_size = Histogram("soiltwin_http_response_size_bytes", "Response body size by route", labels, SIZE_BUCKETS)
+        self.requests = Counter("soiltwin_http_requests_total", "Requests by route and status code", labels + ("status",))
+        self.errors = Counter("soiltwin_http_request_errors_total", "Requests that raised or returned 5xx", labels)
+        self.in_flight = 0
+        self.profiles = SlowProfiles()
+        self._lock = threading.Lock()
+
+    def record(self, method: str, route: str, status: int, duration: float, size: int):
+        with self._lock:
+            self.latency.observe((method, route), duration)
+            self.response_size.observe((method, route), size)
+            self.requests.inc((method, route, str(status)))
+            if status >= 500:
+                self.errors.inc((method, route))
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for metric in (self.latency, self.response_size, self.requests, self.errors):
+                lines += metric.render()
+            lines += [
+                "# HELP soiltwin_http_requests_in_flight Requests currently being served",
+                "# TYPE soiltwin_http_requests_in_flight gauge",
+                f"soiltwin_http_requests_in_flight {self.in_flight}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+metrics = RequestMetrics()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no response buffering) feeding ``metrics``."""
+
+    def __init__(self, app, registry: RequestMetrics = metrics, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 slow_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.registry = registry
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        holder = [] if self.sample_rate > 0 and random.random() < self.sample_rate else None
+        token = _active_profile.set(holder)
+        with self.registry._lock:
+            self.registry.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            _active_profile.reset(token)
+            with self.registry._lock:
+                self.registry.in_flight -= 1
+            route = scope.get("route")
+            template = getattr(route, "metrics_path", route.path) if route is not None else "unmatched"
+            method = scope["method"]
+            self.registry.record(method, template, status, duration, size)
+            if holder and duration * 1000 >= self.slow_ms:
+                self.registry.profiles.add(method, template, status, duration * 1000, holder[0])
+
+
+def instrument_router(api_router: APIRouter, prefix: str = ""):
+    """
+    Wrap a router's endpoints for sampled profiling and remember each
+    route's full path for labels. Call before ``app.include_router``:
+    depending on the FastAPI version, inclusion either copies routes from
+    ``endpoint`` or serves the original route (and its dependant) as is.
+    """
+    for route in api_router.routes:
+        if isinstance(route, APIRoute) and not getattr(route.endpoint, "__profiled__", False):
+            route.endpoint = profile_endpoint(route.endpoint)
+            route.dependant.call = route.endpoint
+            route.metrics_path = prefix + route.path
+
+
+def instrument(app, registry: RequestMetrics = metrics):
+    """Add the metrics middleware and mount /metrics on the app root."""
+    app.add_middleware(MetricsMiddleware, registry=registry)
+    app.include_router(router)
+
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/profiles")
+def list_profiles(current_user: str = Depends(get_current_user)):
+    """Slowest sampled requests, slowest first."""
+    return {
+        "sample_rate": PROFILE_SAMPLE_RATE,
+        "slow_request_ms": SLOW_REQUEST_MS,
+        "profiles": metrics.profiles.list(),
+    }
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: int, format: str = "text", current_user: str = Depends(get_current_user)):
+    """
+    One captured profile: ``format=text`` for the top functions by
+    cumulative time, ``format=pstats`` for a file for ``python -m pstats``
+    or snakeviz.
+    """
+    entry = metrics.profiles.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found (it may have been evicted)")
+    stats = pstats.Stats(entry["profiler"])
+    if format == "pstats":
+        return Response(
+            marshal.dumps(stats.stats),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.prof"'},
+        )
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+    header = f"{entry['method']} {entry['route']} -> {entry['status']} in {entry['duration_ms']} ms\n"
+    return PlainTextResponse(header + out.getvalue())
@@ -0,0 +1,68 @@
+"""
+Pipeline State Client
+Pooled keep-alive HTTP client for the Pathway pipeline's live state query endpoint
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+PIPELINE_QUERY_URL = os.getenv(
+    "PIPELINE_QUERY_URL",
+    f"http://127.0.0.1:{os.getenv('PIPELINE_QUERY_PORT', '8090')}/state",
+)
+QUERY_TIMEOUT = float(os.getenv("PIPELINE_QUERY_TIMEOUT", "2"))   # seconds
+POOL_SIZE = 32               # keep-alive connections shared by the API's worker threads
+RETRY_AFTER = 5.0            # seconds to skip the pipeline after it failed to answer
+
+
+class PipelineUnavailable(Exception):
+    """The pipeline's query endpoint is down, still starting, or answered with an error."""
+
+
+class PipelineStateClient:
+    """
+    One requests.Session per process with a connection pool, so state
+    lookups reuse warm TCP connections instead of paying a handshake each.
+
+    After a failure the client fails fast for RETRY_AFTER seconds, so a
+    stopped pipeline costs callers nothing beyond their fallback path.
+    """
+
+    def __init__(self, url: str = PIPELINE_QUERY_URL, timeout: float = QUERY_TIMEOUT, pool_size: int = POOL_SIZE):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._down_until = 0.0
+
+    def get_state(self, user_id: str) -> Optional[dict]:
+        """
+        Latest state row for a user straight from the pipeline's in-memory
+        table, or None if the pipeline has no row for them.
+
+        Raises:
+            PipelineUnavailable: if the pipeline could not be asked.
+        """
+        if time.monotonic() < self._down_until:
+            raise PipelineUnavailable(f"{self.url} failed recently")
+        try:
+            response = self.session.get(self.url, params={"user_id": user_id}, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            with self._lock:
+                if time.monotonic() >= self._down_until:
+                    print(f"⚠️  Pipeline state query failed ({e}); falling back for {RETRY_AFTER:g}s")
+                self._down_until = time.monotonic() + RETRY_AFTER
+            raise PipelineUnavailable(str(e)) from e
+
+    def close(self):
+        self.session.close()
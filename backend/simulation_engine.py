@@ -1,6 +1,17 @@
 import csv
 import os
 import datetime
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from pathway_pipeline.streaming_logic import (
+    TRANSFORMATIONS, LEACHING_COEFF_N, MOISTURE_RAIN_FACTOR,
+    EVENT_EFFECTS, AMENDMENT_CHANNELS, harvest_crop_key,
+)
 
 DATA_DIR = "./data"
 STATE_FILE = f"{DATA_DIR}/current_state.csv"
@@ -44,7 +55,16 @@ def save_state(state):
 def process_event(event_type, event_data):
     state = get_current_state()
     if not state: return
-    
+    return apply_event(state, event_type, event_data)
+
+
+def apply_event(state, event_type, event_data):
+    """
+    Optimistic next state: ``state`` (a state row, left unchanged) with one
+    event applied. Pure, so request handlers can call it on an in-memory row.
+    """
+    state = dict(state)
+    event_data = event_data or {}
     n = float(state.get('nitrogen', 0))
     p = float(state.get('phosphorus', 0))
     k = float(state.get('potassium', 0))
@@ -87,3 +107,317 @@ def process_event(event_type, event_data):
     # save_state(state)  <-- DISABLED: Pathway is the Single Source of Truth for DB/CSV writes.
     # We only return 'state' here for Optimistic UI updates.
     return state
+
+
+# ============================================================================
+# VECTORIZED FORWARD SIMULATION
+# ============================================================================
+# Steps many farms N days ahead under a scheduled set of events, using the
+# same coefficients as the Pathway pipeline (pathway_pipeline/streaming_logic.py).
+# Every rule there is linear in the event amount, so each event becomes
+# amount * EFFECTS[channel] and a day is one vectorized add + clip.
+
+STATE_FIELDS = ("nitrogen", "phosphorus", "potassium", "moisture", "ph", "organic_carbon")
+STATE_MIN = np.array([0.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+STATE_MAX = np.array([np.inf, np.inf, np.inf, 100.0, 14.0, np.inf])
+
+SIM_CACHE_SIZE = 32
+
+
+def _effect_row(**deltas):
+    return [deltas.get(field, 0.0) for field in STATE_FIELDS]
+
+
+# channel name -> per-unit change of each STATE_FIELDS column
+CHANNELS = {name: _effect_row(**effects) for name, effects in EVENT_EFFECTS.items()}
+CHANNEL_INDEX = {name: i for i, name in enumerate(CHANNELS)}
+EFFECTS = np.array(list(CHANNELS.values()))
+
+
+def event_channel(event_type, subtype=None):
+    """
+    Map an API-style event (type + fertilizer/amendment type or crop) to a
+    channel, or None if the rules give it no effect.
+    """
+    subtype = str(subtype or "").lower()
+    if event_type in ("rain", "irrigation"):
+        return event_type
+    if event_type == "fertilizer":
+        name = subtype or "urea"
+        return f"fertilizer:{name}" if name in TRANSFORMATIONS else None
+    if event_type == "harvest":
+        return f"harvest:{harvest_crop_key(subtype or 'wheat')}"
+    if event_type == "amendment":
+        if not subtype:
+            return "amendment:manure"
+        for keyword, channel in AMENDMENT_CHANNELS:
+            if keyword in subtype:
+                return channel
+    return None
+
+
+def build_schedule(events, days, n_farms):
+    """
+    Turn a list of scheduled events into flat arrays sorted by day.
+
+    Each event is a dict: {"day": 1..days, "type": ..., "amount": ...,
+    "subtype": ..., "farm": index (optional, omitted = every farm)}.
+    Harvest events count once regardless of amount.
+
+    Returns:
+        (day, farm, channel, amount) int/float arrays; farm is -1 for
+        fleet-wide events. Events outside the horizon or with no effect are dropped.
+    """
+    rows = []
+    for event in events:
+        channel = event_channel(event.get("type"), event.get("subtype"))
+        day = int(event.get("day", 1))
+        farm = event.get("farm")
+        farm = -1 if farm is None else int(farm)
+        if channel is None or not 1 <= day <= days or farm >= n_farms:
+            continue
+        amount = 1.0 if channel.startswith("harvest:") else float(event.get("amount", 0) or 0)
+        rows.append((day - 1, farm, CHANNEL_INDEX[channel], amount))
+
+    rows.sort(key=lambda r: r[0])
+    if not rows:
+        return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                np.zeros(0, dtype=np.int64), np.zeros(0))
+    day, farm, channel, amount = (np.array(col) for col in zip(*rows))
+    return day.astype(np.int64), farm.astype(np.int64), channel.astype(np.int64), amount.astype(float)
+
+
+def simulate_forward(state, days, schedule):
+    """
+    Step every farm ``days`` days forward.
+
+    Args:
+        state: (farms, len(STATE_FIELDS)) array of current values
+        days: horizon
+        schedule: output of build_schedule
+
+    Returns:
+        (days + 1, farms, len(STATE_FIELDS)) trajectory; row 0 is the input state.
+    """
+    state = np.asarray(state, dtype=float)
+    day, farm, channel, amount = schedule
+    deltas = amount[:, None] * EFFECTS[channel]
+
+    trajectory = np.empty((days + 1,) + state.shape)
+    trajectory[0] = state
+    bounds = np.searchsorted(day, np.arange(days + 1))
+    current = state.copy()
+    for d in range(days):
+        lo, hi = bounds[d], bounds[d + 1]
+        if lo < hi:
+            targets = farm[lo:hi]
+            fleet = targets < 0
+            if fleet.any():
+                current += deltas[lo:hi][fleet].sum(axis=0)
+            if not fleet.all():
+                np.add.at(current, targets[~fleet], deltas[lo:hi][~fleet])
+            np.clip(current, STATE_MIN, STATE_MAX, out=current)
+        trajectory[d + 1] = current
+    return trajectory
+
+
+_sim_cache = OrderedDict()
+_sim_cache_lock = threading.Lock()
+
+
+def simulate_cached(state, days, events):
+    """
+    simulate_forward with an LRU cache keyed on the state values and the
+    scenario, so re-running the same what-if (or re-polling it) is free.
+    The returned array is shared between callers and read-only.
+    """
+    state = np.ascontiguousarray(state, dtype=float)
+    key = hashlib.sha1(
+        state.tobytes() + str(state.shape).encode()
+        + json.dumps([days, events], sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+    with _sim_cache_lock:
+        if key in _sim_cache:
+            _sim_cache.move_to_end(key)
+            return _sim_cache[key]
+
+    trajectory = simulate_forward(state, days, build_schedule(events, days, state.shape[0]))
+    trajectory.setflags(write=False)
+
+    with _sim_cache_lock:
+        _sim_cache[key] = trajectory
+        while len(_sim_cache) > SIM_CACHE_SIZE:
+            _sim_cache.popitem(last=False)
+    return trajectory
+
+
+def state_vector(state):
+    """A state row (CSV strings or numbers) as a STATE_FIELDS vector."""
+    return [float(state.get(field) or 0) for field in STATE_FIELDS]
+
+# ============================================================================
+# MONTE CARLO RAINFALL PROJECTION
+# ============================================================================
+# Rain is the one input nobody schedules. Each day of the forecast becomes a
+# wet/dry draw (chance of rain) and a gamma-distributed amount whose mean
+# matches the forecast, and every sampled path is pushed through the same
+# leaching / moisture rules as the pipeline. Bands are taken across paths.
+
+RAIN_GAMMA_SHAPE = 0.7            # daily rainfall is strongly right-skewed
+CLIMATOLOGY_RAIN_PROB = 0.2       # used past the end of the forecast
+CLIMATOLOGY_WET_DAY_MM = 6.0
+DRY_FORECAST_WET_DAY_MM = 2.0     # a "0 mm" forecast can still drizzle
+PROJECTION_ET_LOSS = 1.5          # moisture % lost per day to evapotranspiration (projection only)
+MOISTURE_IRRIGATE_BELOW = 30.0    # matches the red status threshold in save_state
+PROJECTION_BANDS = (10, 50, 90)
+MC_PARALLEL_MIN = 2_000_000       # farm x sample paths before fanning out across processes
+
+_mc_pool = None
+_mc_pool_workers = 0              # size _mc_pool was created with
+
+
+def sample_rain_paths(rain_mm, rain_prob, days, samples, seed=None):
+    """
+    (samples, days) array of daily rainfall. ``rain_mm`` / ``rain_prob`` are
+    the daily forecast; days beyond it fall back to climatology.
+    """
+    rng = np.random.default_rng(seed)
+    mean = np.full(days, CLIMATOLOGY_RAIN_PROB * CLIMATOLOGY_WET_DAY_MM)
+    prob = np.full(days, CLIMATOLOGY_RAIN_PROB)
+    known = min(days, len(rain_mm))
+    mean[:known] = np.asarray(rain_mm[:known], dtype=float)
+    if rain_prob is not None and len(rain_prob):
+        prob[:known] = np.asarray(rain_prob[:known], dtype=float)
+    else:
+        prob[:known] = np.where(mean[:known] > 0, 0.8, 0.1)
+    prob = np.clip(prob, 0.01, 1.0)
+
+    # Mean amount on a wet day so that prob * wet_mean == forecast mean
+    wet_mean = np.where(mean > 0, mean / prob, DRY_FORECAST_WET_DAY_MM)
+    wet = rng.random((samples, days)) < prob
+    amount = rng.gamma(RAIN_GAMMA_SHAPE, wet_mean / RAIN_GAMMA_SHAPE, size=(samples, days))
+    return np.where(wet, amount, 0.0)
+
+
+def _project_chunk(nitrogen, moisture, rain, et_loss):
+    """
+    Push every rain path through the rules for a chunk of farms.
+    Returns (nitrogen bands, moisture bands, chance moisture < threshold),
+    shaped (bands, days + 1, farms) / (days + 1, farms).
+    """
+    samples, days = rain.shape
+    n = np.broadcast_to(nitrogen, (samples, nitrogen.size)).copy()
+    m = np.broadcast_to(moisture, (samples, moisture.size)).copy()
+
+    n_bands = np.empty((len(PROJECTION_BANDS), days + 1, nitrogen.size))
+    m_bands = np.empty_like(n_bands)
+    dry = np.empty((days + 1, nitrogen.size))
+    n_bands[:, 0] = nitrogen
+    m_bands[:, 0] = moisture
+    dry[0] = moisture < MOISTURE_IRRIGATE_BELOW
+
+    for d in range(days):
+        mm = rain[:, d:d + 1]
+        n -= mm * LEACHING_COEFF_N
+        np.maximum(n, 0.0, out=n)
+        m += mm * MOISTURE_RAIN_FACTOR - et_loss
+        np.clip(m, 0.0, 100.0, out=m)
+        n_bands[:, d + 1] = np.percentile(n, PROJECTION_BANDS, axis=0)
+        m_bands[:, d + 1] = np.percentile(m, PROJECTION_BANDS, axis=0)
+        dry[d + 1] = (m < MOISTURE_IRRIGATE_BELOW).mean(axis=0)
+    return n_bands, m_bands, dry
+
+
+def project_rain_uncertainty(state, rain_mm, rain_prob=None, days=5, samples=2000,
+                             seed=None, et_loss=PROJECTION_ET_LOSS, workers=None):
+    """
+    P10/P50/P90 nitrogen and moisture bands under sampled rainfall.
+
+    Args:
+        state: (farms, len(STATE_FIELDS)) current values
+        rain_mm, rain_prob: daily forecast (see weather_api.get_daily_rain_forecast)
+        samples: rainfall paths; all farms see the same paths (same weather)
+        workers: processes for fleet-wide runs (default: all cores once the
+            run is larger than MC_PARALLEL_MIN paths)
+
+    Returns:
+        dict of arrays: rain (bands, days), nitrogen / moisture
+        (bands, days + 1, farms) and irrigate_probability (days + 1, farms).
+    """
+    global _mc_pool, _mc_pool_workers
+    state = np.asarray(state, dtype=float)
+    nitrogen = state[:, STATE_FIELDS.index("nitrogen")]
+    moisture = state[:, STATE_FIELDS.index("moisture")]
+    rain = sample_rain_paths(rain_mm, rain_prob, days, samples, seed)
+
+    farms = state.shape[0]
+    if workers is None:
+        workers = (os.cpu_count() or 1) if farms * samples >= MC_PARALLEL_MIN else 1
+    workers = max(1, min(workers, farms))
+
+    if workers == 1:
+        n_bands, m_bands, dry = _project_chunk(nitrogen, moisture, rain, et_loss)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        if _mc_pool is None or _mc_pool_workers < workers:
+            if _mc_pool is not None:
+                _mc_pool.shutdown(wait=False)
+            _mc_pool = ProcessPoolExecutor(max_workers=workers)
+            _mc_pool_workers = workers
+        chunks = np.array_split(np.arange(farms), workers)
+        results = list(_mc_pool.map(
+            _project_chunk,
+            [nitrogen[c] for c in chunks], [moisture[c] for c in chunks],
+            [rain] * len(chunks), [et_loss] * len(chunks),
+        ))
+        n_bands = np.concatenate([r[0] for r in results], axis=2)
+        m_bands = np.concatenate([r[1] for r in results], axis=2)
+        dry = np.concatenate([r[2] for r in results], axis=1)
+
+    return {
+        "rain": np.percentile(rain, PROJECTION_BANDS, axis=0),
+        "nitrogen": n_bands,
+        "moisture": m_bands,
+        "irrigate_probability": dry,
+    }
+
+
+if __name__ == "__main__":
+    import time
+
+    farms, days = 10000, 120
+    rng = np.random.default_rng(0)
+    fleet = np.column_stack([
+        rng.uniform(150, 400, farms), rng.uniform(10, 40, farms), rng.uniform(150, 400, farms),
+        rng.uniform(20, 80, farms), rng.uniform(5.5, 8.5, farms), rng.uniform(0.3, 1.0, farms),
+    ])
+    scenario = [{"day": int(d), "type": "rain", "amount": float(mm)}
+                for d, mm in zip(rng.integers(1, days + 1, 40), rng.uniform(2, 30, 40))]
+    scenario += [{"day": int(d), "farm": int(f), "type": "irrigation", "amount": 20000}
+                 for d, f in zip(rng.integers(1, days + 1, farms), rng.integers(0, farms, farms))]
+    scenario += [{"day": 30, "type": "fertilizer", "subtype": "urea", "amount": 100},
+                 {"day": 110, "type": "harvest", "subtype": "wheat"}]
+
+    start = time.perf_counter()
+    traj = simulate_cached(fleet, days, scenario)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    simulate_cached(fleet, days, scenario)
+    warm = time.perf_counter() - start
+    print(f"⏱️  {farms} farms x {days} days, {len(scenario)} events: {cold * 1000:.1f} ms (cached: {warm * 1000:.3f} ms)")
+    print(f"   Farm 0 day {days}: " + ", ".join(f"{f}={v:.2f}" for f, v in zip(STATE_FIELDS, traj[-1, 0])))
+    # Monte Carlo: fleet-wide rainfall uncertainty over a 5-day forecast
+    samples = 1000
+    forecast_mm, forecast_prob = [0.0, 4.0, 12.0, 1.0, 0.0], [0.1, 0.6, 0.9, 0.3, 0.1]
+    for workers in sorted({1, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        bands = project_rain_uncertainty(fleet, forecast_mm, forecast_prob, days=5,
+                                         samples=samples, seed=0, workers=workers)
+        elapsed = time.perf_counter() - start
+        label = "1 process" if workers == 1 else f"{workers} processes"
+        print(f"🎲 {farms} farms x {samples} rain paths ({label}): {elapsed:.2f}s, "
+              f"{farms * samples / elapsed:,.0f} samples/s")
+    print("   Farm 0 moisture P10/P50/P90 on day 5: "
+          + " / ".join(f"{v:.1f}" for v in bands["moisture"][:, -1, 0])
+          + f", chance below {MOISTURE_IRRIGATE_BELOW:.0f}%: {bands['irrigate_probability'][-1, 0]:.0%}")
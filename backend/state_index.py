@@ -0,0 +1,185 @@
+"""
+Incremental Soil State Index
+Tails Pathway's current_state.csv and keeps the consolidated latest row per user in memory
+"""
+
+import csv
+import io
+import os
+import threading
+from typing import Dict, List, Optional
+
+# Bookkeeping columns appended by pw.io.csv.write to every output row
+META_COLUMNS = ("time", "diff")
+
+
+class CsvTail:
+    """
+    Follows a CSV file written by a Pathway sink, returning only rows that
+    were appended since the previous read. Restarts from the top when the
+    file is recreated or truncated (pipeline restart).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.inode = None
+        self.header = None
+        self.rotated = False
+
+    def read_new(self) -> Optional[List[dict]]:
+        """
+        Returns:
+            None if the file does not exist, otherwise the list of new rows
+            (empty when nothing was appended). ``rotated`` is True for one
+            call after the file was replaced, so callers can drop derived state.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self.reset()
+            return None
+
+        self.rotated = False
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            self.reset()
+            self.inode = st.st_ino
+            self.rotated = True
+
+        if st.st_size == self.offset:
+            return []
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            chunk = f.read(st.st_size - self.offset)
+
+        # Only consume complete lines; a half-written row is picked up next time
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            return []
+        self.offset += end + 1
+
+        rows = []
+        reader = csv.reader(io.StringIO(chunk[:end + 1].decode("utf-8"), newline=""))
+        for values in reader:
+            if not values:
+                continue
+            if self.header is None:
+                self.header = values
+                continue
+            rows.append(dict(zip(self.header, values)))
+        return rows
+
+
+class SoilStateIndex:
+    """
+    In-process index over the Pathway CSV sink.
+
+    Pathway never rewrites its CSV output: every change to ``final_state`` is
+    appended as a retraction row (diff=-1) for the old value and an insertion
+    row (diff=1) for the new one. Instead of re-reading the whole file on each
+    request, we remember the byte offset we stopped at, read only the bytes
+    appended since then and fold their diffs into the per-user state.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._tail = CsvTail(path)
+        self._changed = set()
+        self._reset()
+
+    def _reset(self):
+        self._tail.reset()
+        # user_id -> {row_key: [count, time, row]}
+        self._versions: Dict[str, dict] = {}
+        # user_id -> latest live row (what /soil-state returns)
+        self._current: Dict[str, dict] = {}
+
+    def refresh(self) -> bool:
+        """
+        Consume any rows appended since the last call.
+
+        Returns:
+            False if the CSV does not exist yet, True otherwise.
+        """
+        with self._lock:
+            rows = self._tail.read_new()
+            if rows is None:
+                self._changed.update(self._current)
+                self._reset()
+                return False
+
+            # Pipeline restarted and recreated the file: rebuild from scratch
+            if self._tail.rotated:
+                self._changed.update(self._current)
+                self._versions = {}
+                self._current = {}
+
+            touched = set()
+            for row in rows:
+                user_id = self._apply(row)
+                if user_id is not None:
+                    touched.add(user_id)
+
+            # Resolve after the whole batch so a retraction/insertion pair
+            # written in either order never leaves the user without a row
+            for user_id in touched:
+                self._resolve(user_id)
+            return True
+
+    def _apply(self, row: dict) -> Optional[str]:
+        user_id = row.get("user_id")
+        if not user_id:
+            return None
+
+        try:
+            diff = int(row.get("diff") or 1)
+        except ValueError:
+            diff = 1
+        try:
+            time = int(row.get("time") or 0)
+        except ValueError:
+            time = 0
+
+        key = tuple(v for k, v in row.items() if k not in META_COLUMNS)
+        versions = self._versions.setdefault(user_id, {})
+        entry = versions.get(key)
+        if entry is None:
+            entry = versions[key] = [0, time, row]
+
+        entry[0] += diff
+        if diff > 0 and time >= entry[1]:
+            entry[1] = time
+            entry[2] = row
+
+        if entry[0] == 0:
+            del versions[key]
+        return user_id
+
+    def _resolve(self, user_id: str):
+        live = [e for e in self._versions.get(user_id, {}).values() if e[0] > 0]
+        previous = self._current.get(user_id)
+        if live:
+            self._current[user_id] = max(live, key=lambda e: e[1])[2]
+        else:
+            self._current.pop(user_id, None)
+        if self._current.get(user_id) is not previous:
+            self._changed.add(user_id)
+
+    def get(self, user_id: str) -> Optional[dict]:
+        """Latest consolidated state row for a user, or None."""
+        return self._current.get(user_id)
+
+    def pop_changed(self) -> set:
+        """Users whose state row changed since the previous call."""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            return changed
+
+    @property
+    def offset(self) -> int:
+        return self._tail.offset
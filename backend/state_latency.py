@@ -0,0 +1,133 @@
+"""
+Event-to-State Latency Tracker
+Time from an event being accepted by the API to the first state row that reflects it
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Optional
+
+PENDING_PER_USER = 256      # unconfirmed events remembered per user
+PENDING_USERS = 10000       # users with unconfirmed events before the oldest are dropped
+PENDING_TTL = 600.0         # seconds before an unconfirmed event is given up on
+LATENCY_SAMPLES = 4096      # confirmed events kept for the percentiles, per source
+WATCH_INTERVAL = 0.1        # seconds between state checks while events are pending (bounds the error)
+
+
+def new_event_id() -> str:
+    """Event id that sorts by ingest time (hex nanoseconds + random suffix)."""
+    return f"{time.time_ns():016x}-{uuid.uuid4().hex[:8]}"
+
+
+class StateLatencyTracker:
+    """
+    ``stamp`` gives each event an ``event_id`` and ``ingested_at`` before it
+    is written; the pipeline carries the newest id per user through to
+    ``final_state`` as ``last_event_id``. Whenever the API reads a state row,
+    ``observe`` confirms every pending event of that user whose id is at or
+    below the row's, recording the elapsed time once per event.
+
+    Samples are kept per source ("pipeline" query endpoint or "csv"
+    fallback), so polling intervals and pipeline changes show up separately.
+    Latency is per API process: each worker tracks the events it accepted.
+
+    Request handlers observe the rows they read, but dashboards get state
+    from the live push server, so ``watch`` also checks for new rows itself
+    every WATCH_INTERVAL; the latency is then recorded when the state
+    changes rather than when someone next asks.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # user_id -> deque of (event_id, monotonic time accepted)
+        self._pending: "OrderedDict[str, deque]" = OrderedDict()
+        self._samples = {}
+        self.confirmed = 0
+        self.expired = 0
+
+    def stamp(self, user_id: str, entry: dict) -> dict:
+        """Add event_id / ingested_at to an event-log record and start its clock."""
+        event_id = new_event_id()
+        entry["event_id"] = event_id
+        entry["ingested_at"] = time.time()
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending is None:
+                pending = self._pending[user_id] = deque()
+                while len(self._pending) > PENDING_USERS:
+                    _, dropped = self._pending.popitem(last=False)
+                    self.expired += len(dropped)
+            elif len(pending) >= PENDING_PER_USER:
+                pending.popleft()
+                self.expired += 1
+            pending.append((event_id, time.monotonic()))
+        return entry
+
+    def observe(self, user_id: str, row: Optional[dict], source: str):
+        """Record latency for every pending event of ``user_id`` that ``row`` reflects."""
+        if not row or user_id not in self._pending:
+            return
+        last_event_id = row.get("last_event_id") or ""
+        now = time.monotonic()
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending is None:
+                return
+            while pending and (pending[0][0] <= last_event_id or now - pending[0][1] > PENDING_TTL):
+                event_id, accepted = pending.popleft()
+                if event_id <= last_event_id:
+                    samples = self._samples.setdefault(source, deque(maxlen=LATENCY_SAMPLES))
+                    samples.append((now - accepted) * 1000)
+                    self.confirmed += 1
+                else:
+                    self.expired += 1
+            if not pending:
+                del self._pending[user_id]
+
+    def pending_users(self) -> list:
+        """Users with unconfirmed events, dropping events older than PENDING_TTL."""
+        now = time.monotonic()
+        with self._lock:
+            for user_id in list(self._pending):
+                pending = self._pending[user_id]
+                while pending and now - pending[0][1] > PENDING_TTL:
+                    pending.popleft()
+                    self.expired += 1
+                if not pending:
+                    del self._pending[user_id]
+            return list(self._pending)
+
+    async def watch(self, check, interval: float = WATCH_INTERVAL):
+        """
+        Background loop: every ``interval`` run ``check(pending user ids)``
+        in a worker thread; it reads fresh state rows and calls ``observe``.
+        """
+        while True:
+            try:
+                await asyncio.to_thread(check, self.pending_users())
+            except Exception as e:
+                print(f"⚠️  State latency watcher error: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        def summary(values):
+            samples = sorted(values)
+
+            def pct(p):
+                return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3) if samples else None
+
+            return {"count": len(samples), "p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "max": pct(1.0)}
+
+        with self._lock:
+            by_source = {source: list(values) for source, values in self._samples.items()}
+            pending = sum(len(p) for p in self._pending.values())
+        return {
+            "confirmed": self.confirmed,
+            "pending": pending,
+            "expired": self.expired,
+            "latency_ms": summary([v for values in by_source.values() for v in values]),
+            "by_source": {source: summary(values) for source, values in by_source.items()},
+        }
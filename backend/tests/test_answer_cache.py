@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from backend import answer_cache
+from backend.answer_cache import AnswerCache, describe_bucket, state_bucket
+
+STATE = {"nitrogen": 212.4, "phosphorus": 25.1, "potassium": 150.0, "moisture": 22.7,
+         "status_n": "red", "status_p": "green", "status_k": "yellow", "crop": "Wheat"}
+RESPONSE = {"answer": "Apply 40 kg/acre urea", "provider": "openai/gpt-4o-mini"}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache.time, "monotonic", clock)
+    return clock
+
+
+def _vector(seed):
+    return np.random.default_rng(seed).standard_normal(16)
+
+
+def _partition(question="kitna urea dalu?", state=STATE, filters=None):
+    return AnswerCache.partition("openai", "model", state, question, filters)
+
+
+def test_hit_by_similarity_and_exact_text():
+    cache = AnswerCache()
+    vector = _vector(1)
+    assert cache.lookup(_partition(), "kitna urea dalu?", vector, 0.9) is None
+    cache.store(_partition(), "kitna urea dalu?", vector, RESPONSE, 3.0)
+
+    hit = cache.lookup(_partition(), "Kitna urea dalu", None, 0.9)
+    assert hit["cached"] is True and hit["answer"] == RESPONSE["answer"]
+    near = cache.lookup(_partition(), "kitna urea daalu", vector + 0.01, 0.9)
+    assert near is not None and near["similarity"] > 0.9
+    assert cache.lookup(_partition(), "something else", _vector(2), 0.9) is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["exact_hits"], stats["misses"]) == (2, 1, 2)
+    assert stats["saved_seconds"] == 6.0
+
+
+def test_partition_separates_buckets_cues_and_regions():
+    cache = AnswerCache()
+    vector = _vector(1)
+    cache.store(_partition(), "kitna urea dalu?", vector, RESPONSE, 1.0)
+    wet = dict(STATE, moisture=50)
+    assert cache.lookup(_partition(state=wet), "kitna urea dalu?", vector, 0.5) is None
+    assert cache.lookup(_partition("kitna DAP dalu?"), "kitna DAP dalu?", vector, 0.5) is None
+    assert cache.lookup(_partition(filters={"region": {"india", "pune"}}), "kitna urea dalu?", vector, 0.5) is None
+    # Readings inside the same bands share the entry
+    same_bucket = dict(STATE, nitrogen=101.0, moisture=29.0)
+    assert cache.lookup(_partition(state=same_bucket), "kitna urea dalu?", vector, 0.5) is not None
+
+
+def test_bucket_description_carries_no_readings():
+    text = describe_bucket(state_bucket(STATE))
+    for reading in ("212.4", "25.1", "150.0", "22.7"):
+        assert reading not in text
+    assert "Nitrogen: low (below 280 kg/ha)" in text
+    assert "Moisture: 15-30%" in text
+
+
+def test_ttl_expiry(clock):
+    cache = AnswerCache(ttl=60)
+    cache.store(_partition(), "kitna urea dalu?", _vector(1), RESPONSE, 1.0)
+    clock.now += 59
+    assert cache.lookup(_partition(), "kitna urea dalu?") is not None
+    clock.now += 2
+    assert cache.lookup(_partition(), "kitna urea dalu?") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction_by_entry_count():
+    cache = AnswerCache(max_entries=2)
+    for i, question in enumerate(("q one", "q two")):
+        cache.store(_partition(question), question, _vector(i), RESPONSE, 1.0)
+    assert cache.lookup(_partition("q one"), "q one") is not None      # q one is now most recent
+    cache.store(_partition("q three"), "q three", _vector(3), RESPONSE, 1.0)
+    assert cache.lookup(_partition("q two"), "q two") is None
+    assert cache.lookup(_partition("q one"), "q one") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_budget():
+    big = {"answer": "x" * 1000}
+    cache = AnswerCache(max_entries=100, max_bytes=3000)
+    for i in range(5):
+        cache.store(_partition(f"q {i}"), f"q {i}", _vector(i), big, 1.0)
+    stats = cache.stats()
+    assert stats["bytes"] <= 3000
+    assert stats["entries"] == 2 and stats["evictions"] == 3
+    cache.store(_partition("huge"), "huge", None, {"answer": "x" * 5000}, 1.0)
+    assert cache.lookup(_partition("huge"), "huge") is None
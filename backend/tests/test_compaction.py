@@ -0,0 +1,112 @@
+import csv
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from pathway_pipeline import compaction
+from pathway_pipeline.compaction import MANIFEST, baseline_path, compact, read_manifest
+from pathway_pipeline.event_log import EventLog
+from pathway_pipeline.streaming_logic import EVENT_EFFECTS
+
+NOW = datetime(2025, 3, 1)
+PER_LITER = EVENT_EFFECTS["irrigation"]["moisture"]
+
+
+@pytest.fixture
+def farm(tmp_path):
+    """Event log with three sealed segments of old irrigation, one live segment, and an SHC file."""
+    shc = tmp_path / "shc.csv"
+    shc.write_text("uid,nitrogen,phosphorus,potassium,moisture\nfarmer,240,18,120,25\n")
+    log_dir = str(tmp_path / "event_log")
+    log = EventLog(log_dir, segment_bytes=1)     # one record per segment
+    for day in (1, 2, 3):
+        log.append("irrigation", {"timestamp": f"2025-01-0{day}T00:00:00", "user_id": "farmer", "water_liters": 100})
+    log.append("irrigation", {"timestamp": "2025-02-28T00:00:00", "user_id": "farmer", "water_liters": 50})
+    weather = tmp_path / "live_weather.jsonl"
+    weather.write_text("")
+
+    def run(**kwargs):
+        return compact(30, log_dir, str(shc), str(weather), str(tmp_path / "pathway_state"), now=NOW, **kwargs)
+
+    return run, log_dir, shc
+
+
+def _moisture(path):
+    with open(path, newline="") as f:
+        return float(next(csv.DictReader(f))["moisture"])
+
+
+def test_commit_folds_old_segments_and_archives_them(farm):
+    run, log_dir, shc = farm
+    manifest = run()
+    assert manifest == read_manifest(log_dir)
+    assert manifest["through_segment"] == 2
+    assert manifest["folded_events"] == 3
+    assert baseline_path(str(shc), log_dir) == manifest["baseline"]
+    assert _moisture(manifest["baseline"]) == pytest.approx(25 + 300 * PER_LITER)
+
+    log = EventLog(log_dir)
+    assert log.segments() == [3]
+    assert sorted(os.listdir(os.path.join(log_dir, "archive"))) == [f"{s:08d}.log.gz" for s in range(3)]
+    assert [r["water_liters"] for r in log.read_user("farmer")] == [50]
+
+    assert run() is None
+    assert read_manifest(log_dir) == manifest
+
+
+def test_crash_before_commit_leaves_log_untouched(farm, monkeypatch):
+    run, log_dir, shc = farm
+
+    def crash(path, write):
+        if path.endswith(MANIFEST):
+            raise OSError("power cut")
+        return real_write(path, write)
+
+    real_write = compaction._write_atomic
+    monkeypatch.setattr(compaction, "_write_atomic", crash)
+    with pytest.raises(OSError):
+        run()
+    assert read_manifest(log_dir) is None
+    assert baseline_path(str(shc), log_dir) == str(shc)
+    assert EventLog(log_dir).segments() == [0, 1, 2, 3]
+
+    monkeypatch.setattr(compaction, "_write_atomic", real_write)
+    manifest = run()
+    assert _moisture(manifest["baseline"]) == pytest.approx(25 + 300 * PER_LITER)
+
+
+def test_crash_after_commit_is_finished_without_double_counting(farm, monkeypatch):
+    run, log_dir, shc = farm
+
+    def crash(*args):
+        raise OSError("power cut")
+
+    with monkeypatch.context() as m:
+        m.setattr(compaction, "_finish", crash)
+        with pytest.raises(OSError):
+            run()
+    manifest = read_manifest(log_dir)
+    assert manifest["through_segment"] == 2
+    assert EventLog(log_dir).segments() == [0, 1, 2, 3]
+
+    # The next run completes the cleanup and finds nothing new to fold
+    assert run() is None
+    assert read_manifest(log_dir) == manifest
+    assert EventLog(log_dir).segments() == [3]
+    assert _moisture(baseline_path(str(shc), log_dir)) == pytest.approx(25 + 300 * PER_LITER)
+
+
+def test_weather_lines_before_the_horizon_are_folded(farm, tmp_path):
+    run, log_dir, shc = farm
+    weather = tmp_path / "live_weather.jsonl"
+    old = json.dumps({"timestamp": "2025-01-05T00:00:00", "rain_mm": 10}) + "\n"
+    new = json.dumps({"timestamp": "2025-02-27T00:00:00", "rain_mm": 4}) + "\n"
+    weather.write_text(old + new)
+
+    manifest = run()
+    assert manifest["folded_events"] == 4
+    assert weather.read_text() == new
+    assert _moisture(manifest["baseline"]) == pytest.approx(
+        25 + 300 * PER_LITER + 10 * EVENT_EFFECTS["rain"]["moisture"])
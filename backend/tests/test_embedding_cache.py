@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+
+from pathway_pipeline.embedding_cache import EmbeddingCache
+
+
+def _open(root):
+    return EmbeddingCache(str(root))
+
+
+def test_round_trip_across_processes(tmp_path):
+    writer, reader = _open(tmp_path), _open(tmp_path)
+    writer.put("p", "m", "urea", np.arange(8))
+    assert np.allclose(reader.get("p", "m", "urea"), np.arange(8))
+    assert reader.get("p", "other-model", "urea") is None
+
+
+def test_torn_tail_is_truncated_and_later_records_survive(tmp_path):
+    cache = _open(tmp_path)
+    cache.put("p", "m", "a", np.ones(8))
+    cache.close()
+    with open(cache.path, "ab") as f:
+        f.write(b"x" * 20)      # a writer that died mid-append
+
+    cache = _open(tmp_path)
+    assert cache.stats()["truncated_bytes"] == 20
+    cache.put("p", "m", "b", np.full(8, 2.0))
+    cache.put("p", "m", "c", np.full(8, 3.0))
+    cache.close()
+
+    reopened = _open(tmp_path)
+    assert [reopened.get("p", "m", text) is not None for text in "abc"] == [True, True, True]
+    assert reopened.stats()["entries"] == 3
+
+
+def test_corrupt_record_fails_crc_and_is_dropped(tmp_path):
+    cache = _open(tmp_path)
+    cache.put("p", "m", "a", np.ones(8))
+    cache.put("p", "m", "b", np.ones(8))
+    cache.close()
+    fd = os.open(cache.path, os.O_RDWR)
+    os.pwrite(fd, b"\xff", os.path.getsize(cache.path) - 3)
+    os.close(fd)
+
+    reopened = _open(tmp_path)
+    assert reopened.get("p", "m", "a") is not None
+    assert reopened.get("p", "m", "b") is None
+    reopened.put("p", "m", "b", np.ones(8))
+    assert _open(tmp_path).get("p", "m", "b") is not None
@@ -0,0 +1,111 @@
+import json
+import os
+
+import pytest
+
+from pathway_pipeline.event_log import (
+    RECORD_HEADER, EventLog, decode_cursor, encode_cursor, encode_record, migrate_legacy_streams,
+)
+
+
+def _event(i, user="farmer", day=1):
+    return {"timestamp": f"2025-01-{day:02d}T00:{i // 60:02d}:{i % 60:02d}", "user_id": user, "rain_mm": i}
+
+
+def _page(log, user, **kwargs):
+    return [record["rain_mm"] for _, record in log.iter_user(user, **kwargs)]
+
+
+def test_append_and_read_back_per_user(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append_many([("rain", _event(i, "a" if i % 2 else "b")) for i in range(6)])
+    assert [r["rain_mm"] for r in log.read_user("a")] == [1, 3, 5]
+    assert [r["rain_mm"] for r in log.read_user("b")] == [0, 2, 4]
+    assert [record["stream"] for _, _, record in log.scan()] == ["rain"] * 6
+
+
+def test_corrupt_record_is_skipped(tmp_path):
+    log = EventLog(str(tmp_path))
+    positions = log.append_many([("rain", _event(i)) for i in range(3)])
+    segment, position = positions[1]
+    with open(log.segment_path(segment), "r+b") as f:
+        f.seek(position + RECORD_HEADER.size + 2)
+        f.write(b"#")
+
+    assert [record["rain_mm"] for _, _, record in log.scan()] == [0, 2]
+    assert [r["rain_mm"] for r in log.read_user("farmer")] == [0, 2]
+
+
+def test_torn_tail_is_truncated_and_unindexed_records_recovered(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append_many([("rain", _event(i)) for i in range(2)])
+    path = log.segment_path(0)
+    # One writer crashed after its record but before indexing it, the next halfway through its record
+    unindexed = encode_record({"stream": "rain", **_event(2)})
+    with open(path, "ab") as f:
+        f.write(unindexed + encode_record({"stream": "rain", **_event(3)})[:-4])
+    valid_end = os.path.getsize(path) - len(encode_record({"stream": "rain", **_event(3)})) + 4
+
+    log = EventLog(str(tmp_path))
+    assert os.path.getsize(path) == valid_end
+    assert [r["rain_mm"] for r in log.read_user("farmer")] == [0, 1, 2]
+    log.append("rain", _event(4))
+    assert [record["rain_mm"] for _, _, record in log.scan()] == [0, 1, 2, 4]
+
+
+def test_failed_append_rolls_back_so_a_retry_does_not_duplicate(tmp_path, monkeypatch):
+    log = EventLog(str(tmp_path))
+    log.append("rain", _event(0))
+
+    def fail(user_id, entries):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr(log, "_append_index", fail)
+        with pytest.raises(OSError):
+            log.append_many([("rain", _event(1)), ("rain", _event(2, "new"))])
+    assert not os.path.exists(log.index_path("new"))
+
+    log.append_many([("rain", _event(1)), ("rain", _event(2, "new"))])
+    assert [record["rain_mm"] for _, _, record in log.scan()] == [0, 1, 2]
+
+
+def test_cursor_pages_cover_every_event_once_across_runs(tmp_path):
+    log = EventLog(str(tmp_path))
+    # Second batch is older than the first, so the index holds two sorted runs
+    log.append_many([("rain", _event(i, day=2)) for i in range(10)])
+    log.append_many([("rain", _event(i, day=1)) for i in range(10, 15)])
+    newest_first = list(range(9, -1, -1)) + list(range(14, 9, -1))
+
+    seen, before = [], None
+    while True:
+        page = []
+        for entry, record in log.iter_user("farmer", before=before):
+            page.append((entry, record["rain_mm"]))
+            if len(page) == 4:
+                break
+        if not page:
+            break
+        seen += [value for _, value in page]
+        before = decode_cursor(encode_cursor(page[-1][0]))
+    assert seen == newest_first
+
+    newest = next(log.iter_user("farmer"))[0]
+    assert _page(log, "farmer", after=newest) == []
+    assert _page(log, "farmer", reverse=False, before=newest) == list(range(10, 15)) + list(range(9))
+    assert _page(log, "farmer", start_ts=newest[2]) == [9]
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_legacy_streams_migrate_once(tmp_path):
+    legacy = tmp_path / "rainfall_stream.jsonl"
+    legacy.write_text(json.dumps({"timestamp": "2025-01-01T00:00:00", "rain_mm": 5}) + "\n\nnot json\n")
+    log = EventLog(str(tmp_path / "log"))
+    assert migrate_legacy_streams(log, {"rain": str(legacy)}) == 1
+    assert migrate_legacy_streams(log, {"rain": str(legacy)}) == 0
+    assert log.read_user("farmer") == [{"stream": "rain", "timestamp": "2025-01-01T00:00:00", "rain_mm": 5,
+                                        "user_id": "farmer"}]
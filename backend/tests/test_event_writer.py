@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from backend import event_writer as writer_module
+from backend.event_writer import EventWriter
+from pathway_pipeline.event_log import EventLog
+
+
+def _event(i, user="farmer"):
+    return ("rain", {"user_id": user, "timestamp": f"2026-01-01T00:00:{i:02d}", "rain_mm": i})
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(writer_module, "RETRY_BACKOFF", 0.001)
+
+
+def _flaky(log, failures):
+    append_many = log.append_many
+    calls = {"n": 0}
+
+    def flaky(events, sync=False):
+        calls["n"] += 1
+        if calls["n"] <= failures:
+            raise OSError("disk full")
+        return append_many(events, sync)
+
+    log.append_many = flaky
+    return calls
+
+
+def test_fire_and_forget_batch_is_retried(tmp_path):
+    log = EventLog(str(tmp_path))
+    calls = _flaky(log, 2)
+    writer = EventWriter(log, window=0)
+
+    async def scenario():
+        await writer.submit(*_event(1))
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert calls["n"] == 3
+    assert [r["rain_mm"] for r in log.read_user("farmer")] == [1]
+    stats = writer.stats()
+    assert stats["errors"] == 2 and stats["lost_events"] == 0 and stats["events_written"] == 1
+
+
+def test_lost_events_are_reported_when_retries_run_out(tmp_path):
+    log = EventLog(str(tmp_path))
+    _flaky(log, writer_module.FLUSH_RETRIES + 1)
+    writer = EventWriter(log, window=0)
+
+    async def scenario():
+        await writer.submit(*_event(1))
+        await writer.stop()
+        # The writer keeps going afterwards
+        return await writer.submit(*_event(2), wait=True)
+
+    assert asyncio.run(scenario()) is not None
+    stats = writer.stats()
+    assert stats["lost_events"] == 1 and "disk full" in stats["last_error"]
+    assert [r["rain_mm"] for r in log.read_user("farmer")] == [2]
+
+
+def test_failed_append_rolls_back_records_and_index(tmp_path, monkeypatch):
+    log = EventLog(str(tmp_path))
+    log.append_many([_event(1)])
+    segment_bytes = sum(p.stat().st_size for p in (tmp_path / "segments").iterdir())
+
+    def broken_index(user_id, entries):
+        raise OSError("index write failed")
+
+    monkeypatch.setattr(log, "_append_index", broken_index)
+    with pytest.raises(OSError):
+        log.append_many([_event(2), _event(3, user="other")])
+    monkeypatch.undo()
+
+    assert sum(p.stat().st_size for p in (tmp_path / "segments").iterdir()) == segment_bytes
+    log.append_many([_event(4)])
+    assert [r["rain_mm"] for r in log.read_user("farmer")] == [1, 4]
+    assert [r["rain_mm"] for _, _, r in log.scan()] == [1, 4]
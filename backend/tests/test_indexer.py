@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from pathway_pipeline.indexer import reindex
+from pathway_pipeline.vector_store import load_store, read_embedder_state
+
+PARAGRAPHS = [
+    "Urea supplies nitrogen. Split the dose between sowing and tillering so the crop can take it up.",
+    "DAP supplies phosphorus and some nitrogen. Place it below the seed at sowing.",
+    "Muriate of potash supplies potassium. Apply it before sowing on sandy soils.",
+]
+
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch):
+    """A tiny knowledge base of one seed entry and one doc, indexed with the default provider."""
+    for name in ("OPENAI_API_KEY", "GOOGLE_API_KEY"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("EMBEDDING_CACHE", "0")
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    seed = tmp_path / "seed_knowledge.json"
+    seed.write_text(json.dumps([{"content": "Gypsum supplies calcium and sulphur.", "metadata": {"nutrient": "sulphur"}}]))
+    guide = docs / "guide.txt"
+    # Each paragraph over CHUNK_WORDS words, so each is its own chunk
+    guide.write_text("\n\n".join(" ".join([p] * 6) for p in PARAGRAPHS))
+
+    def run(**kwargs):
+        return reindex(str(tmp_path / "store"), docs_glob=str(docs / "*.txt"), seed_path=str(seed), **kwargs)
+
+    return run, guide
+
+
+def test_one_paragraph_edit_embeds_one_chunk(kb):
+    run, guide = kb
+    first = run()
+    assert first["provider"] == "mock"
+    assert first["stats"]["embedded"] == 4
+
+    text = guide.read_text().replace("Place it below the seed", "Drill it beside the seed")
+    guide.write_text(text)
+    second = run()
+    assert second["model"] == first["model"]
+    assert second["stats"]["embedded"] == 1
+    assert second["stats"]["reused"] == 3
+    assert second["stats"]["tombstoned"] == 1
+    assert second["stats"]["changed_files"] == ["guide.txt"]
+
+    assert run() is None
+
+
+def test_unchanged_chunks_keep_their_vectors(kb):
+    run, guide = kb
+    run()
+    root = str(guide.parent.parent / "store")
+    _, before_docs, _, _, before = load_store(root)
+    state = read_embedder_state(root)
+
+    guide.write_text(guide.read_text() + "\n\n" + "Zinc sulphate corrects khaira disease in paddy. " * 12)
+    stats = run()["stats"]
+    assert (stats["embedded"], stats["reused"], stats["tombstoned"]) == (1, 4, 0)
+    assert read_embedder_state(root) == state
+    _, after_docs, _, _, after = load_store(root)
+    rows = {doc["hash"]: i for i, doc in enumerate(after_docs)}
+    for i, doc in enumerate(before_docs):
+        assert (after[rows[doc["hash"]]] == before[i]).all()
+
+
+def test_removed_file_tombstones_its_chunks(kb):
+    run, guide = kb
+    run()
+    guide.unlink()
+    stats = run()["stats"]
+    assert (stats["chunks"], stats["embedded"], stats["reused"], stats["tombstoned"]) == (1, 0, 1, 3)
+
+
+def test_full_rebuild_refits_the_idf(kb):
+    run, guide = kb
+    first = run()
+    guide.write_text(guide.read_text() + "\n\n" + "Boron deficiency hollows cauliflower stems. " * 12)
+    full = run(full=True)
+    assert full["stats"]["embedded"] == 5
+    assert full["model"] != first["model"]
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+pw = pytest.importorskip("pathway")
+
+from pathway_pipeline import ingest
+from pathway_pipeline.event_log import EventLog
+from pathway_pipeline.ingest import EventLogSubject
+
+
+class RecordingSubject(EventLogSubject):
+    """EventLogSubject with the engine calls captured instead of sent to Pathway."""
+
+    COMMIT_EVERY = 4
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rows, self.offsets = [], []
+
+    def next(self, **row):
+        self.rows.append(row)
+
+    def _report_offset(self, offset: bytes):
+        self.offsets.append((offset, len(self.rows)))
+
+    def commit(self):
+        pass
+
+    def _disable_commits(self):
+        pass
+
+    def _enable_commits(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _rain(i, user="farmer"):
+    return "rain", {"timestamp": "2025-01-01T00:00:00", "user_id": user, "rain_mm": float(i)}
+
+
+def test_reported_offsets_cover_exactly_the_rows_emitted(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append_many([_rain(i) for i in range(10)])
+    subject = RecordingSubject(str(tmp_path), follow=False)
+    subject.run()
+    assert [row["amount"] for row in subject.rows] == [float(i) for i in range(10)]
+
+    # Resuming from any committed offset emits exactly the rows after it
+    for offset, emitted in subject.offsets:
+        resumed = RecordingSubject(str(tmp_path), follow=False)
+        resumed._seek(offset)
+        resumed.run()
+        assert [row["amount"] for row in resumed.rows] == [float(i) for i in range(emitted, 10)]
+
+
+def test_restart_from_checkpoint_reads_only_new_events(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append_many([_rain(i) for i in range(10)])
+    first = RecordingSubject(str(tmp_path), follow=False)
+    first.run()
+
+    log.append_many([_rain(i) for i in range(10, 13)])
+    restarted = RecordingSubject(str(tmp_path), follow=False)
+    restarted._seek(first.offsets[-1][0])
+    restarted.run()
+    assert [row["amount"] for row in restarted.rows] == [10.0, 11.0, 12.0]
+
+
+@pytest.mark.skipif(not os.getenv("PATHWAY_LICENSE_KEY"), reason="Pathway persistence needs PATHWAY_LICENSE_KEY")
+def test_persisted_pipeline_restart_skips_committed_events(tmp_path, monkeypatch):
+    from pathway_pipeline.main_pipeline import EventLogSchema, persistence_config
+
+    log = EventLog(str(tmp_path / "log"))
+    log.append_many([_rain(i, f"u{i % 3}") for i in range(30)])
+    read = []
+    flatten = ingest.pipeline_event
+    monkeypatch.setattr(ingest, "pipeline_event", lambda record: read.append(1) or flatten(record))
+
+    def run():
+        read.clear()
+        pw.internals.parse_graph.G.clear()
+        events = ingest.load_event_log(EventLogSchema, str(tmp_path / "log"), follow=False)
+        totals = events.groupby(pw.this.user_id).reduce(pw.this.user_id, total=pw.reducers.sum(pw.this.amount))
+        pw.io.csv.write(totals, str(tmp_path / "totals.csv"), name="totals")
+        pw.run(persistence_config=persistence_config(str(tmp_path / "state"), 100),
+               monitoring_level=pw.MonitoringLevel.NONE)
+        return len(read)
+
+    assert run() == 30
+    log.append_many([_rain(i, "u0") for i in range(30, 35)])
+    assert run() == 5
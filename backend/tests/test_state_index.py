@@ -0,0 +1,71 @@
+import os
+
+from backend.state_index import SoilStateIndex
+
+HEADER = "user_id,nitrogen,moisture,time,diff\n"
+
+
+def _append(path, *rows):
+    with open(path, "a") as f:
+        f.writelines(row + "\n" for row in rows)
+
+
+def test_update_folds_retraction_and_insertion(tmp_path):
+    path = tmp_path / "current_state.csv"
+    path.write_text(HEADER)
+    _append(path, "u1,300,20,2,1", "u2,400,25,2,1")
+    index = SoilStateIndex(str(path))
+    assert index.refresh()
+    assert index.get("u1")["nitrogen"] == "300"
+    assert index.pop_changed() == {"u1", "u2"}
+
+    # Insertion written before the retraction of the old row, in one batch
+    _append(path, "u1,310,18,4,1", "u1,300,20,4,-1")
+    index.refresh()
+    assert index.get("u1")["nitrogen"] == "310"
+    assert index.get("u2")["nitrogen"] == "400"
+    assert index.pop_changed() == {"u1"}
+    assert index.pop_changed() == set()
+
+
+def test_retraction_alone_removes_the_user(tmp_path):
+    path = tmp_path / "current_state.csv"
+    path.write_text(HEADER)
+    _append(path, "u1,300,20,2,1")
+    index = SoilStateIndex(str(path))
+    index.refresh()
+    _append(path, "u1,300,20,6,-1")
+    index.refresh()
+    assert index.get("u1") is None
+
+
+def test_half_written_row_waits_for_its_newline(tmp_path):
+    path = tmp_path / "current_state.csv"
+    path.write_text(HEADER + "u1,300,20,2,1\nu1,320,20,4")
+    index = SoilStateIndex(str(path))
+    index.refresh()
+    assert index.get("u1")["nitrogen"] == "300"
+    _append(path, ",1", "u1,300,20,4,-1")
+    index.refresh()
+    assert index.get("u1")["nitrogen"] == "320"
+
+
+def test_recreated_file_rebuilds_state(tmp_path):
+    path = tmp_path / "current_state.csv"
+    path.write_text(HEADER + "u1,300,20,2,1\nu2,400,25,2,1\n")
+    index = SoilStateIndex(str(path))
+    index.refresh()
+    index.pop_changed()
+
+    # Pipeline restart: a new, shorter file replaces the old one
+    replacement = tmp_path / "next.csv"
+    replacement.write_text(HEADER + "u1,500,30,1,1\n")
+    os.replace(replacement, path)
+    index.refresh()
+    assert index.get("u1")["nitrogen"] == "500"
+    assert index.get("u2") is None
+    assert index.pop_changed() == {"u1", "u2"}
+
+    path.unlink()
+    assert not index.refresh()
+    assert index.get("u1") is None
@@ -0,0 +1,49 @@
+import asyncio
+
+from backend import state_latency as latency_module
+from backend.state_index import SoilStateIndex
+from backend.state_latency import StateLatencyTracker
+
+HEADER = "user_id,nitrogen,last_event_id,time,diff\n"
+
+
+def test_watch_confirms_when_the_row_appears(tmp_path):
+    csv_path = tmp_path / "current_state.csv"
+    csv_path.write_text(HEADER)
+    index = SoilStateIndex(str(csv_path))
+    tracker = StateLatencyTracker()
+
+    def check(user_ids):
+        index.refresh()
+        changed = index.pop_changed()
+        for user_id in user_ids:
+            if user_id in changed:
+                tracker.observe(user_id, index.get(user_id), "csv")
+
+    async def scenario():
+        entry = tracker.stamp("farmer", {})
+        watcher = asyncio.create_task(tracker.watch(check, interval=0.01))
+        await asyncio.sleep(0.05)
+        assert tracker.stats()["confirmed"] == 0
+        with open(csv_path, "a") as f:
+            f.write(f"farmer,300,{entry['event_id']},2,1\n")
+        for _ in range(100):
+            if tracker.stats()["confirmed"]:
+                break
+            await asyncio.sleep(0.01)
+        watcher.cancel()
+
+    asyncio.run(scenario())
+    stats = tracker.stats()
+    assert stats["confirmed"] == 1 and stats["pending"] == 0
+    assert stats["by_source"]["csv"]["count"] == 1
+    assert tracker.pending_users() == []
+
+
+def test_pending_users_expires_old_events(monkeypatch):
+    tracker = StateLatencyTracker()
+    tracker.stamp("farmer", {})
+    now = latency_module.time.monotonic()
+    monkeypatch.setattr(latency_module.time, "monotonic", lambda: now + latency_module.PENDING_TTL + 1)
+    assert tracker.pending_users() == []
+    assert tracker.stats()["expired"] == 1
@@ -21,7 +21,7 @@ import SoilHealthPage from './components/SoilHealthPage';
 import LiveEventsPage from './components/LiveEventsPage';
 import AdvisoryChatPage from './components/AdvisoryChatPage';
 import SimulationPage from './components/SimulationPage';
-import { getSoilState, getProfile } from './api/apiClient';
+import { getSoilState, getProfile, subscribeLiveState } from './api/apiClient';
 import { Target } from 'lucide-react';
 
 function AppContent() {
@@ -54,8 +54,11 @@ function AppContent() {
         // Only fetch data if not on login/register/password-reset pages
         if (!location.pathname.match(/\/(login|register|forgot-password|reset-password)/)) {
             fetchData();
-            const interval = setInterval(fetchData, 2000);
-            return () => clearInterval(interval);
+            // Soil state arrives over the live push channel instead of polling
+            return subscribeLiveState((message, state) => {
+                triggerHeartbeat();
+                if (state) setSoilState((prev) => ({ ...prev, ...state }));
+            });
         }
     }, [location.pathname]);
 
@@ -136,6 +136,127 @@ export const getHistoryLog = async () => {
     }
 };
 
+// ── Live soil-state push channel ────────────────────────────────────────────
+// One shared WebSocket per tab (backend/live_stream.py). The server only sends
+// deltas, so we keep the merged state here and hand full objects to listeners.
+// The merged state belongs to one user: it is dropped on logout and whenever
+// the stored token names someone else.
+const live = {
+    socket: null,
+    listeners: new Set(),
+    user: null,
+    state: null,
+    version: null,
+    epoch: null,
+    retryDelay: 1000,
+    retryTimer: null,
+};
+
+const notifyLive = (message) => {
+    live.listeners.forEach((listener) => listener(message, live.state));
+};
+
+// Username (JWT "sub") a token was issued to, or null if it cannot be read
+const tokenUser = (token) => {
+    try {
+        const payload = token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/');
+        return JSON.parse(atob(payload)).sub ?? null;
+    } catch {
+        return null;
+    }
+};
+
+/**
+ * Close the push channel and forget the merged state (call on logout).
+ * Subscribers stay registered and get the next user's state once connected.
+ */
+export const resetLiveState = () => {
+    clearTimeout(live.retryTimer);
+    live.retryTimer = null;
+    const socket = live.socket;
+    live.socket = null;
+    if (socket) socket.close();
+    live.user = null;
+    live.state = null;
+    live.version = null;
+    live.epoch = null;
+    live.retryDelay = 1000;
+};
+
+const connectLive = () => {
+    const token = localStorage.getItem('soiltwin_token');
+    if (!token) return;
+    const user = tokenUser(token);
+    if (user !== live.user) {
+        resetLiveState();
+        live.user = user;
+    }
+    if (live.socket) return;
+    clearTimeout(live.retryTimer);
+    live.retryTimer = null;
+
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const params = new URLSearchParams({ token });
+    if (live.version !== null && live.epoch) {
+        params.set('since', live.version);
+        params.set('epoch', live.epoch);
+    }
+
+    const socket = new WebSocket(`${protocol}://${window.location.host}/ws/live?${params}`);
+    live.socket = socket;
+
+    socket.onopen = () => {
+        if (live.socket !== socket) return;
+        live.retryDelay = 1000;
+    };
+
+    // Handlers of a socket that was replaced or closed must not touch the shared state
+    socket.onmessage = (msg) => {
+        if (live.socket !== socket) return;
+        const message = JSON.parse(msg.data);
+        live.epoch = message.epoch;
+        live.version = message.version;
+
+        if (message.type === 'snapshot' || message.type === 'state') {
+            live.state = message.state;
+        } else if (message.type === 'delta') {
+            live.state = { ...live.state, ...message.changes };
+        }
+        if (message.type !== 'heartbeat') notifyLive(message);
+    };
+
+    socket.onclose = (evt) => {
+        if (live.socket !== socket) return;
+        live.socket = null;
+        // 1008 = rejected token; let the REST calls handle re-login
+        if (evt.code === 1008 || live.listeners.size === 0) return;
+        live.retryTimer = setTimeout(connectLive, live.retryDelay);
+        live.retryDelay = Math.min(live.retryDelay * 2, 30000);
+    };
+};
+
+/**
+ * Subscribe to pushed soil-state updates for the logged-in user.
+ * listener(message, state) is called for snapshot/state/delta/event messages.
+ * Returns an unsubscribe function.
+ */
+export const subscribeLiveState = (listener) => {
+    live.listeners.add(listener);
+    connectLive();
+    if (live.state) listener({ type: 'snapshot', state: live.state }, live.state);
+
+    return () => {
+        live.listeners.delete(listener);
+        if (live.listeners.size === 0) {
+            clearTimeout(live.retryTimer);
+            live.retryTimer = null;
+            const socket = live.socket;
+            live.socket = null;
+            if (socket) socket.close();
+        }
+    };
+};
+
 // Export axios-like apiClient for compatibility
 export const apiClient = {
     post: async (url, data, config = {}) => {
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { Download, Calendar, ExternalLink, Loader2, CheckCircle2 } from 'lucide-react';
-import { getHistoryLog } from '../api/apiClient';
+import { getHistoryLog, subscribeLiveState } from '../api/apiClient';
 import PageLayout from './common/PageLayout';
 
 
@@ -17,9 +17,10 @@ const HistoryView = () => {
             setLoading(false);
         };
         loadHistory();
-        // Poll every 5s for updates
-        const interval = setInterval(loadHistory, 5000);
-        return () => clearInterval(interval);
+        // Reload only when the pipeline logs a new event for this user
+        return subscribeLiveState((message) => {
+            if (message.type === 'event') loadHistory();
+        });
     }, []);
 
 
@@ -2,7 +2,7 @@ import EventControls from './EventControls';
 import ActivityLog from './ActivityLog';
 import PageLayout from './common/PageLayout';
 import SoilDashboard from './SoilDashboard';
-import { getSoilState } from '../api/apiClient';
+import { getSoilState, subscribeLiveState } from '../api/apiClient';
 import { useState, useEffect } from 'react';
 import { FlaskConical, Info } from 'lucide-react';
 
@@ -15,8 +15,10 @@ const SimulationPage = () => {
             if (data && data.status !== 'No data') setSoilState(data);
         };
         fetch();
-        const interval = setInterval(fetch, 2000);
-        return () => clearInterval(interval);
+        // Server pushes changes; no polling needed
+        return subscribeLiveState((message, state) => {
+            if (state) setSoilState((prev) => ({ ...prev, ...state }));
+        });
     }, []);
 
     return (
@@ -1,6 +1,6 @@
 import SoilDashboard from './SoilDashboard';
 import TrendsView from './TrendsView';
-import { getSoilState } from '../api/apiClient';
+import { getSoilState, subscribeLiveState } from '../api/apiClient';
 import { useState, useEffect } from 'react';
 
 const SoilHealthPage = () => {
@@ -12,8 +12,10 @@ const SoilHealthPage = () => {
             if (data && data.status !== 'No data') setSoilState(data);
         };
         fetch();
-        const interval = setInterval(fetch, 3000);
-        return () => clearInterval(interval);
+        // Server pushes changes; no polling needed
+        return subscribeLiveState((message, state) => {
+            if (state) setSoilState((prev) => ({ ...prev, ...state }));
+        });
     }, []);
 
     return (
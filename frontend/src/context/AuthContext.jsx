@@ -1,4 +1,5 @@
 import React, { createContext, useState, useContext, useEffect } from 'react';
+import { resetLiveState } from '../api/apiClient';
 
 const AuthContext = createContext(null);
 
@@ -66,6 +67,8 @@ export const AuthProvider = ({ children }) => {
         localStorage.removeItem('soiltwin_token');
         localStorage.removeItem('soiltwin_refresh_token');
         localStorage.removeItem('soiltwin_user');
+        // The next user on this tab must not see (or resume from) this user's live state
+        resetLiveState();
         setToken(null);
         setUser(null);
     };
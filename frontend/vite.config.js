@@ -23,6 +23,12 @@ export default defineConfig({
             '/api': {
                 target: 'http://localhost:8000',
                 changeOrigin: true,
+            },
+            // Live soil-state push channel (backend/live_stream.py)
+            '/ws': {
+                target: 'ws://localhost:8765',
+                ws: true,
+                rewrite: (path) => path.replace(/^\/ws/, ''),
             }
         }
     },
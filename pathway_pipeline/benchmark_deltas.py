@@ -0,0 +1,173 @@
+"""
+Event Delta Benchmark
+Throughput of the per-user delta reducer: the old per-row Python UDF path vs the native table-driven expressions
+
+Usage:
+    python pathway_pipeline/benchmark_deltas.py [events] [users]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pathway as pw
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pathway_pipeline.main_pipeline import compute_event_effects
+from pathway_pipeline.streaming_logic import EVENT_EFFECTS
+
+EVENT_TYPES = np.array(["rain", "irrigation", "fertilizer", "harvest", "amendment"])
+SUBTYPES = {
+    "rain": [""],
+    "irrigation": [""],
+    "fertilizer": ["Urea", "DAP", "Potash", "SSP"],
+    "harvest": ["Wheat", "Rice", "Maize"],
+    "amendment": ["Manure", "Compost", "Lime", "Gypsum"],
+}
+
+
+def synthetic_events(count: int, users: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    event_type = EVENT_TYPES[rng.integers(0, len(EVENT_TYPES), count)]
+    subtype = np.array([SUBTYPES[t][i % len(SUBTYPES[t])] for i, t in zip(rng.integers(0, 12, count), event_type)])
+    return pd.DataFrame({
+        "timestamp": "2024-01-01T00:00:00",
+        "event_type": event_type,
+        "user_id": np.char.add("farmer", rng.integers(0, users, count).astype(str)),
+        "amount": rng.uniform(1, 500, count).round(2),
+        "subtype": subtype,
+        "event_id": "",
+        "ingested_at": 0.0,
+    })
+
+
+def reference_effects(df: pd.DataFrame) -> pd.DataFrame:
+    """Plain pandas sums of EVENT_EFFECTS, to check the native path against."""
+    from backend.simulation_engine import event_channel
+
+    channels = [event_channel(t, s) for t, s in zip(df["event_type"], df["subtype"])]
+    units = np.where(df["event_type"] == "harvest", 1.0, df["amount"])
+    fields = {"d_n": "nitrogen", "d_p": "phosphorus", "d_k": "potassium", "d_m": "moisture"}
+    out = pd.DataFrame({"user_id": df["user_id"]})
+    for column, field in fields.items():
+        per_unit = np.array([EVENT_EFFECTS.get(c, {}).get(field, 0.0) if c else 0.0 for c in channels])
+        out[column] = units * per_unit
+    return out.groupby("user_id").sum()
+
+
+def legacy_event_effects(events):
+    """
+    The reducer as it was before: dict payloads and Python UDFs per row.
+    Timing only: membership tests on pw.Json payloads are always False, so
+    it never saw fertilizer or amendment amounts, and the result was keyed
+    by row pointer (so it never joined back onto the SHC table either).
+    """
+    def to_event_data(event_type, amount, subtype):
+        if event_type == "rain":
+            return {"amount": amount}
+        if event_type == "irrigation":
+            return {"liters": amount}
+        if event_type == "harvest":
+            return {"crop": subtype}
+        return {"type": subtype, "amount": amount}
+
+    def compute_deltas(event_type, data):
+        dn, dp, dk, dm = 0.0, 0.0, 0.0, 0.0
+        if event_type == "rain":
+            mm = data["amount"] if "amount" in data else 0
+            dm += (mm * 0.4)
+            dn -= (mm * 0.8)
+        elif event_type == "irrigation":
+            liters = data["liters"] if "liters" in data else 0
+            dm += (liters / 10000.0 * 5.0)
+        elif event_type == "fertilizer":
+            ftype = data["type"].lower() if "type" in data else ""
+            amt = data["amount"] if "amount" in data else 0
+            if ftype == 'urea': dn += (amt * 0.46)
+            elif ftype == 'dap':
+                dn += (amt * 0.18)
+                dp += (amt * 0.46)
+            elif ftype == 'potash': dk += (amt * 0.60)
+        elif event_type == "harvest":
+            cname = data["crop"].lower() if "crop" in data else ""
+            if "wheat" in cname:
+                dn -= 80.0; dp -= 15.0; dk -= 60.0
+            elif "rice" in cname:
+                dn -= 90.0; dp -= 20.0; dk -= 70.0
+            else:
+                dn -= 50.0; dp -= 10.0; dk -= 40.0
+        elif event_type == "amendment":
+            atype = data["type"].lower() if "type" in data else ""
+            amt = data["amount"] if "amount" in data else 0
+            if "manure" in atype:
+                dn += (amt * 0.005)
+                dp += (amt * 0.002)
+                dk += (amt * 0.005)
+        return (dn, dp, dk, dm)
+
+    events = events.select(
+        event_type=pw.apply(lambda x: x, pw.this.event_type),
+        data=pw.apply(to_event_data, pw.this.event_type, pw.this.amount, pw.this.subtype),
+        user_id=pw.this.user_id,
+    )
+    processed = events.select(
+        user_id=pw.this.user_id,
+        deltas=pw.apply(compute_deltas, pw.this.event_type, pw.this.data),
+    )
+    return processed.groupby(pw.this.user_id).reduce(
+        d_n=pw.reducers.sum(pw.apply(float, pw.this.deltas[0])),
+        d_p=pw.reducers.sum(pw.apply(float, pw.this.deltas[1])),
+        d_k=pw.reducers.sum(pw.apply(float, pw.this.deltas[2])),
+        d_m=pw.reducers.sum(pw.apply(float, pw.this.deltas[3])),
+    ).select(
+        d_n=pw.this.d_n, d_p=pw.this.d_p, d_k=pw.this.d_k, d_m=pw.this.d_m,
+        user_id=pw.apply(lambda x: x, pw.this.id),
+    )
+
+
+class BenchEventSchema(pw.Schema):
+    timestamp: str
+    event_type: str
+    user_id: str
+    amount: float
+    subtype: str
+    event_id: str
+    ingested_at: float
+
+
+def run(label: str, build, path: str, count: int) -> pd.DataFrame:
+    """Read the events CSV with the native connector, reduce, time the whole run."""
+    pw.internals.parse_graph.G.clear()
+    events = pw.io.csv.read(path, schema=BenchEventSchema, mode="static")
+    effects = build(events)
+    start = time.perf_counter()
+    result = pw.debug.table_to_pandas(effects)
+    elapsed = time.perf_counter() - start
+    print(f"⏱️  {label:>8}: {count / elapsed:>12,.0f} events/s ({elapsed:.2f}s)")
+    return result
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    df = synthetic_events(count, users)
+    print(f"📊 {len(df):,} events across {users} users")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "events.csv")
+        df.to_csv(path, index=False)
+        run("read", lambda events: events.reduce(count=pw.reducers.count()), path, len(df))
+        run("UDF", legacy_event_effects, path, len(df))
+        native = run("native", compute_event_effects, path, len(df))
+
+    expected = reference_effects(df).sort_index()
+    native = native.set_index("user_id").sort_index()[expected.columns]
+    if native.index.equals(expected.index) and np.allclose(native.values, expected.values, rtol=1e-9, atol=1e-6):
+        print("✅ Native per-user deltas match the EVENT_EFFECTS reference")
+    else:
+        print("❌ Native per-user deltas differ from the EVENT_EFFECTS reference")
@@ -0,0 +1,144 @@
+"""
+Embedding Batch Benchmark
+Re-indexing cost of one-request-per-chunk vs batched, concurrent embed_batch, against a local OpenAI-compatible stub
+
+Usage:
+    python pathway_pipeline/benchmark_embeddings.py [chunks] [latency_ms] [requests_per_second]
+
+The stub serves POST /v1/embeddings in the OpenAI wire format. Each
+request sleeps ``latency_ms`` (plus a little per input), and requests
+over ``requests_per_second`` get a 429 with Retry-After, so the retry
+path is exercised too. Vectors are derived from the text, so the
+benchmark can check that batched results come back in input order.
+Needs the ``openai`` package; no real API key or network is used.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DIMS = 384
+PER_INPUT_MS = 0.2
+
+
+def stub_vector(text: str) -> list:
+    return np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(DIMS).round(6).tolist()
+
+
+class StubEmbeddingServer(ThreadingHTTPServer):
+    """OpenAI-compatible /v1/embeddings with fixed latency and a requests-per-second limit."""
+
+    daemon_threads = True
+
+    def __init__(self, latency_ms: float = 50, requests_per_second: float = 20):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency = latency_ms / 1000
+        self.min_interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+        self.requests = 0
+        self.rate_limited = 0
+        self.inputs = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def admit(self) -> bool:
+        """Leaky bucket: one request per min_interval, the rest get a 429."""
+        with self.lock:
+            now = time.monotonic()
+            if now < self.next_slot:
+                self.rate_limited += 1
+                return False
+            self.next_slot = max(now, self.next_slot) + self.min_interval
+            self.requests += 1
+            return True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.rstrip("/") != "/v1/embeddings":
+            return self._reply(404, {"error": {"message": "not found"}})
+        if not self.server.admit():
+            return self._reply(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                {"Retry-After": f"{self.server.min_interval:.3f}"},
+            )
+        inputs = request.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        with self.server.lock:
+            self.server.inputs += len(inputs)
+        time.sleep(self.server.latency + len(inputs) * PER_INPUT_MS / 1000)
+        tokens = sum(len(text) // 4 + 1 for text in inputs)
+        self._reply(200, {
+            "object": "list",
+            "model": request.get("model", ""),
+            "data": [{"object": "embedding", "index": i, "embedding": stub_vector(t)} for i, t in enumerate(inputs)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+
+def knowledge_chunks(count: int) -> list:
+    """Seed knowledge texts, numbered and repeated up to ``count`` distinct chunks."""
+    with open("./data/knowledge_base/seed_knowledge.json", "r", encoding="utf-8") as f:
+        texts = [doc["content"] for doc in json.load(f)]
+    return [f"[{i}] {texts[i % len(texts)]}" for i in range(count)]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rps = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    server = StubEmbeddingServer(latency_ms, rps)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+
+    from pathway_pipeline.embedding_service import EmbeddingService
+
+    service = EmbeddingService(provider="openai", cache=False)
+    if service.provider != "openai":
+        sys.exit("❌ openai package not available")
+    texts = knowledge_chunks(count)
+    expected = np.array([stub_vector(t) for t in texts])
+    print(f"📊 {count} chunks, stub latency {latency_ms:g} ms, limit {rps:g} req/s")
+
+    for label, run in (
+        ("per chunk", lambda: [service._embed(t) for t in texts]),
+        ("batched", lambda: service.embed_batch(texts)),
+    ):
+        before = (server.requests, server.rate_limited)
+        start = time.perf_counter()
+        vectors = run()
+        elapsed = time.perf_counter() - start
+        ok = all(v is not None for v in vectors) and np.allclose(np.array(vectors), expected, atol=1e-5)
+        print(f"⏱️  {label:>9}: {elapsed:7.2f}s  {count / elapsed:8.1f} chunks/s  "
+              f"{server.requests - before[0]:4d} requests  {server.rate_limited - before[1]:4d} rate-limited  "
+              f"{'✅ in order' if ok else '❌ mismatch'}")
+    server.shutdown()
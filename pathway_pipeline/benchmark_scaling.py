@@ -0,0 +1,103 @@
+"""
+Pipeline Scaling Benchmark
+events/s from the event log through the delta reducer + SHC join at 1, 2, 4 and 8 Pathway workers on a synthetic fleet
+
+Usage:
+    python pathway_pipeline/benchmark_scaling.py [events] [farms] [--processes]
+
+The fleet is generated by fleet_generator (SHC cards plus an event log
+backfilled the way the API writes it) and read exactly as production
+does: one EventLogSubject via load_event_log, on the first process, with
+its rows exchanged to the other workers by user_id. Only the per-user
+groupby and the SHC join shard across workers, so the figures show how
+far the reducers scale behind a single reader. Each worker count runs
+in a fresh interpreter with PATHWAY_THREADS set, or under
+``pathway spawn -n`` with --processes.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+WORKER_COUNTS = (1, 2, 4, 8)
+HISTORY_DAYS = 90
+
+
+def write_fleet(root: str, events: int, farms: int, seed: int = 0):
+    """SHC cards for ``farms`` farms and an event log of ``events`` events under ``root``."""
+    from pathway_pipeline.event_log import EventLog
+    from pathway_pipeline.fleet_generator import backfill, generate_cards, write_cards
+
+    write_cards(os.path.join(root, "shc.csv"), generate_cards(farms, seed))
+    backfill(EventLog(os.path.join(root, "event_log")), events, farms, HISTORY_DAYS, seed)
+
+
+def run_graph(root: str):
+    """Child process: build the state graph over the fleet and run it to completion."""
+    import pathway as pw
+    from pathway_pipeline.ingest import load_event_log, load_soil_health_card
+    from pathway_pipeline.main_pipeline import EventLogSchema, compute_event_effects, apply_event_effects
+
+    log_dir = os.path.join(root, "event_log")
+    shc = load_soil_health_card(os.path.join(root, "shc.csv"), log_dir=log_dir).select(
+        user_id=pw.this.uid,
+        location=pw.this.location,
+        nitrogen=pw.this.nitrogen,
+        phosphorus=pw.this.phosphorus,
+        potassium=pw.this.potassium,
+        organic_carbon=pw.this.organic_carbon,
+        ph=pw.this.ph,
+        moisture=pw.this.moisture,
+    )
+    events = load_event_log(EventLogSchema, log_dir=log_dir, follow=False)
+    final_state = apply_event_effects(shc, compute_event_effects(events))
+    pw.io.null.write(final_state)
+
+    start = time.perf_counter()
+    pw.run(monitoring_level=pw.MonitoringLevel.NONE)
+    if os.getenv("PATHWAY_PROCESS_ID", "0") == "0":
+        print(f"ELAPSED {time.perf_counter() - start:.4f}", flush=True)
+
+
+def measure(root: str, workers: int, processes: bool) -> float:
+    """Seconds for one run of the graph at the given worker count."""
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    command = [sys.executable, os.path.abspath(__file__), "--run-graph", root]
+    if processes:
+        command = [sys.executable, "-m", "pathway", "spawn", "--processes", str(workers)] + command
+    else:
+        env["PATHWAY_THREADS"] = str(workers)
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        if line.startswith("ELAPSED "):
+            return float(line.split()[1])
+    raise RuntimeError(f"Benchmark run with {workers} workers failed:\n{result.stderr[-2000:]}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--run-graph":
+        run_graph(sys.argv[2])
+        sys.exit(0)
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    use_processes = "--processes" in sys.argv
+    events = int(args[0]) if len(args) > 0 else 2_000_000
+    farms = int(args[1]) if len(args) > 1 else 100_000
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f"📊 {events:,} events across {farms:,} farms, read from one event log ({os.cpu_count()} CPUs)")
+        write_fleet(root, events, farms)
+        results = []
+        for workers in WORKER_COUNTS:
+            elapsed = measure(root, workers, use_processes)
+            results.append((workers, elapsed))
+            print(f"⏱️  {workers} {'processes' if use_processes else 'threads'}: {events / elapsed:>12,.0f} events/s ({elapsed:.2f}s)")
+
+    base = results[0][1]
+    print(f"\n{'workers':>8} {'events/s':>12} {'speedup':>8}")
+    for workers, elapsed in results:
+        print(f"{workers:>8} {events / elapsed:>12,.0f} {base / elapsed:>7.2f}x")
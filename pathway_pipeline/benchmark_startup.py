@@ -0,0 +1,110 @@
+"""
+Pipeline Startup Benchmark
+Cold start vs checkpointed restart of the event-log → delta → state graph, for growing history sizes
+
+Usage:
+    PATHWAY_LICENSE_KEY=... python pathway_pipeline/benchmark_startup.py [events ...]
+
+Without a license key Pathway runs without persistence, so the "restart"
+column shows a full replay for comparison. "re-read" counts the records
+the restart read back from the event log: with checkpoints it must be the
+RESTART_EVENTS appended since the first run, whatever the history size
+(test_ingest_resume.py checks the same with a key set).
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import time
+
+import pathway as pw
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pathway_pipeline import ingest
+from pathway_pipeline.event_log import EventLog
+from pathway_pipeline.ingest import load_event_log, load_soil_health_card
+from pathway_pipeline.main_pipeline import EventLogSchema, compute_event_effects, apply_event_effects, persistence_config
+
+USERS = 1000
+RESTART_EVENTS = 100  # appended between the two runs
+
+records_read = 0
+_flatten = ingest.pipeline_event
+
+
+def _count_read(record: dict):
+    global records_read
+    records_read += 1
+    return _flatten(record)
+
+
+ingest.pipeline_event = _count_read    # EventLogSubject flattens every record it reads
+
+
+def write_history(root: str, count: int):
+    log = EventLog(os.path.join(root, "event_log"))
+    batch = []
+    for i in range(count):
+        batch.append(("rain", {
+            "timestamp": "2024-01-01T00:00:00", "note": "bench", "user_id": f"farmer{i % USERS}", "rain_mm": 1.0,
+        }))
+        if len(batch) == 10000:
+            log.append_many(batch)
+            batch = []
+    log.append_many(batch)
+
+    with open(os.path.join(root, "shc.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["uid", "location", "nitrogen", "phosphorus", "potassium", "organic_carbon", "ph", "moisture"])
+        for u in range(USERS):
+            writer.writerow([f"farmer{u}", "Karnal", 300.0, 20.0, 300.0, 0.5, 7.0, 40.0])
+    return log
+
+
+def run_once(root: str) -> tuple:
+    """Build the state graph over the whole log, run until caught up; returns (seconds, records read)."""
+    global records_read
+    records_read = 0
+    pw.internals.parse_graph.G.clear()
+    shc = load_soil_health_card(os.path.join(root, "shc.csv")).select(
+        user_id=pw.this.uid,
+        location=pw.this.location,
+        nitrogen=pw.this.nitrogen,
+        phosphorus=pw.this.phosphorus,
+        potassium=pw.this.potassium,
+        organic_carbon=pw.this.organic_carbon,
+        ph=pw.this.ph,
+        moisture=pw.this.moisture,
+    )
+    events = load_event_log(EventLogSchema, os.path.join(root, "event_log"), follow=False)
+    final_state = apply_event_effects(shc, compute_event_effects(events))
+    pw.io.csv.write(final_state, os.path.join(root, "current_state.csv"), name="current_state")
+
+    start = time.perf_counter()
+    pw.run(
+        persistence_config=persistence_config(os.path.join(root, "pathway_state"), 1000),
+        monitoring_level=pw.MonitoringLevel.NONE,
+    )
+    return time.perf_counter() - start, records_read
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    results = []
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as root:
+            log = write_history(root, count)
+            cold, _ = run_once(root)
+            log.append_many([
+                ("irrigation", {"timestamp": "2024-01-02T00:00:00", "note": "bench", "user_id": "farmer0", "water_liters": 1000.0})
+            ] * RESTART_EVENTS)
+            restart, reread = run_once(root)
+            results.append((count, cold, restart, reread))
+
+    print(f"\n{'events':>12} {'cold start':>12} {'restart':>12} {'re-read':>10}")
+    for count, cold, restart, reread in results:
+        print(f"{count:>12,} {cold:>11.2f}s {restart:>11.2f}s {reread:>10,}")
+    if os.getenv("PATHWAY_LICENSE_KEY") and any(reread != RESTART_EVENTS for *_, reread in results):
+        print(f"❌ A checkpointed restart re-read more than the {RESTART_EVENTS} new events")
@@ -0,0 +1,331 @@
+"""
+Event Log Compaction
+Folds events older than a horizon into a new per-user Soil Health Card baseline and archives what was folded
+
+The pipeline's state is the SHC baseline plus the sum of every event, so
+without compaction both replay cost and disk usage grow forever. A run:
+
+    1. picks the sealed segments (never the active one) whose records are all
+       older than the horizon, as a prefix of the log, plus the older lines
+       of live_weather.jsonl
+    2. sums their N/P/K/moisture deltas per user with the same channel rules
+       as main_pipeline.compute_event_effects
+    3. writes baseline + deltas as <shc>.compacted-<segment>.csv, the same
+       columns as sample_shc.csv
+    4. commits by atomically replacing data/event_log/compaction.json
+    5. prunes the per-user indexes, gzips the folded segments and weather
+       lines into data/event_log/archive/, and drops pipeline checkpoints
+
+Step 4 is the only commit point. Readers go by the manifest alone:
+load_soil_health_card swaps in the compacted baseline, EventLogSubject
+starts after ``through_segment`` and the live weather reader skips lines
+before ``weather_before``. A crash after step 4 therefore never double
+counts, and the next run finishes the cleanup.
+
+Moisture is stored unclamped in the compacted baseline because the
+pipeline clamps only the final sum. Final numbers match an uncompacted
+replay (up to float rounding). Events for users with no SHC row are
+dropped, as the pipeline's join drops them today. Later edits to
+sample_shc.csv are not seen once a compacted baseline exists; edit the
+compacted file instead.
+
+Run it while the pipeline is stopped:
+    python pathway_pipeline/compaction.py [horizon_days]
+"""
+
+import csv
+import gzip
+import json
+import os
+import shutil
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pathway_pipeline.event_log import (
+    EventLog, EVENT_LOG_DIR, INDEX_ENTRY, RUN_START, CorruptRecord,
+    parse_timestamp, pipeline_event, read_record,
+)
+from pathway_pipeline.streaming_logic import EVENT_EFFECTS, AMENDMENT_CHANNELS, harvest_crop_key
+
+DATA_DIR = "./data"
+SHC_PATH = os.getenv("PIPELINE_SHC_PATH", f"{DATA_DIR}/soil_health_card/sample_shc.csv")
+LIVE_WEATHER_PATH = f"{DATA_DIR}/simulated_streams/live_weather.jsonl"
+PERSISTENCE_DIR = os.getenv("PIPELINE_PERSISTENCE_DIR", f"{DATA_DIR}/pathway_state")
+HORIZON_DAYS = float(os.getenv("COMPACTION_HORIZON_DAYS", "30"))
+
+MANIFEST = "compaction.json"
+ARCHIVE_DIR = "archive"
+
+# SHC column -> EVENT_EFFECTS field folded into it (the pipeline applies no others)
+FOLDED_FIELDS = {
+    "nitrogen": "nitrogen",
+    "phosphorus": "phosphorus",
+    "potassium": "potassium",
+    "moisture": "moisture",
+}
+
+
+def read_manifest(log_dir: str = EVENT_LOG_DIR) -> Optional[dict]:
+    """The last committed compaction for a log, or None if it was never compacted."""
+    path = os.path.join(log_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def baseline_path(shc_path: str, log_dir: str = EVENT_LOG_DIR) -> str:
+    """The SHC file to start from: the compacted baseline if this log has one for ``shc_path``."""
+    manifest = read_manifest(log_dir)
+    if manifest and os.path.abspath(manifest["source"]) == os.path.abspath(shc_path) \
+            and os.path.exists(manifest["baseline"]):
+        return manifest["baseline"]
+    return shc_path
+
+
+def event_channel(event_type: str, subtype: str) -> Optional[str]:
+    """
+    Python twin of main_pipeline.event_channel_expression. It differs from
+    simulation_engine.event_channel, which fills in API defaults for an
+    empty subtype. Returns None when the pipeline gives the event no effect.
+    """
+    subtype = subtype.lower()
+    if event_type == "fertilizer":
+        return f"fertilizer:{subtype}"
+    if event_type == "harvest":
+        return f"harvest:{harvest_crop_key(subtype)}"
+    if event_type == "amendment":
+        for keyword, channel in AMENDMENT_CHANNELS:
+            if keyword in subtype:
+                return channel
+        return "amendment:manure" if not subtype else None
+    return event_type
+
+
+def _fold(deltas: Dict[str, Dict[str, float]], row: dict):
+    """Add one pipeline_event row's effect to the per-user deltas."""
+    effects = EVENT_EFFECTS.get(event_channel(row["event_type"], row["subtype"]))
+    if not effects:
+        return
+    units = 1.0 if row["event_type"] == "harvest" else row["amount"]
+    user = deltas.setdefault(row["user_id"], dict.fromkeys(FOLDED_FIELDS, 0.0))
+    for column, field in FOLDED_FIELDS.items():
+        user[column] += units * effects.get(field, 0.0)
+
+
+def foldable_segments(log: EventLog, cutoff: float) -> List[int]:
+    """
+    The longest prefix of sealed segments whose records are all older than
+    ``cutoff``. Manifests record a single watermark, so the prefix stops at
+    the first segment that still holds a newer event.
+    """
+    segments = log.segments()
+    folded = []
+    for segment in segments[:-1]:
+        newest = 0.0
+        with open(log.segment_path(segment), "rb") as f:
+            while True:
+                try:
+                    record = read_record(f)
+                except CorruptRecord:
+                    continue
+                if record is None:
+                    break
+                newest = max(newest, parse_timestamp(record.get("timestamp")))
+        if newest >= cutoff:
+            break
+        folded.append(segment)
+    return folded
+
+
+def _split_weather(path: str, before: str) -> Tuple[List[dict], List[str], List[str]]:
+    """Live weather lines -> (rows to fold, their raw lines, lines to keep)."""
+    fold, folded_lines, keep = [], [], []
+    if not os.path.exists(path):
+        return fold, folded_lines, keep
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                entry = None
+            if isinstance(entry, dict) and str(entry.get("timestamp", "")) < before:
+                fold.append({
+                    "event_type": "rain", "user_id": "farmer", "subtype": "",
+                    "amount": float(entry.get("rain_mm") or 0.0),
+                })
+                folded_lines.append(line)
+            else:
+                keep.append(line)
+    return fold, folded_lines, keep
+
+
+def _write_atomic(path: str, write):
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _prune_index(log: EventLog, through_segment: int):
+    """Drop index entries of folded segments and rebuild each user's run starts."""
+    for name in os.listdir(log.index_dir):
+        if not name.endswith(".idx"):
+            continue
+        path = os.path.join(log.index_dir, name)
+        with open(path, "rb") as f:
+            data = f.read()
+        entries = list(INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % INDEX_ENTRY.size]))
+        kept = [e for e in entries if e[0] > through_segment]
+        if len(kept) == len(entries):
+            continue
+
+        runs_path = path[:-4] + ".runs"
+        starts = [i for i in range(1, len(kept)) if kept[i][2] < kept[i - 1][2]]
+        if starts:
+            with open(runs_path + ".tmp", "wb") as f:
+                f.write(b"".join(RUN_START.pack(i) for i in starts))
+            os.replace(runs_path + ".tmp", runs_path)
+        elif os.path.exists(runs_path):
+            os.remove(runs_path)
+        with open(path + ".tmp", "wb") as f:
+            f.write(b"".join(INDEX_ENTRY.pack(*e) for e in kept))
+        os.replace(path + ".tmp", path)
+
+
+def _archive_segments(log: EventLog, through_segment: int):
+    archive = os.path.join(log.root, ARCHIVE_DIR)
+    os.makedirs(archive, exist_ok=True)
+    for segment in log.segments():
+        if segment > through_segment:
+            break
+        source = log.segment_path(segment)
+        target = os.path.join(archive, os.path.basename(source) + ".gz")
+        with open(source, "rb") as src, gzip.open(target + ".tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(target + ".tmp", target)
+        os.remove(source)
+
+
+def _finish(log: EventLog, manifest: dict, weather_path: str, persistence_dir: Optional[str]):
+    """
+    Post-commit cleanup, safe to repeat: everything here only removes data
+    that the manifest already tells readers to skip.
+    """
+    through = manifest["through_segment"]
+    with log._lock:
+        # Index first, so history reads never point into an archived segment
+        _prune_index(log, through)
+        _archive_segments(log, through)
+
+    _, folded_lines, keep = _split_weather(weather_path, manifest["weather_before"])
+    if folded_lines:
+        stamp = manifest["compacted_at"].replace(":", "").replace("-", "")[:15]
+        archive = os.path.join(log.root, ARCHIVE_DIR, f"live_weather.{stamp}.jsonl.gz")
+        with gzip.open(archive, "at", encoding="utf-8") as f:
+            f.writelines(folded_lines)
+        _write_atomic(weather_path, lambda f: f.writelines(keep))
+
+    # Older compacted baselines are superseded by the one in the manifest
+    folder = os.path.dirname(os.path.abspath(manifest["source"]))
+    prefix = os.path.splitext(os.path.basename(manifest["source"]))[0] + ".compacted-"
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if name.startswith(prefix) and os.path.abspath(path) != os.path.abspath(manifest["baseline"]):
+            os.remove(path)
+
+    # Checkpointed operator state was built on the old baseline and would double count
+    if persistence_dir and os.path.isdir(persistence_dir):
+        shutil.rmtree(persistence_dir)
+        print(f"🧹 Cleared pipeline checkpoints in {persistence_dir}; the next start replays only the tail")
+
+
+def compact(
+    horizon_days: float = HORIZON_DAYS,
+    log_dir: str = EVENT_LOG_DIR,
+    shc_path: str = SHC_PATH,
+    weather_path: str = LIVE_WEATHER_PATH,
+    persistence_dir: Optional[str] = PERSISTENCE_DIR,
+    now: Optional[datetime] = None,
+) -> Optional[dict]:
+    """
+    Fold everything older than ``horizon_days`` into a new baseline.
+    Returns the committed manifest, or None if there was nothing to fold.
+    """
+    log = EventLog(log_dir)
+    previous = read_manifest(log_dir)
+    if previous:
+        # Finish a run that crashed after its commit before starting another
+        _finish(log, previous, weather_path, persistence_dir)
+
+    now = now or datetime.now()
+    cutoff = now - timedelta(days=horizon_days)
+    segments = foldable_segments(log, cutoff.timestamp())
+    weather_before = cutoff.isoformat()
+    weather_rows, _, _ = _split_weather(weather_path, weather_before)
+    if not segments and not weather_rows:
+        print(f"✅ Nothing older than {horizon_days:g} days to compact")
+        return None
+
+    deltas = {}
+    folded_events = len(weather_rows)
+    for row in weather_rows:
+        _fold(deltas, row)
+    if segments:
+        for segment, _, record in log.scan(segments[0]):
+            if segment > segments[-1]:
+                break
+            row = pipeline_event(record)
+            if row is not None:
+                _fold(deltas, row)
+                folded_events += 1
+
+    source = os.path.abspath(shc_path)
+    with open(baseline_path(shc_path, log_dir), "r", newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+
+    for row in rows:
+        for column, delta in deltas.pop(row["uid"], {}).items():
+            row[column] = repr(float(row[column]) + delta)
+    if deltas:
+        print(f"⚠️  Dropped events for {len(deltas)} users without a Soil Health Card row: {sorted(deltas)[:5]}")
+
+    through = segments[-1] if segments else (previous["through_segment"] if previous else -1)
+    baseline = os.path.join(
+        os.path.dirname(source),
+        f"{os.path.splitext(os.path.basename(source))[0]}.compacted-{through + 1:08d}-{now:%Y%m%d%H%M%S}.csv",
+    )
+
+    def write_baseline(f):
+        writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    _write_atomic(baseline, write_baseline)
+
+    manifest = {
+        "source": source,
+        "baseline": baseline,
+        "through_segment": through,
+        "weather_before": max(weather_before, previous["weather_before"]) if previous else weather_before,
+        "horizon_days": horizon_days,
+        "compacted_at": now.isoformat(),
+        "folded_events": folded_events + (previous["folded_events"] if previous else 0),
+    }
+    _write_atomic(os.path.join(log_dir, MANIFEST), lambda f: json.dump(manifest, f, indent=2))
+
+    _finish(log, manifest, weather_path, persistence_dir)
+    print(f"✅ Folded {folded_events} events ({len(segments)} segments) into {baseline}")
+    return manifest
+
+
+if __name__ == "__main__":
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else HORIZON_DAYS
+    compact(days)
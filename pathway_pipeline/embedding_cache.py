@@ -0,0 +1,178 @@
+"""
+Embedding Cache
+Content-addressed, disk-backed cache of embedding vectors with an in-memory LRU in front
+
+Layout under cache/embeddings/:
+    vectors-v2.f16  append-only records: <32-byte key><u16 dims><u32 crc32><dims x float16>
+    .lock           cross-process append lock
+
+A key is sha256(provider, model, sha256(text)), so the same text embedded
+by another model never collides, and re-indexing unchanged chunks or
+repeated farmer questions never pays for the model or API call twice.
+Vectors are stored as float16 (half the size of float32, well within the
+precision cosine ranking needs) and come back as float32.
+
+Every process appends under the lock and, on a miss, first reads whatever
+other processes appended since it last looked, so API workers and the
+indexer share one file. The crc32 covers key, dims and vector. A torn or
+corrupt tail (a writer that died mid-append) is truncated back to the last
+valid record on open and before every append, as event_log does for its
+segments, so records written after a crash stay readable.
+"""
+
+import hashlib
+import os
+import zlib
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from pathway_pipeline.event_log import FileLock
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./cache/embeddings")
+LRU_SIZE = int(os.getenv("EMBEDDING_CACHE_LRU", "4096"))      # vectors kept decoded in memory
+
+RECORD_PREFIX = struct.Struct("<32sH")      # key, dims
+RECORD_HEADER = struct.Struct("<32sHI")     # key, dims, crc32(key + dims + vector)
+
+
+def _record_crc(prefix: bytes, payload: bytes) -> int:
+    return zlib.crc32(payload, zlib.crc32(prefix))
+
+
+def cache_key(provider: str, model: str, text: str) -> bytes:
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{provider}\0{model}\0{text_hash}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, root: str = EMBEDDING_CACHE_DIR, lru_size: int = LRU_SIZE):
+        os.makedirs(root, exist_ok=True)
+        self.path = os.path.join(root, "vectors-v2.f16")
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(os.path.join(root, ".lock"))
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        # key -> (payload offset, dims) for everything on disk
+        self._offsets: Dict[bytes, Tuple[int, int]] = {}
+        self._scanned = 0
+        self._lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.lru_size = lru_size
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+        self.embed_seconds = 0.0
+        self.embedded = 0
+        self.truncated_bytes = 0
+        with self._lock, self._file_lock:
+            self._catch_up(repair=True)
+
+    def _catch_up(self, repair: bool = False):
+        """
+        Index records appended (by any process) since the last scan. Caller
+        holds _lock. With ``repair`` the caller also holds the file lock, so
+        no append is in flight and anything after the last valid record is a
+        torn or corrupt tail: it is truncated away.
+        """
+        size = os.fstat(self._fd).st_size
+        position = self._scanned
+        while position + RECORD_HEADER.size <= size:
+            header = os.pread(self._fd, RECORD_HEADER.size, position)
+            key, dims, crc = RECORD_HEADER.unpack(header)
+            end = position + RECORD_HEADER.size + 2 * dims
+            if end > size:
+                break       # partially written tail; complete on a later scan, or torn
+            payload = os.pread(self._fd, 2 * dims, position + RECORD_HEADER.size)
+            if _record_crc(header[:RECORD_PREFIX.size], payload) != crc:
+                break       # corrupt record
+            self._offsets[key] = (position + RECORD_HEADER.size, dims)
+            position = end
+        self._scanned = position
+        if repair and position < size:
+            print(f"⚠️  Embedding cache: truncating {size - position} corrupt bytes at the end of {self.path}")
+            os.ftruncate(self._fd, position)
+            self.truncated_bytes += size - position
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, provider: str, model: str, text: str) -> Optional[np.ndarray]:
+        """Cached float32 vector, or None."""
+        start = time.perf_counter()
+        key = cache_key(provider, model, text)
+        with self._lock:
+            try:
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    self.memory_hits += 1
+                    return vector
+                location = self._offsets.get(key)
+                if location is None:
+                    self._catch_up()
+                    location = self._offsets.get(key)
+                if location is None:
+                    self.misses += 1
+                    return None
+                offset, dims = location
+                vector = np.frombuffer(os.pread(self._fd, 2 * dims, offset), dtype=np.float16).astype(np.float32)
+                self._remember(key, vector)
+                self.disk_hits += 1
+                return vector
+            finally:
+                self.lookup_seconds += time.perf_counter() - start
+
+    def put(self, provider: str, model: str, text: str, vector) -> np.ndarray:
+        """Store a vector; returns it as the float32 a later hit will return."""
+        key = cache_key(provider, model, text)
+        half = np.asarray(vector, dtype=np.float16).ravel()
+        payload = half.tobytes()
+        prefix = RECORD_PREFIX.pack(key, half.shape[0])
+        record = RECORD_HEADER.pack(key, half.shape[0], _record_crc(prefix, payload)) + payload
+        with self._lock:
+            if key not in self._offsets:
+                with self._file_lock:
+                    self._catch_up(repair=True)
+                    if key not in self._offsets:
+                        view = memoryview(record)
+                        while view:
+                            view = view[os.write(self._fd, view):]
+                        self._catch_up()
+            stored = half.astype(np.float32)
+            self._remember(key, stored)
+        return stored
+
+    def record_embed(self, seconds: float, count: int = 1):
+        """Time spent in the provider for cache misses."""
+        with self._lock:
+            self.embed_seconds += seconds
+            self.embedded += count
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "entries": len(self._offsets),
+                "file_bytes": self._scanned,
+                "truncated_bytes": self.truncated_bytes,
+                "lru_entries": len(self._lru),
+                "lookups": lookups,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+                "avg_lookup_ms": round(self.lookup_seconds / lookups * 1000, 4) if lookups else None,
+                "avg_embed_ms": round(self.embed_seconds / self.embedded * 1000, 3) if self.embedded else None,
+            }
+
+    def close(self):
+        os.close(self._fd)
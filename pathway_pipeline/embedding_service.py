@@ -1,29 +1,78 @@
 """
 Embedding Service - Provider Abstraction Layer
-Supports multiple embedding providers: Local (Sentence Transformers), OpenAI, Gemini
+Supports multiple embedding providers: Local (Sentence Transformers), OpenAI, Gemini, and a hashing fallback ("mock")
 """
 
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Inputs per request and rough token budget per request (~4 chars per token)
+BATCH_LIMITS = {
+    "openai": (2048, 300_000),
+    "gemini": (100, None),
+}
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "0"))       # cap below the provider limit (0 = none)
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))     # batch requests in flight
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30.0
+
+
+def _retry_delay(error, attempt: int):
+    """
+    Seconds to wait before retrying a failed provider call, or None if the
+    error is not worth retrying (bad request, auth). Rate limits, timeouts,
+    connection errors and 5xx back off exponentially with jitter, never
+    sooner than the server's Retry-After.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status is not None and status not in (408, 409, 429) and status < 500:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    try:
+        retry_after = float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        retry_after = None
+    # Jittered so concurrent batches that failed together do not retry together
+    backoff = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt) * (0.5 + random.random() / 2)
+    return min(max(backoff, retry_after or 0.0), RETRY_MAX_SECONDS)
+
 class EmbeddingService:
     """
     Unified interface for embedding models.
     Automatically selects best available provider.
     """
     
-    def __init__(self, provider: str = "auto"):
+    def __init__(self, provider: str = "auto", cache: bool = True, hashing_model=None):
         """
         Initialize embedding service.
         
         Args:
             provider: 'auto', 'local', 'openai', 'gemini', or 'mock'
+            cache: reuse vectors from the on-disk embedding cache
+                (EMBEDDING_CACHE=0 turns it off everywhere)
+            hashing_model: fitted HashingEmbedder to use if the provider
+                resolves to 'mock' (e.g. the one a vector store was built
+                with); by default one is fitted on the knowledge base
         """
         self.provider = None
+        self._hashing_model = hashing_model
         self.model = None
+        self.model_name = None
+        self.cache = None
+        if cache and os.getenv("EMBEDDING_CACHE", "1") != "0":
+            try:
+                from pathway_pipeline.embedding_cache import EmbeddingCache
+                self.cache = EmbeddingCache()
+            except OSError as e:
+                print(f"⚠️  Embedding cache unavailable: {e}")
         
         if provider == "auto":
             # Check for API keys first (lighter dependency)
@@ -43,8 +92,8 @@ class EmbeddingService:
             except:
                 pass
 
-            # Final fallback: Mock
-            print("⚠️  Falling back to Mock Embeddings (Simulation Mode)")
+            # Final fallback: hashed n-grams, no model needed
+            print("⚠️  Falling back to hashing embeddings (no embedding model available)")
             self._init_mock()
 
         elif provider == "local":
@@ -62,6 +111,7 @@ class EmbeddingService:
             from sentence_transformers import SentenceTransformer
             self.model = SentenceTransformer("all-MiniLM-L6-v2")
             self.provider = "local"
+            self.model_name = "all-MiniLM-L6-v2"
             print("✅ Using local embeddings (all-MiniLM-L6-v2) - Free & Fast")
             return True
         except ImportError:
@@ -79,8 +129,10 @@ class EmbeddingService:
         
         try:
             from openai import OpenAI
-            self.model = OpenAI(api_key=api_key)
+            # Retries are ours (see _with_retry); OPENAI_BASE_URL points it at a proxy or stub
+            self.model = OpenAI(api_key=api_key, max_retries=0)
             self.provider = "openai"
+            self.model_name = "text-embedding-3-small"
             print("✅ Using OpenAI embeddings (text-embedding-3-small)")
             return True
         except Exception as e:
@@ -98,6 +150,7 @@ class EmbeddingService:
             genai.configure(api_key=api_key)
             self.model = genai
             self.provider = "gemini"
+            self.model_name = "models/embedding-001"
             print("✅ Using Gemini embeddings")
             return True
         except Exception as e:
@@ -105,17 +158,21 @@ class EmbeddingService:
             return False
 
     def _init_mock(self):
-        """Initialize Mock embeddings (random vectors) for testing/fallback"""
-        import numpy as np
-        self.model = "mock"
+        """Initialize deterministic hashing embeddings (word + char n-grams, TF-IDF) for offline/CI fallback"""
+        from pathway_pipeline.hashing_embedder import HashingEmbedder
+        self.model = self._hashing_model or HashingEmbedder()
         self.provider = "mock"
-        print("✅ Using Mock embeddings (Randomized 384-dim vectors)")
+        self.model_name = self.model.name
+        # Hashing a text is cheaper than a cache lookup, so skip the cache
+        self.cache = None
+        print(f"✅ Using hashing embeddings ({self.model.dims}-dim word + char n-grams, TF-IDF) - no model download")
         return True
 
     
     def embed(self, text: str) -> List[float]:
         """
-        Generate embedding for text.
+        Generate embedding for text (served from the embedding cache when
+        this provider and model have embedded the same text before).
         
         Args:
             text: Input text to embed
@@ -125,30 +182,30 @@ class EmbeddingService:
         """
         if not self.model:
             return None
-        
+        if self.cache is None:
+            return self._embed(text)
+
+        cached = self.cache.get(self.provider, self.model_name, text)
+        if cached is not None:
+            return cached.tolist()
+        start = time.perf_counter()
+        vector = self._embed(text)
+        if vector is None:
+            return None
+        self.cache.record_embed(time.perf_counter() - start)
+        return self.cache.put(self.provider, self.model_name, text, vector).tolist()
+
+    def _embed(self, text: str) -> List[float]:
+        """One uncached call to the provider."""
         try:
             if self.provider == "local":
                 return self.model.encode(text).tolist()
             
-            elif self.provider == "openai":
-                response = self.model.embeddings.create(
-                    input=text,
-                    model="text-embedding-3-small"
-                )
-                return response.data[0].embedding
-            
-            elif self.provider == "gemini":
-                result = self.model.embed_content(
-                    model="models/embedding-001",
-                    content=text
-                )
-                return result['embedding']
+            elif self.provider in BATCH_LIMITS:
+                return self._with_retry([text])[0]
             
             elif self.provider == "mock":
-                import numpy as np
-                # Return a stable-ish random vector based on text length to avoid total chaos?
-                # No, just random for now. 
-                return np.random.rand(384).tolist()
+                return self.model.embed(text).tolist()
         
         except Exception as e:
             print(f"Error generating embedding: {e}")
@@ -164,12 +221,94 @@ class EmbeddingService:
         Returns:
             List of embedding vectors
         """
+        if self.cache is None:
+            return self._embed_batch(texts)
+
+        results = [None] * len(texts)
+        missing = {}
+        for i, text in enumerate(texts):
+            cached = self.cache.get(self.provider, self.model_name, text)
+            if cached is not None:
+                results[i] = cached.tolist()
+            else:
+                missing.setdefault(text, []).append(i)
+
+        if missing:
+            start = time.perf_counter()
+            vectors = self._embed_batch(list(missing))
+            self.cache.record_embed(time.perf_counter() - start, len(missing))
+            for (text, positions), vector in zip(missing.items(), vectors):
+                if vector is None:
+                    continue
+                stored = self.cache.put(self.provider, self.model_name, text, vector).tolist()
+                for i in positions:
+                    results[i] = stored
+        return results
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Uncached batch call to the provider."""
         if self.provider == "local":
             # Batch processing is much faster for local models
             return self.model.encode(texts).tolist()
-        else:
-            # For APIs, process one by one
-            return [self.embed(text) for text in texts]
+        if self.provider == "mock":
+            return self.model.embed_many(texts).tolist()
+        if self.provider not in BATCH_LIMITS:
+            return [self._embed(text) for text in texts]
+
+        # API providers: as many inputs per request as the provider allows,
+        # up to EMBED_CONCURRENCY requests in flight, results in input order
+        batches = self._batches(texts)
+        results = []
+        with ThreadPoolExecutor(max_workers=max(1, min(EMBED_CONCURRENCY, len(batches)))) as pool:
+            for batch, vectors in zip(batches, pool.map(self._request_batch_safe, batches)):
+                results.extend(vectors if vectors is not None else [None] * len(batch))
+        return results
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        max_inputs, max_tokens = BATCH_LIMITS[self.provider]
+        if EMBED_BATCH_SIZE > 0:
+            max_inputs = min(max_inputs, EMBED_BATCH_SIZE)
+        batches, batch, tokens = [], [], 0
+        for text in texts:
+            cost = len(text) // 4 + 1
+            if batch and (len(batch) >= max_inputs or (max_tokens and tokens + cost > max_tokens)):
+                batches.append(batch)
+                batch, tokens = [], 0
+            batch.append(text)
+            tokens += cost
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _request_batch(self, texts: List[str]) -> List[List[float]]:
+        """One provider request embedding every text in ``texts``."""
+        if self.provider == "openai":
+            response = self.model.embeddings.create(input=texts, model=self.model_name)
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        result = self.model.embed_content(model=self.model_name, content=texts)
+        return result['embedding']
+
+    def _with_retry(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                vectors = self._request_batch(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(f"{self.provider} returned {len(vectors)} embeddings for {len(texts)} inputs")
+                return vectors
+            except Exception as e:
+                delay = _retry_delay(e, attempt) if attempt < EMBED_MAX_RETRIES else None
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+
+    def _request_batch_safe(self, texts: List[str]):
+        try:
+            return self._with_retry(texts)
+        except Exception as e:
+            print(f"Error generating embeddings for a batch of {len(texts)}: {e}")
+            return None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,630 @@
+"""
+Segmented Event Log
+Append-only, CRC-checked storage for every farm event (rain, irrigation, fertilizer, harvest, amendment)
+
+Layout under data/event_log/:
+    segments/00000000.log   records, rolled once a segment exceeds SEGMENT_BYTES
+    index/<user_id>.idx     fixed-size (segment, position, timestamp) entries per user
+    index/<user_id>.runs    entry numbers where the user's timestamps stop ascending
+    .lock                   cross-process append lock
+
+Record framing: <u32 payload length><u32 crc32(payload)><payload: UTF-8 JSON>
+
+Writers (the API) append records; the Pathway pipeline tails the same
+segments through EventLogSubject in ingest.py, and history reads go through
+the per-user index so they only touch that user's records.
+
+Each user's index is a handful of timestamp-sorted runs (usually exactly
+one, since events are stamped at ingest). Paged history reads binary-search
+every run for the requested window and k-way merge them newest-first, so a
+page costs O(limit + runs * log n) regardless of how long the history is.
+"""
+
+import base64
+import heapq
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+try:
+    import fcntl
+except ImportError:  # Windows without WSL: single-process only
+    fcntl = None
+
+EVENT_LOG_DIR = "./data/event_log"
+SEGMENT_BYTES = 16 * 1024 * 1024
+
+RECORD_HEADER = struct.Struct("<II")     # length, crc32
+INDEX_ENTRY = struct.Struct("<IId")      # segment, position, unix timestamp
+RUN_START = struct.Struct("<Q")          # entry number that starts a new sorted run
+INDEX_BLOCK = 256                        # entries fetched per read when scanning a run
+
+# Stream name -> legacy file it replaces (used once by migrate_legacy_streams)
+LEGACY_STREAMS = {
+    "rain": "./data/simulated_streams/rainfall_stream.jsonl",
+    "irrigation": "./data/simulated_streams/irrigation_events.jsonl",
+    "fertilizer": "./data/simulated_streams/fertilizer_events.jsonl",
+    "harvest": "./data/simulated_streams/crop_events.json",
+    "amendment": "./data/simulated_streams/soil_amendments.json",
+}
+
+
+# Stream -> (pipeline event_type, field holding the amount, field holding the subtype)
+STREAM_FIELDS = {
+    "rain": ("rain", "rain_mm", None),
+    "irrigation": ("irrigation", "water_liters", None),
+    "fertilizer": ("fertilizer", "amount_kg", "type"),
+    "harvest": ("harvest", "yield_tons", "crop_name"),
+    "amendment": ("amendment", "amount_kg", "type"),
+}
+
+
+class CorruptRecord(Exception):
+    """Raised when a record's CRC or framing does not check out."""
+
+
+def parse_timestamp(ts: str) -> float:
+    """ISO timestamp -> unix seconds (0.0 if unparseable)."""
+    try:
+        return datetime.fromisoformat(ts).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def pipeline_event(record: dict) -> Optional[dict]:
+    """
+    Flatten a stored record into the typed columns the Pathway pipeline
+    reads (see EventLogSchema in main_pipeline.py). None for unknown streams.
+    """
+    fields = STREAM_FIELDS.get(record.get("stream"))
+    if fields is None:
+        return None
+    event_type, amount_key, subtype_key = fields
+    return {
+        "timestamp": record.get("timestamp", ""),
+        "event_type": event_type,
+        "user_id": record.get("user_id", "farmer"),
+        "amount": float(record.get(amount_key) or 0.0),
+        "subtype": str(record.get(subtype_key, "")) if subtype_key else "",
+        "note": record.get("note", ""),
+        "event_id": str(record.get("event_id", "")),
+        "ingested_at": float(record.get("ingested_at") or 0.0),
+    }
+
+
+def encode_cursor(entry: Tuple[int, int, float]) -> str:
+    """Opaque pagination cursor for an index entry."""
+    return base64.urlsafe_b64encode(INDEX_ENTRY.pack(*entry)).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int, float]:
+    """Inverse of encode_cursor. Raises ValueError on a malformed cursor."""
+    try:
+        return INDEX_ENTRY.unpack(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (struct.error, ValueError, UnicodeEncodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _sort_key(entry: Tuple[int, int, float]) -> Tuple[float, int, int]:
+    """History order: timestamp, then log position to break ties."""
+    return (entry[2], entry[0], entry[1])
+
+
+def encode_record(entry: dict) -> bytes:
+    payload = json.dumps(entry, separators=(",", ":")).encode("utf-8")
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_record(f) -> Optional[dict]:
+    """
+    Read one record at the current file position.
+
+    Returns None at a clean end of file or on a partially written tail
+    (the writer has not finished yet). Raises CorruptRecord on a CRC mismatch.
+    """
+    header = f.read(RECORD_HEADER.size)
+    if len(header) < RECORD_HEADER.size:
+        return None
+    length, crc = RECORD_HEADER.unpack(header)
+    payload = f.read(length)
+    if len(payload) < length:
+        return None
+    if zlib.crc32(payload) != crc:
+        raise CorruptRecord(f"CRC mismatch at {f.tell() - length - RECORD_HEADER.size}")
+    return json.loads(payload)
+
+
+class FileLock:
+    """flock-based lock shared by every process appending to a file (the log, the embedding cache)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+
+class EventLog:
+    """
+    Append-only segmented log with a per-user offset index.
+
+    Each record is a dict with at least ``stream``, ``timestamp`` and
+    ``user_id``; the remaining keys are the same fields the old JSONL files
+    carried (rain_mm, water_liters, amount_kg, type, crop_name, ...).
+    """
+
+    def __init__(self, root: str = EVENT_LOG_DIR, segment_bytes: int = SEGMENT_BYTES):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.segment_dir = os.path.join(root, "segments")
+        self.index_dir = os.path.join(root, "index")
+        os.makedirs(self.segment_dir, exist_ok=True)
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._lock = FileLock(os.path.join(root, ".lock"))
+        # (segment, fd) of the O_APPEND handle reused across writes
+        self._segment_fd = None
+        with self._lock:
+            self._recover()
+
+    # ── Paths ────────────────────────────────────────────────────────────────
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.segment_dir, f"{segment:08d}.log")
+
+    def index_path(self, user_id: str) -> str:
+        return os.path.join(self.index_dir, quote(user_id, safe="") + ".idx")
+
+    def runs_path(self, user_id: str) -> str:
+        return os.path.join(self.index_dir, quote(user_id, safe="") + ".runs")
+
+    def segments(self) -> List[int]:
+        return sorted(int(name[:-4]) for name in os.listdir(self.segment_dir) if name.endswith(".log"))
+
+    def _active_segment(self) -> int:
+        """Last segment with room left, rolling over to a new one if needed."""
+        existing = self.segments()
+        segment = existing[-1] if existing else 0
+        while os.path.exists(self.segment_path(segment)) and \
+                os.path.getsize(self.segment_path(segment)) >= self.segment_bytes:
+            segment += 1
+        return segment
+
+    # ── Write path ───────────────────────────────────────────────────────────
+    def append(self, stream: str, entry: dict) -> Tuple[int, int]:
+        """Append one event. Returns its (segment, position)."""
+        return self.append_many([(stream, entry)])[0]
+
+    def append_many(self, events: List[Tuple[str, dict]], sync: bool = False) -> List[Tuple[int, int]]:
+        """
+        Append several events under one lock acquisition and one write per
+        touched file. With ``sync=True`` the batch is fsynced once before
+        returning (group commit), so every event in it is durable together.
+        Returns (segment, position) for each event, in order.
+        """
+        if not events:
+            return []
+        with self._lock:
+            mark = self._mark(events)
+            try:
+                return self._write(events, sync)
+            except BaseException:
+                # All or nothing, so a caller can retry the batch without duplicating events
+                self._rollback(mark)
+                raise
+
+    def _mark(self, events: List[Tuple[str, dict]]) -> Tuple[int, dict]:
+        """Active segment and the size of every file appending ``events`` can touch."""
+        segment = self._active_segment()
+        paths = [self.segment_path(segment)]
+        for user_id in {entry.get("user_id", "farmer") for _, entry in events}:
+            paths += [self.index_path(user_id), self.runs_path(user_id)]
+        return segment, {path: os.path.getsize(path) if os.path.exists(path) else None for path in paths}
+
+    def _rollback(self, mark: Tuple[int, dict]):
+        """Undo a failed append: truncate what it wrote and drop segments it rolled over to."""
+        first_segment, sizes = mark
+        try:
+            for segment in self.segments():
+                created = segment > first_segment or (
+                    segment == first_segment and sizes[self.segment_path(segment)] is None)
+                if created:
+                    if self._segment_fd is not None and self._segment_fd[0] == segment:
+                        os.close(self._segment_fd[1])
+                        self._segment_fd = None
+                    os.remove(self.segment_path(segment))
+            for path, size in sizes.items():
+                if size is None:
+                    if os.path.exists(path):
+                        os.remove(path)
+                elif os.path.getsize(path) > size:
+                    with open(path, "r+b") as f:
+                        f.truncate(size)
+        except OSError as e:
+            print(f"⚠️  Event log: could not roll back a failed append ({e}); recovering on next open")
+
+    def _write(self, events: List[Tuple[str, dict]], sync: bool = False) -> List[Tuple[int, int]]:
+        segment = self._active_segment()
+        path = self.segment_path(segment)
+        position = os.path.getsize(path) if os.path.exists(path) else 0
+
+        blob = bytearray()
+        offsets = []
+        index_updates = {}
+        for stream, entry in events:
+            # Roll to a fresh segment once this one is full
+            if blob and position + len(blob) >= self.segment_bytes:
+                self._flush(segment, blob, index_updates, sync)
+                segment, position, blob, index_updates = segment + 1, 0, bytearray(), {}
+
+            record = {"stream": stream, **entry}
+            offsets.append((segment, position + len(blob)))
+            index_updates.setdefault(record.get("user_id", "farmer"), []).append(
+                (segment, position + len(blob), parse_timestamp(record.get("timestamp")))
+            )
+            blob.extend(encode_record(record))
+        self._flush(segment, blob, index_updates, sync)
+        return offsets
+
+    def _flush(self, segment: int, blob: bytes, index_updates: dict, sync: bool = False):
+        # Records first, index second: a crash in between leaves unindexed
+        # records at the tail of the active segment, which _recover() re-indexes.
+        # Only the segment needs fsync; the index can always be rebuilt from it.
+        fd = self._append_fd(segment)
+        view = memoryview(blob)
+        while view:
+            view = view[os.write(fd, view):]
+        if sync:
+            os.fsync(fd)
+        for user_id, entries in index_updates.items():
+            self._append_index(user_id, entries)
+
+    def _append_fd(self, segment: int) -> int:
+        """
+        Long-lived O_APPEND descriptor for a segment. Every write lands at
+        the current end of file even if another process appended in between,
+        and the handle is swapped only when the log rolls to a new segment.
+        """
+        if self._segment_fd is not None:
+            if self._segment_fd[0] == segment:
+                return self._segment_fd[1]
+            os.close(self._segment_fd[1])
+        fd = os.open(self.segment_path(segment), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._segment_fd = (segment, fd)
+        return fd
+
+    def _append_index(self, user_id: str, entries: List[Tuple[int, int, float]]):
+        """
+        Append index entries for one user, recording where a new sorted run
+        begins whenever a timestamp is older than the one before it.
+        """
+        path = self.index_path(user_id)
+        count = os.path.getsize(path) // INDEX_ENTRY.size if os.path.exists(path) else 0
+        last = self._entry_at(user_id, count - 1) if count else None
+
+        run_starts = bytearray()
+        for i, entry in enumerate(entries):
+            if last is not None and entry[2] < last[2]:
+                run_starts.extend(RUN_START.pack(count + i))
+            last = entry
+
+        with open(path, "ab") as f:
+            f.write(b"".join(INDEX_ENTRY.pack(*e) for e in entries))
+        if run_starts:
+            with open(self.runs_path(user_id), "ab") as f:
+                f.write(run_starts)
+
+    # ── Read path ────────────────────────────────────────────────────────────
+    def read_at(self, segment: int, position: int) -> Optional[dict]:
+        with open(self.segment_path(segment), "rb") as f:
+            f.seek(position)
+            return read_record(f)
+
+    def read_index(self, user_id: str) -> List[Tuple[int, int, float]]:
+        """All (segment, position, timestamp) entries for a user, in append order."""
+        path = self.index_path(user_id)
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        return list(INDEX_ENTRY.iter_unpack(data[:usable]))
+
+    def _entry_at(self, user_id: str, n: int) -> Optional[Tuple[int, int, float]]:
+        with open(self.index_path(user_id), "rb") as f:
+            f.seek(n * INDEX_ENTRY.size)
+            data = f.read(INDEX_ENTRY.size)
+        return INDEX_ENTRY.unpack(data) if len(data) == INDEX_ENTRY.size else None
+
+    def _runs(self, user_id: str, count: int) -> List[Tuple[int, int]]:
+        """[start, end) entry ranges of the user's timestamp-sorted runs."""
+        starts = {0}
+        path = self.runs_path(user_id)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            usable = len(data) - len(data) % RUN_START.size
+            starts.update(s for (s,) in RUN_START.iter_unpack(data[:usable]) if 0 < s < count)
+        starts = sorted(starts)
+        return list(zip(starts, starts[1:] + [count]))
+
+    @staticmethod
+    def _bisect(f, lo: int, hi: int, past) -> int:
+        """First entry number in [lo, hi) for which ``past(entry)`` holds."""
+        while lo < hi:
+            mid = (lo + hi) // 2
+            f.seek(mid * INDEX_ENTRY.size)
+            if past(INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    @staticmethod
+    def _iter_run(f, lo: int, hi: int, reverse: bool) -> Iterator[Tuple[int, int, float]]:
+        """Entries lo..hi-1 of one run, read INDEX_BLOCK at a time."""
+        blocks = range(lo, hi, INDEX_BLOCK)
+        for start in (reversed(blocks) if reverse else blocks):
+            end = min(start + INDEX_BLOCK, hi)
+            f.seek(start * INDEX_ENTRY.size)
+            entries = list(INDEX_ENTRY.iter_unpack(f.read((end - start) * INDEX_ENTRY.size)))
+            yield from (reversed(entries) if reverse else entries)
+
+    def iter_user(
+        self,
+        user_id: str,
+        reverse: bool = True,
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None,
+        before: Optional[Tuple[int, int, float]] = None,
+        after: Optional[Tuple[int, int, float]] = None,
+    ) -> Iterator[Tuple[Tuple[int, int, float], dict]]:
+        """
+        Yield (index entry, record) for one user in timestamp order, newest
+        first by default. Only entries inside [start_ts, end_ts] and strictly
+        between the ``after``/``before`` cursor entries are read, so stopping
+        after a page leaves the rest of the history untouched.
+        """
+        path = self.index_path(user_id)
+        if not os.path.exists(path):
+            return
+        count = os.path.getsize(path) // INDEX_ENTRY.size
+
+        def below(e):
+            return (start_ts is not None and e[2] < start_ts) or \
+                   (after is not None and _sort_key(e) <= _sort_key(after))
+
+        def above(e):
+            return (end_ts is not None and e[2] > end_ts) or \
+                   (before is not None and _sort_key(e) >= _sort_key(before))
+
+        handles = {}
+        idx = open(path, "rb")
+        try:
+            runs = []
+            for lo, hi in self._runs(user_id, count):
+                first = self._bisect(idx, lo, hi, lambda e: not below(e))
+                last = self._bisect(idx, first, hi, above)
+                if first < last:
+                    # Each run gets its own handle so the merge can interleave reads
+                    f = open(path, "rb")
+                    handles[("idx", lo)] = f
+                    runs.append(self._iter_run(f, first, last, reverse))
+
+            for entry in heapq.merge(*runs, key=_sort_key, reverse=reverse):
+                segment, position, _ = entry
+                f = self._segment_handle(handles, segment)
+                if f is None:
+                    continue
+                f.seek(position)
+                try:
+                    record = read_record(f)
+                except CorruptRecord as e:
+                    print(f"⚠️  Skipping corrupt event record ({segment}:{position}): {e}")
+                    continue
+                if record is not None:
+                    yield entry, record
+        finally:
+            idx.close()
+            for f in handles.values():
+                if f is not None:
+                    f.close()
+
+    def _segment_handle(self, handles: dict, segment: int):
+        """
+        Cached read handle for a segment, or None if compaction archived it
+        after the index was read (the entry is simply skipped).
+        """
+        if segment not in handles:
+            try:
+                handles[segment] = open(self.segment_path(segment), "rb")
+            except FileNotFoundError:
+                handles[segment] = None
+        return handles[segment]
+
+    def read_user(self, user_id: str) -> List[dict]:
+        """Every record for one user, in append order. Cost is O(user's events)."""
+        records = []
+        handles = {}
+        try:
+            for segment, position, _ in self.read_index(user_id):
+                f = self._segment_handle(handles, segment)
+                if f is None:
+                    continue
+                f.seek(position)
+                try:
+                    record = read_record(f)
+                except CorruptRecord as e:
+                    print(f"⚠️  Skipping corrupt event record ({segment}:{position}): {e}")
+                    continue
+                if record is not None:
+                    records.append(record)
+        finally:
+            for f in handles.values():
+                if f is not None:
+                    f.close()
+        return records
+
+    def scan(self, segment: int = 0, position: int = 0) -> Iterator[Tuple[int, int, dict]]:
+        """
+        Yield (segment, next_position, record) for every complete record from
+        the given offset to the current end of the log.
+        """
+        for seg in self.segments():
+            if seg < segment:
+                continue
+            with open(self.segment_path(seg), "rb") as f:
+                f.seek(position if seg == segment else 0)
+                while True:
+                    try:
+                        record = read_record(f)
+                    except CorruptRecord as e:
+                        # Framing is intact (length was readable), so skip just this record
+                        print(f"⚠️  Skipping corrupt event record in segment {seg}: {e}")
+                        continue
+                    if record is None:
+                        break
+                    yield seg, f.tell(), record
+
+    # ── Recovery ─────────────────────────────────────────────────────────────
+    def _recover(self):
+        """
+        Truncate a torn or corrupt tail off the active segment and re-index
+        any of its records whose index entry was never written.
+        """
+        existing = self.segments()
+        if not existing:
+            return
+        segment = existing[-1]
+        path = self.segment_path(segment)
+
+        last_indexed = {}
+        valid_end = 0
+        missing = {}
+        with open(path, "rb") as f:
+            while True:
+                position = f.tell()
+                try:
+                    record = read_record(f)
+                except CorruptRecord:
+                    record = None
+                if record is None:
+                    break
+                valid_end = f.tell()
+
+                user_id = record.get("user_id", "farmer")
+                if user_id not in last_indexed:
+                    index_path = self.index_path(user_id)
+                    count = os.path.getsize(index_path) // INDEX_ENTRY.size if os.path.exists(index_path) else 0
+                    last = self._entry_at(user_id, count - 1) if count else None
+                    last_indexed[user_id] = last[:2] if last else (-1, -1)
+                if (segment, position) > tuple(last_indexed[user_id]):
+                    missing.setdefault(user_id, []).append(
+                        (segment, position, parse_timestamp(record.get("timestamp")))
+                    )
+
+        if valid_end < os.path.getsize(path):
+            print(f"⚠️  Event log: truncating torn tail of segment {segment} at byte {valid_end}")
+            with open(path, "r+b") as f:
+                f.truncate(valid_end)
+        for user_id, entries in missing.items():
+            self._append_index(user_id, entries)
+
+
+def migrate_legacy_streams(log: EventLog, streams: dict = LEGACY_STREAMS) -> int:
+    """
+    One-time import of the old per-type JSONL/JSON stream files into the log.
+    Skips blank or unparseable lines. Returns the number of events imported.
+    """
+    marker = os.path.join(log.root, ".migrated")
+    with log._lock:
+        if os.path.exists(marker):
+            return 0
+
+        events = []
+        for stream, path in streams.items():
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line.strip())
+                    except ValueError:
+                        continue
+                    if isinstance(entry, dict) and "timestamp" in entry:
+                        entry.setdefault("user_id", "farmer")
+                        events.append((stream, entry))
+
+        events.sort(key=lambda e: parse_timestamp(e[1]["timestamp"]))
+        if events:
+            log._write(events)
+        with open(marker, "w") as f:
+            f.write(datetime.now().isoformat())
+        return len(events)
+
+
+if __name__ == "__main__":
+    import sys
+
+    log = EventLog()
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+
+    if command == "migrate":
+        count = migrate_legacy_streams(log)
+        print(f"✅ Imported {count} legacy events into {log.root}")
+    elif command == "verify":
+        total = 0
+        for segment in log.segments():
+            with open(log.segment_path(segment), "rb") as f:
+                try:
+                    while read_record(f) is not None:
+                        total += 1
+                except CorruptRecord as e:
+                    print(f"❌ Segment {segment}: {e}")
+        print(f"✅ {total} records verified across {len(log.segments())} segments")
+    elif command == "bench":
+        # Single appends (one write per event) vs group commit (one fsync per batch)
+        import tempfile
+
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+        batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+        ts = datetime.now().isoformat()
+        events = [
+            ("rain", {"timestamp": ts, "note": "bench", "user_id": f"farmer{i % 8}", "rain_mm": 1.0})
+            for i in range(count)
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            runs = [
+                ("single append", lambda bench: [bench.append(s, e) for s, e in events]),
+                ("single append+fsync", lambda bench: [bench.append_many([ev], sync=True) for ev in events]),
+                (f"batch of {batch_size}+fsync", lambda bench: [
+                    bench.append_many(events[i:i + batch_size], sync=True)
+                    for i in range(0, count, batch_size)
+                ]),
+            ]
+            for n, (label, run) in enumerate(runs):
+                bench = EventLog(os.path.join(tmp, str(n)))
+                start = time.perf_counter()
+                run(bench)
+                elapsed = time.perf_counter() - start
+                print(f"⏱️  {label:>24}: {count / elapsed:>10,.0f} events/s ({elapsed:.2f}s)")
+    else:
+        print(f"📂 {log.root}: {len(log.segments())} segments")
+        for name in sorted(n for n in os.listdir(log.index_dir) if n.endswith(".idx")):
+            print(f"   {name}: {os.path.getsize(os.path.join(log.index_dir, name)) // INDEX_ENTRY.size} events")
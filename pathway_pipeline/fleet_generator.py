@@ -0,0 +1,277 @@
+"""
+Synthetic Farm Fleet Generator
+N farms with realistic Soil Health Card values, matching user accounts, and an event stream
+(rain, irrigation, fertilizer, harvest, amendment) written into the event log the pipeline tails
+
+Usage:
+    python pathway_pipeline/fleet_generator.py --farms 100000 --events 2000000 --days 90
+    python pathway_pipeline/fleet_generator.py --farms 100000 --no-shc --rate 500 --duration 600
+    python pathway_pipeline/fleet_generator.py --farms 100000 --users --events 0
+
+Then point the pipeline at the generated cards:
+    PIPELINE_SHC_PATH=data/soil_health_card/fleet_shc.csv ./start.sh
+
+Farm ``n`` is always user ``<prefix><n:06d>`` with the same location, soil
+card and (with --users) the same login, so cards, events and accounts
+generated by separate runs line up. Backfilled events are appended in
+timestamp order so every farm's index stays a single sorted run; --rate
+appends live events stamped "now" at a steady target rate instead.
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pathway_pipeline.event_log import EVENT_LOG_DIR, EventLog
+
+FLEET_SHC_PATH = "./data/soil_health_card/fleet_shc.csv"
+USER_PREFIX = "fleet"
+BATCH_SIZE = 10000           # events per append_many / users per insert_many
+TICK_SECONDS = 0.1           # live mode pacing granularity
+
+# District -> (pH bias, texture weights: Sandy Loam, Loam, Clay Loam, Clay).
+# Indo-Gangetic plains run alkaline and loamy, the north-east and the
+# Western Ghats acidic, the Deccan plateau heavy black clay.
+LOCATIONS = {
+    "Karnal IN": (0.6, (0.4, 0.4, 0.15, 0.05)),
+    "Ludhiana IN": (0.7, (0.35, 0.45, 0.15, 0.05)),
+    "Hisar IN": (0.9, (0.6, 0.3, 0.1, 0.0)),
+    "Meerut IN": (0.4, (0.25, 0.5, 0.2, 0.05)),
+    "Varanasi IN": (0.3, (0.2, 0.45, 0.3, 0.05)),
+    "Patna IN": (0.2, (0.15, 0.45, 0.3, 0.1)),
+    "Indore IN": (0.5, (0.05, 0.2, 0.35, 0.4)),
+    "Nagpur IN": (0.4, (0.05, 0.2, 0.35, 0.4)),
+    "Pune IN": (0.3, (0.1, 0.3, 0.3, 0.3)),
+    "Guntur IN": (0.3, (0.1, 0.3, 0.3, 0.3)),
+    "Coimbatore IN": (0.0, (0.3, 0.4, 0.2, 0.1)),
+    "Thrissur IN": (-1.6, (0.3, 0.4, 0.25, 0.05)),
+    "Guwahati IN": (-1.7, (0.2, 0.45, 0.3, 0.05)),
+    "Cuttack IN": (-0.9, (0.25, 0.4, 0.3, 0.05)),
+}
+TEXTURES = ("Sandy Loam", "Loam", "Clay Loam", "Clay")
+TEXTURE_MOISTURE = np.array([15.0, 25.0, 32.0, 40.0])   # typical field moisture %, by texture
+
+# Stream -> relative frequency outside / during the monsoon (June-September)
+STREAM_WEIGHTS = {
+    "rain": (0.10, 0.45),
+    "irrigation": (0.40, 0.15),
+    "fertilizer": (0.30, 0.25),
+    "harvest": (0.05, 0.05),
+    "amendment": (0.15, 0.10),
+}
+FERTILIZERS = (("Urea", 0.5), ("DAP", 0.3), ("Potash", 0.12), ("SSP", 0.08))
+CROPS = (("Wheat", 0.4), ("Rice", 0.4), ("Maize", 0.1), ("Cotton", 0.05), ("Sugarcane", 0.05))
+AMENDMENTS = (("Manure", 0.5), ("Compost", 0.3), ("Lime", 0.1), ("Gypsum", 0.1))
+
+
+def farm_id(n: int, prefix: str = USER_PREFIX) -> str:
+    return f"{prefix}{n:06d}"
+
+
+def _pick(rng, choices, size):
+    names, weights = zip(*choices)
+    return np.array(names)[rng.choice(len(names), size=size, p=np.array(weights) / sum(weights))]
+
+
+def generate_cards(farms: int, seed: int = 0) -> dict:
+    """
+    Column arrays in sample_shc.csv layout for ``farms`` farms.
+
+    Nitrogen, phosphorus and potassium are log-normal around typical
+    Indian SHC medians (N ~250, P ~18, K ~220 kg/ha); organic carbon tracks
+    nitrogen, pH follows the district, moisture follows the texture.
+    """
+    rng = np.random.default_rng(seed)
+    names = list(LOCATIONS)
+    location = rng.integers(0, len(names), farms)
+    ph_bias = np.array([LOCATIONS[name][0] for name in names])[location]
+
+    texture = np.empty(farms, dtype=np.int64)
+    for i, name in enumerate(names):
+        mask = location == i
+        texture[mask] = rng.choice(len(TEXTURES), size=mask.sum(), p=LOCATIONS[name][1])
+
+    nitrogen = np.clip(rng.lognormal(np.log(250), 0.35, farms), 80, 700)
+    organic_carbon = np.clip(0.5 * (nitrogen / 250) ** 0.8 * rng.lognormal(0, 0.25, farms), 0.1, 1.5)
+    return {
+        "uid": [farm_id(n) for n in range(farms)],
+        "location": np.array(names)[location],
+        "nitrogen": nitrogen.round(1),
+        "phosphorus": np.clip(rng.lognormal(np.log(18), 0.5, farms), 2, 90).round(1),
+        "potassium": np.clip(rng.lognormal(np.log(220), 0.4, farms), 60, 700).round(1),
+        "ph": np.clip(rng.normal(7.0 + ph_bias, 0.5), 4.5, 9.5).round(2),
+        "organic_carbon": organic_carbon.round(2),
+        "moisture": np.clip(rng.normal(TEXTURE_MOISTURE[texture], 6.0), 5, 80).round(1),
+        "texture": np.array(TEXTURES)[texture],
+    }
+
+
+def write_cards(path: str, cards: dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    columns = list(cards)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(zip(*(cards[c] for c in columns)))
+
+
+def generate_events(count: int, farms: int, start: float, end: float, rng, prefix: str = USER_PREFIX):
+    """
+    ``count`` (stream, entry) pairs stamped between the unix times ``start``
+    and ``end``, in timestamp order, in the same record shape the API's
+    event injection writes.
+    """
+    stamps = np.sort(rng.uniform(start, end, count)) if end > start else np.full(count, start)
+    monsoon = np.array([datetime.fromtimestamp(t).month in (6, 7, 8, 9) for t in stamps]) if count else np.zeros(0, bool)
+    streams = np.array(list(STREAM_WEIGHTS))
+    stream = np.empty(count, dtype=streams.dtype)
+    for season, mask in ((0, ~monsoon), (1, monsoon)):
+        weights = np.array([w[season] for w in STREAM_WEIGHTS.values()])
+        stream[mask] = streams[rng.choice(len(streams), size=mask.sum(), p=weights / weights.sum())]
+
+    farm = rng.integers(0, farms, count)
+    rain_mm = np.minimum(rng.exponential(12.0, count), 150).round(1)
+    liters = rng.uniform(5000, 50000, count).round(-2)
+    fert_kg = rng.uniform(25, 150, count).round(1)
+    amend_kg = rng.uniform(200, 2000, count).round(0)
+    yield_tons = rng.uniform(2.0, 6.5, count).round(2)
+    fertilizer = _pick(rng, FERTILIZERS, count)
+    crop = _pick(rng, CROPS, count)
+    amendment = _pick(rng, AMENDMENTS, count)
+
+    for i in range(count):
+        common = {
+            "timestamp": datetime.fromtimestamp(stamps[i]).isoformat(timespec="seconds"),
+            "note": "Fleet generator",
+            "user_id": farm_id(int(farm[i]), prefix),
+        }
+        kind = stream[i]
+        if kind == "rain":
+            entry = {**common, "rain_mm": float(rain_mm[i])}
+        elif kind == "irrigation":
+            entry = {**common, "water_liters": float(liters[i])}
+        elif kind == "fertilizer":
+            entry = {**common, "amount_kg": float(fert_kg[i]), "type": str(fertilizer[i])}
+        elif kind == "harvest":
+            entry = {**common, "event": "harvest", "crop_name": str(crop[i]), "yield_tons": float(yield_tons[i])}
+        else:
+            entry = {**common, "type": str(amendment[i]), "amount_kg": float(amend_kg[i])}
+        yield str(kind), entry
+
+
+def backfill(log: EventLog, count: int, farms: int, days: float, seed: int = 0) -> int:
+    """Append ``count`` events spread over the last ``days`` days."""
+    rng = np.random.default_rng(seed + 1)
+    end = time.time()
+    start = (datetime.fromtimestamp(end) - timedelta(days=days)).timestamp()
+    written = 0
+    batch = []
+    for event in generate_events(count, farms, start, end, rng):
+        batch.append(event)
+        if len(batch) == BATCH_SIZE:
+            log.append_many(batch)
+            written += len(batch)
+            batch = []
+            print(f"\r📝 {written:,}/{count:,} events", end="", flush=True)
+    if batch:
+        log.append_many(batch)
+        written += len(batch)
+    print(f"\r📝 {written:,}/{count:,} events")
+    return written
+
+
+def stream_live(log: EventLog, rate: float, duration: float, farms: int, seed: int = 0) -> int:
+    """
+    Append events stamped "now" at ``rate`` events/s for ``duration``
+    seconds (forever if 0). Each tick writes however many events are due,
+    so the average rate holds even when a flush runs long.
+    """
+    rng = np.random.default_rng(seed + 2)
+    started = time.monotonic()
+    written = 0
+    last_report = started
+    while duration <= 0 or time.monotonic() - started < duration:
+        due = int((time.monotonic() - started) * rate) - written
+        if due > 0:
+            now = time.time()
+            written += len(log.append_many(list(generate_events(due, farms, now, now, rng))))
+        if time.monotonic() - last_report >= 5:
+            last_report = time.monotonic()
+            print(f"📡 {written:,} events ({written / (last_report - started):,.0f}/s)")
+        time.sleep(TICK_SECONDS)
+    return written
+
+
+def seed_users(farms: int, password: str) -> int:
+    """
+    Bulk-create one farmer login per farm with ``insert_many``. Accounts
+    that already exist are left as they are; every account shares one
+    bcrypt hash, since hashing per user would dominate the run.
+    """
+    from pymongo.errors import BulkWriteError
+    from backend.database import init_db, users_collection
+    from backend.crud.user_crud import hash_password
+
+    init_db()
+    hashed = hash_password(password)
+    created = 0
+    for offset in range(0, farms, BATCH_SIZE):
+        docs = [{
+            "username": farm_id(n),
+            "email": f"{farm_id(n)}@fleet.soiltwin.com",
+            "fullname": f"Fleet Farmer {n}",
+            "hashed_password": hashed,
+            "role": "farmer",
+            "disabled": False,
+            "created_at": datetime.utcnow(),
+            "updated_at": None,
+        } for n in range(offset, min(offset + BATCH_SIZE, farms))]
+        try:
+            created += len(users_collection.insert_many(docs, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            created += e.details.get("nInserted", 0)
+    return created
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic SoilTwin farm fleet")
+    parser.add_argument("--farms", type=int, default=10000, help="number of farms (default 10000)")
+    parser.add_argument("--events", type=int, default=100000, help="backfilled events (default 100000)")
+    parser.add_argument("--days", type=float, default=90, help="history the backfill spans (default 90)")
+    parser.add_argument("--rate", type=float, default=0, help="then append live events at this rate per second")
+    parser.add_argument("--duration", type=float, default=0, help="seconds of live events (0 = until Ctrl+C)")
+    parser.add_argument("--shc", default=FLEET_SHC_PATH, help=f"soil health card CSV to write (default {FLEET_SHC_PATH})")
+    parser.add_argument("--no-shc", action="store_true", help="keep the existing soil health card CSV")
+    parser.add_argument("--log-dir", default=EVENT_LOG_DIR, help=f"event log to append to (default {EVENT_LOG_DIR})")
+    parser.add_argument("--users", action="store_true", help="also create one login per farm in MongoDB")
+    parser.add_argument("--password", default="farmer123", help="password for the generated logins")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not args.no_shc:
+        write_cards(args.shc, generate_cards(args.farms, args.seed))
+        print(f"🪪 Wrote {args.farms:,} soil health cards to {args.shc}")
+
+    if args.users:
+        print(f"👥 Created {seed_users(args.farms, args.password):,} fleet users")
+
+    log = EventLog(args.log_dir)
+    if args.events:
+        started = time.perf_counter()
+        written = backfill(log, args.events, args.farms, args.days, args.seed)
+        print(f"✅ Backfilled {written:,} events in {time.perf_counter() - started:.1f}s")
+
+    if args.rate > 0:
+        print(f"📡 Streaming {args.rate:g} events/s into {args.log_dir} (Ctrl+C to stop)")
+        try:
+            written = stream_live(log, args.rate, args.duration, args.farms, args.seed)
+            print(f"✅ Streamed {written:,} live events")
+        except KeyboardInterrupt:
+            print("\n🛑 Stopped live stream")
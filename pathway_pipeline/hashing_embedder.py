@@ -0,0 +1,178 @@
+"""
+Hashing Embedder
+Deterministic, dependency-free text embeddings from hashed word and character n-grams with TF-IDF weighting
+
+Each text is split into three feature groups: words, word bigrams, and
+character 3-5-grams of every word with boundary markers (so "urea" and
+"ureas", or a misspelt "nitrogn", still share most of their features).
+Every feature is hashed with crc32 into HASH_PROBES of HASHING_DIMS
+buckets, with one more bit of each hash picking the sign, so colliding
+features tend to cancel instead of piling up and one unlucky collision
+cannot wipe a feature out.
+
+Counts get sublinear TF (1 + log tf) times the feature's IDF over the
+knowledge base. Features the knowledge base never uses cannot tell its
+chunks apart, so they get the IDF floor of 1 rather than drowning out the
+words that can. Each group is L2-normalised and the groups are mixed by
+GROUP_WEIGHTS, so cosine similarity tracks shared, informative terms
+rather than text length or filler words.
+
+No model download and no torch: fitting the IDF takes tens of
+milliseconds, and the same text always maps to the same vector. The
+model name carries a digest of the IDF corpus, so cached vectors and
+indexes built against a different knowledge base are never mixed with
+new ones. A fitted IDF can be saved (``state``) and reloaded
+(``HashingEmbedder(state=...)``): the vector store keeps the one it was
+built with, so editing the knowledge base does not change the vectors
+of the chunks that stayed the same.
+"""
+
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+HASHING_DIMS = int(os.getenv("HASHING_DIMS", "384"))     # same width as all-MiniLM-L6-v2
+CHAR_NGRAMS = (3, 5)                                     # inclusive range of character n-gram sizes
+GROUP_WEIGHTS = {"word": 1.0, "bigram": 0.5, "char": 0.7}
+HASH_PROBES = 2                                          # buckets per feature
+UNSEEN_IDF = 1.0                                         # IDF of features missing from the IDF corpus
+IDF_SOURCES = (
+    "./data/knowledge_base/seed_knowledge.json",
+    "./docs/*.txt",
+)
+FEATURE_VERSION = "v1"       # bump when tokenisation or hashing changes
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def features(text: str) -> dict:
+    """Feature group -> Counter of feature strings."""
+    words = tokenize(text)
+    chars = Counter()
+    low, high = CHAR_NGRAMS
+    for word in words:
+        marked = f"<{word}>"
+        for n in range(low, high + 1):
+            for i in range(len(marked) - n + 1):
+                chars[marked[i:i + n]] += 1
+    return {
+        "word": Counter(words),
+        "bigram": Counter(f"{a} {b}" for a, b in zip(words, words[1:])),
+        "char": chars,
+    }
+
+
+@lru_cache(maxsize=1 << 16)
+def _hash(group: str, feature: str, dims: int) -> Tuple[Tuple[int, float], ...]:
+    """(bucket, sign) per probe for one feature; groups are salted so they hash independently."""
+    probes = []
+    for probe in range(HASH_PROBES):
+        h = zlib.crc32(f"{probe}:{group}:{feature}".encode("utf-8"))
+        probes.append((h % dims, -1.0 if h & 0x80000000 else 1.0))
+    return tuple(probes)
+
+
+def load_corpus(sources: Iterable[str] = IDF_SOURCES) -> List[str]:
+    """Texts to fit the IDF on: seed knowledge entries and paragraphs of the docs."""
+    texts = []
+    for pattern in sources:
+        for path in sorted(glob.glob(pattern)):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    if path.endswith(".json"):
+                        texts += [doc.get("content", "") for doc in json.load(f) if isinstance(doc, dict)]
+                    else:
+                        texts += re.split(r"\n\s*\n", f.read())
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Skipping {path} for hashing IDF: {e}")
+    return [t.strip() for t in texts if t.strip()]
+
+
+class HashingEmbedder:
+    """
+    ``embed`` / ``embed_many`` return float32 unit vectors of ``dims``
+    entries. Pass ``corpus`` to fit the IDF on specific texts; by default
+    it is fitted on IDF_SOURCES, and an empty corpus means plain TF.
+    ``state`` (from ``state()``) restores a fitted embedder as it was.
+    """
+
+    def __init__(self, dims: int = HASHING_DIMS, corpus: List[str] = None, state: dict = None):
+        if state is not None:
+            if state.get("feature_version") != FEATURE_VERSION:
+                raise ValueError(f"hashing state is {state.get('feature_version')}, expected {FEATURE_VERSION}")
+            self.dims = int(state["dims"])
+            self.documents = int(state["documents"])
+            self.idf = {group: dict(state["idf"].get(group, {})) for group in GROUP_WEIGHTS}
+            self.name = state["name"]
+            return
+        self.dims = dims
+        if corpus is None:
+            corpus = load_corpus()
+        self.documents = len(corpus)
+        # Per group: feature -> IDF; features the corpus never had get UNSEEN_IDF
+        self.idf = {group: {} for group in GROUP_WEIGHTS}
+        if corpus:
+            df = {group: Counter() for group in GROUP_WEIGHTS}
+            for text in corpus:
+                for group, counts in features(text).items():
+                    df[group].update(counts.keys())
+            for group, counts in df.items():
+                self.idf[group] = {f: math.log((1 + len(corpus)) / (1 + n)) + 1 for f, n in counts.items()}
+            digest = hashlib.sha256("\0".join(corpus).encode("utf-8")).hexdigest()[:8]
+        else:
+            digest = "tf"
+        self.name = f"hashing-{FEATURE_VERSION}-{dims}-{digest}"
+
+    def state(self) -> dict:
+        """JSON-serialisable fitted IDF, for HashingEmbedder(state=...)."""
+        return {
+            "feature_version": FEATURE_VERSION,
+            "name": self.name,
+            "dims": self.dims,
+            "documents": self.documents,
+            "idf": {group: {f: round(v, 6) for f, v in idf.items()} for group, idf in self.idf.items()},
+        }
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dims) float32 matrix, one L2-normalised row per text."""
+        out = np.zeros((len(texts), self.dims), dtype=np.float32)
+        if not texts:
+            return out
+        extracted = [features(text) for text in texts]
+        for group, weight in GROUP_WEIGHTS.items():
+            idf = self.idf[group]
+            rows, buckets, values = [], [], []
+            for row, groups in enumerate(extracted):
+                for feature, count in groups[group].items():
+                    value = (1.0 + math.log(count)) * idf.get(feature, UNSEEN_IDF)
+                    for bucket, sign in _hash(group, feature, self.dims):
+                        rows.append(row)
+                        buckets.append(bucket)
+                        values.append(sign * value)
+            if not rows:
+                continue
+            flat = np.asarray(rows, dtype=np.int64) * self.dims + np.asarray(buckets, dtype=np.int64)
+            block = np.bincount(flat, weights=values, minlength=len(texts) * self.dims)
+            block = block.reshape(len(texts), self.dims).astype(np.float32)
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            out += weight * block / norms
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
@@ -0,0 +1,233 @@
+"""
+Knowledge Indexer
+Incremental re-indexing of docs/*.txt and seed_knowledge.json into the vector store, by chunk content hash
+
+Usage:
+    python pathway_pipeline/indexer.py [--watch] [--interval SECONDS] [--provider NAME] [--full]
+
+Each run compares every source file's size and mtime (then sha256) with
+what the current store manifest recorded. Unchanged files keep their
+chunks and vectors as they are. A changed file is re-chunked with the
+splitter the BM25 index uses (lexical_index.chunk_text), and each chunk
+is looked up by content hash among the store's rows, so only chunks
+whose text is new are embedded; a metadata-only edit embeds nothing.
+Chunks that no longer exist are tombstoned by leaving them out of the
+next version. That version is written next to the current one and made
+current by replacing the manifest, so API workers hot-reload it and
+never see a half-built index.
+
+A store embedded by another model is rebuilt in full, since vectors from
+different models cannot be compared. The hashing (mock) embedder fits its
+IDF on the knowledge base itself; the fitted IDF is saved with the store
+and reused by later runs (and by queries), so an edit does not change the
+vectors of the chunks around it. ``--full`` re-fits it on the current
+sources. ``--watch`` polls the sources every ``--interval`` seconds and
+re-indexes once a change has settled for one poll.
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Optional
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pathway_pipeline.lexical_index import DOCS_GLOB, SEED_KNOWLEDGE_PATH, file_chunks, source_files
+from pathway_pipeline.vector_store import RAG_INDEX_DIR, load_store, read_embedder_state, read_manifest, write_store
+
+WATCH_INTERVAL = float(os.getenv("RAG_WATCH_INTERVAL", "5"))
+MAX_RETRY_SECONDS = 300.0
+
+
+def chunk_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _sources_signature(docs_glob: str, seed_path: str) -> tuple:
+    signature = []
+    for path in source_files(docs_glob, seed_path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        signature.append((path, st.st_size, st.st_mtime_ns))
+    return tuple(signature)
+
+
+def _default_embedder(root: str, manifest: Optional[dict], provider: Optional[str], full: bool,
+                      docs_glob: str, seed_path: str):
+    """
+    EmbeddingService for ``provider`` (default: the store's, else auto). If it
+    falls back to hashing, it keeps the IDF the store was built with unless
+    ``full`` asks for one fitted on the current sources.
+    """
+    from pathway_pipeline.embedding_service import EmbeddingService
+    from pathway_pipeline.hashing_embedder import HashingEmbedder, load_corpus
+
+    state = None
+    if manifest and not full:
+        try:
+            state = read_embedder_state(root, manifest)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not read the store's hashing IDF: {e}; fitting a new one")
+    hashing = None
+    try:
+        hashing = HashingEmbedder(state=state) if state else None
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"⚠️  Store's hashing IDF unusable: {e}; fitting a new one")
+    if hashing is None:
+        hashing = HashingEmbedder(corpus=load_corpus((seed_path, docs_glob)))
+    return EmbeddingService(provider=provider or (manifest or {}).get("provider", "auto"), hashing_model=hashing)
+
+
+def reindex(root: str = RAG_INDEX_DIR, embedder=None, full: bool = False,
+            docs_glob: str = DOCS_GLOB, seed_path: str = SEED_KNOWLEDGE_PATH,
+            provider: Optional[str] = None) -> Optional[dict]:
+    """
+    One incremental pass over the knowledge base. Returns the new manifest
+    (with a ``stats`` summary of the pass), or None if nothing changed.
+    Without an ``embedder``, one is made for ``provider`` (see _default_embedder).
+    """
+    start = time.perf_counter()
+    manifest = read_manifest(root)
+    if embedder is None:
+        embedder = _default_embedder(root, manifest, provider, full, docs_glob, seed_path)
+        if not embedder.provider:
+            raise RuntimeError(f"Embedding provider {provider or 'auto'} not available")
+
+    documents, matrix = [], None
+    if manifest and not full:
+        if manifest.get("model") != embedder.model_name:
+            print(f"⚠️  {root} was embedded with {manifest.get('model')}, not {embedder.model_name}; rebuilding in full")
+            full = True
+        else:
+            _, documents, _, _, matrix = load_store(root)
+    old_sources = manifest.get("sources", {}) if manifest and not full else {}
+    rows_by_file = defaultdict(list)
+    row_by_hash = {}
+    for row, doc in enumerate(documents):
+        rows_by_file[doc["filename"]].append(row)
+        if doc.get("hash"):
+            row_by_hash.setdefault(doc["hash"], row)
+
+    chunks, reused_rows, sources = [], [], {}
+    changed_files = []
+    for path in source_files(docs_glob, seed_path):
+        name = os.path.basename(path)
+        try:
+            st = os.stat(path)
+            old = old_sources.get(name)
+            if old and (old["size"], old["mtime_ns"]) == (st.st_size, st.st_mtime_ns) and name in rows_by_file:
+                sources[name] = old
+                chunks += [documents[row] for row in rows_by_file[name]]
+                reused_rows += rows_by_file[name]
+                continue
+            with open(path, "rb") as f:
+                raw = f.read()
+            digest = hashlib.sha256(raw).hexdigest()
+            sources[name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+            if old and old["sha256"] == digest and name in rows_by_file:
+                # Touched but not edited
+                chunks += [documents[row] for row in rows_by_file[name]]
+                reused_rows += rows_by_file[name]
+                continue
+            new_chunks = file_chunks(path, raw.decode("utf-8"))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"⚠️  Skipping {path}: {e}")
+            sources.pop(name, None)
+            continue
+        changed_files.append(name)
+        for chunk in new_chunks:
+            chunk["hash"] = chunk_hash(chunk["content"])
+            chunks.append(chunk)
+            reused_rows.append(row_by_hash.get(chunk["hash"]))
+
+    if not full and manifest and not changed_files and set(sources) == set(old_sources):
+        return None
+    if not chunks:
+        raise RuntimeError("No knowledge base chunks found; keeping the current index")
+
+    missing = [i for i, row in enumerate(reused_rows) if row is None]
+    vectors = embedder.embed_batch([chunks[i]["content"] for i in missing]) if missing else []
+    if any(vector is None for vector in vectors):
+        raise RuntimeError(f"{embedder.provider} failed to embed every new chunk; keeping the current index")
+    dims = len(vectors[0]) if vectors else matrix.shape[1]
+    embeddings = np.empty((len(chunks), dims), dtype=np.float32)
+    kept = [(i, row) for i, row in enumerate(reused_rows) if row is not None]
+    if kept:
+        positions, rows = zip(*kept)
+        embeddings[list(positions)] = np.asarray(matrix[np.array(rows)], dtype=np.float32)
+    if missing:
+        embeddings[missing] = np.asarray(vectors, dtype=np.float32)
+
+    live = {chunk["hash"] for chunk in chunks}
+    state = embedder.model.state() if embedder.provider == "mock" and hasattr(embedder.model, "state") else None
+    new_manifest = write_store(chunks, embeddings, embedder.provider, embedder.model_name, root, sources, state)
+    new_manifest["stats"] = {
+        "chunks": len(chunks),
+        "changed_files": changed_files,
+        "embedded": len(missing),
+        "reused": len(kept),
+        "tombstoned": sum(1 for doc in documents if doc.get("hash") not in live),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    return new_manifest
+
+
+def report(manifest: Optional[dict], root: str = RAG_INDEX_DIR):
+    if manifest is None:
+        print("✅ Knowledge index up to date")
+        return
+    stats = manifest["stats"]
+    print(f"✅ Indexed {stats['chunks']} chunks into {root} (version {manifest['version']}) in {stats['seconds']}s: "
+          f"{stats['embedded']} embedded, {stats['reused']} reused, {stats['tombstoned']} tombstoned"
+          + (f"; changed: {', '.join(stats['changed_files'])}" if stats["changed_files"] else ""))
+
+
+def watch(root: str = RAG_INDEX_DIR, embedder=None, interval: float = WATCH_INTERVAL,
+          docs_glob: str = DOCS_GLOB, seed_path: str = SEED_KNOWLEDGE_PATH, provider: Optional[str] = None):
+    """Re-index whenever the sources change and then stay unchanged for one poll."""
+    print(f"👀 Watching {seed_path} and {docs_glob} every {interval:g}s")
+    indexed = None
+    previous = None
+    failures = 0
+    while True:
+        current = _sources_signature(docs_glob, seed_path)
+        if current == previous and current != indexed:
+            try:
+                report(reindex(root, embedder, docs_glob=docs_glob, seed_path=seed_path, provider=provider), root)
+                indexed = current
+                failures = 0
+            except Exception as e:
+                failures += 1
+                delay = min(MAX_RETRY_SECONDS, interval * 2 ** failures)
+                print(f"❌ Re-index failed: {e}; retrying in {delay:g}s")
+                time.sleep(delay)
+                continue
+        previous = current
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally re-index the knowledge base into the vector store")
+    parser.add_argument("--watch", action="store_true", help="keep polling the sources and re-index on change")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="seconds between polls (--watch)")
+    parser.add_argument("--provider", default=None, help="embedding provider (default: the store's, else auto)")
+    parser.add_argument("--full", action="store_true", help="re-embed every chunk (and re-fit the hashing IDF)")
+    parser.add_argument("--root", default=RAG_INDEX_DIR, help="vector store directory")
+    args = parser.parse_args()
+
+    try:
+        if args.full:
+            report(reindex(args.root, full=True, provider=args.provider), args.root)
+        if args.watch:
+            watch(args.root, interval=args.interval, provider=args.provider)
+        elif not args.full:
+            report(reindex(args.root, provider=args.provider), args.root)
+    except RuntimeError as e:
+        sys.exit(f"❌ {e}")
@@ -1,18 +1,28 @@
 import pathway as pw
 import json
+import time
 
 from pathway_pipeline.soil_twin_state import SoilState
+from pathway_pipeline.event_log import EventLog, EVENT_LOG_DIR, pipeline_event
+from pathway_pipeline.compaction import baseline_path, read_manifest
 
-def load_soil_health_card(path: str):
+def load_soil_health_card(path: str, name: str = "soil_health_card", log_dir: str = EVENT_LOG_DIR):
     """
     Reads the CSV as a static table (which acts as the initial state stream).
+    ``name`` keys the connector's offsets when persistence is enabled.
+    If the event log in ``log_dir`` was compacted, the compacted baseline
+    (same columns, older events folded in) is read instead of ``path``.
     """
+    baseline = baseline_path(path, log_dir)
+    if baseline != path:
+        print(f"🗜️  Using compacted Soil Health Card baseline: {baseline}")
     # read_csv returns a Table.
     # We want to treat it as a stream of updates (initial snapshot).
     return pw.io.csv.read(
-        path,
+        baseline,
         schema=SoilState,
-        mode="static" 
+        mode="static",
+        name=name,
     )
 
 def load_simulated_stream(path: str, schema=None):
@@ -38,3 +48,105 @@ def load_simulated_stream(path: str, schema=None):
 # that Pathway is watching.
 # Or we use Pathway's built-in demo generators.
 # For simplicity, we will assume the files exist and Pathway watches them.
+
+
+class EventLogSubject(pw.io.python.ConnectorSubject):
+    """
+    Pathway input connector over the segmented event log (event_log.py).
+
+    Tails every segment in order and emits one row per record, flattened to
+    the columns of EventLogSchema. Polls for new records when it reaches the
+    end of the log, so it behaves like the old streaming JSONL readers
+    (``follow=False`` stops there instead, for benchmarks and backfills).
+
+    With persistence enabled, the (segment, position) after each committed
+    batch is reported as the connector's offset; on restart Pathway hands it
+    back through ``_seek`` and reading resumes there instead of at byte 0.
+    Without one it starts after the last compacted segment (compaction.py),
+    whose events are already part of the SHC baseline.
+
+    There is one subject for the whole log, and it is not partitioned by
+    user: with several Pathway workers it runs on the first process and
+    its rows are exchanged to the others by user_id, so only the reducers
+    and the SHC join downstream scale with workers. Scanning and flattening
+    alone run at roughly 250k records/s on one core; handing each row to
+    Pathway costs more, and benchmark_scaling.py measures the whole path.
+    Splitting it into hash(user_id) % workers subjects would not cut that
+    cost, because user_id lives inside the JSON payload, so each partition
+    would still decode every record.
+    """
+
+    COMMIT_EVERY = 10000  # records per committed batch while catching up
+
+    def __init__(self, log_dir: str = EVENT_LOG_DIR, poll_interval: float = 0.5, follow: bool = True):
+        super().__init__()
+        self.log_dir = log_dir
+        self.poll_interval = poll_interval
+        self.follow = follow
+        manifest = read_manifest(log_dir)
+        self.segment, self.position = (manifest["through_segment"] + 1 if manifest else 0), 0
+
+    def _seek(self, state: bytes):
+        segment, position = state.decode("utf-8").split(":")
+        self.segment, self.position = int(segment), int(position)
+        print(f"⏩ Event log: resuming from segment {self.segment} at byte {self.position}")
+
+    def _commit(self):
+        # Offset and rows land in the same batch, so a checkpoint never
+        # covers records that were not emitted (or vice versa)
+        self._report_offset(f"{self.segment}:{self.position}".encode("utf-8"))
+        self.commit()
+
+    def run(self):
+        log = EventLog(self.log_dir)
+        self._disable_commits()
+        idle = False
+        while True:
+            pending = 0
+            for self.segment, self.position, record in log.scan(self.segment, self.position):
+                if idle:
+                    self._disable_commits()
+                    idle = False
+                row = pipeline_event(record)
+                if row is not None:
+                    self.next(**row)
+                pending += 1
+                if pending == self.COMMIT_EVERY:
+                    self._commit()
+                    pending = 0
+            if pending:
+                self._commit()
+            elif not self.follow:
+                break
+            else:
+                if not idle:
+                    # Nothing to emit: autocommits keep this source's time moving,
+                    # otherwise it would hold back every other input (queries included)
+                    self._enable_commits()
+                    idle = True
+                time.sleep(self.poll_interval)
+        self._commit()
+        self.close()
+
+
+def load_event_log(
+    schema,
+    log_dir: str = EVENT_LOG_DIR,
+    name: str = "event_log",
+    follow: bool = True,
+    autocommit_duration_ms: int = 50,
+):
+    """
+    Streams all farm events (rain, irrigation, fertilizer, harvest,
+    amendment) from the event log as a single table, read by one connector
+    whatever the worker count (see EventLogSubject). ``name`` keys the
+    connector's persisted offset. ``autocommit_duration_ms`` is how often
+    the idle connector advances time; the engine only finishes a batch
+    (a state query included) once every input has, so keep it short.
+    """
+    return pw.io.python.read(
+        EventLogSubject(log_dir, follow=follow),
+        schema=schema,
+        name=name,
+        autocommit_duration_ms=autocommit_duration_ms,
+    )
@@ -0,0 +1,173 @@
+"""
+Lexical Index
+BM25 over the knowledge base chunks, plus reciprocal rank fusion with vector results
+
+The chunks are the entries of seed_knowledge.json (one chunk each) and the
+paragraphs of docs/*.txt, merged up to about CHUNK_WORDS words so a chunk
+is a self-contained rule rather than a whole file. The inverted index is
+built once per process, with each posting's BM25 weight precomputed, so a
+query is one scatter-add per query term over a small array: well under a
+millisecond, with no embedder or vector server involved.
+
+``reciprocal_rank_fusion`` merges any number of ranked lists by
+sum(1 / (RRF_K + rank)), so it needs no score calibration between BM25
+and cosine similarity.
+"""
+
+import glob
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from pathway_pipeline.hashing_embedder import tokenize
+from pathway_pipeline.metadata_filter import MetadataIndex
+
+DOCS_GLOB = "./docs/*.txt"
+SEED_KNOWLEDGE_PATH = "./data/knowledge_base/seed_knowledge.json"
+CHUNK_WORDS = 80             # paragraphs are merged until a chunk reaches this many words
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60                   # the constant from Cormack et al.; damps the top ranks
+
+
+def chunk_text(text: str, max_words: int = CHUNK_WORDS) -> List[str]:
+    """Split on blank lines and merge consecutive paragraphs up to ``max_words``."""
+    chunks, current, words = [], [], 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        size = len(paragraph.split())
+        if current and words + size > max_words:
+            chunks.append("\n\n".join(current))
+            current, words = [], 0
+        current.append(paragraph)
+        words += size
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def source_files(docs_glob: str = DOCS_GLOB, seed_path: str = SEED_KNOWLEDGE_PATH) -> List[str]:
+    """Knowledge base files: the seed knowledge JSON (if present) and docs/*.txt."""
+    return ([seed_path] if os.path.exists(seed_path) else []) + sorted(glob.glob(docs_glob))
+
+
+def file_chunks(path: str, text: str = None) -> List[dict]:
+    """
+    Chunks of one source file in the vector store's chunk shape (filename,
+    chunk_id, content, metadata): one per seed knowledge entry, or the
+    merged paragraphs of a text file.
+    """
+    if text is None:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    name = os.path.basename(path)
+    if path.endswith(".json"):
+        return [
+            {"filename": name, "chunk_id": i, "content": entry["content"], "metadata": entry.get("metadata", {})}
+            for i, entry in enumerate(json.loads(text)) if entry.get("content")
+        ]
+    return [
+        {"filename": name, "chunk_id": i, "content": content, "metadata": {"source": name}}
+        for i, content in enumerate(chunk_text(text))
+    ]
+
+
+def knowledge_chunks(docs_glob: str = DOCS_GLOB, seed_path: str = SEED_KNOWLEDGE_PATH) -> List[dict]:
+    """Chunks of every knowledge base file; unreadable files are skipped with a warning."""
+    chunks = []
+    for path in source_files(docs_glob, seed_path):
+        try:
+            chunks += file_chunks(path)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"⚠️  Could not read {path}: {e}")
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of chunks."""
+
+    def __init__(self, chunks: List[dict], k1: float = BM25_K1, b: float = BM25_B):
+        self.chunks = chunks
+        self.metadata = MetadataIndex(chunks)
+        n = len(chunks)
+        terms = [Counter(tokenize(chunk.get("content", ""))) for chunk in chunks]
+        lengths = np.array([sum(t.values()) for t in terms], dtype=np.float32)
+        avg_length = float(lengths.mean()) if n and lengths.mean() > 0 else 1.0
+
+        postings = defaultdict(lambda: ([], []))
+        for doc, counts in enumerate(terms):
+            for term, tf in counts.items():
+                postings[term][0].append(doc)
+                postings[term][1].append(tf)
+        # term -> (chunk ids, precomputed BM25 weight of the term in each chunk)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, (docs, tfs) in postings.items():
+            docs = np.array(docs, dtype=np.int32)
+            tfs = np.array(tfs, dtype=np.float32)
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = k1 * (1 - b + b * lengths[docs] / avg_length)
+            self.postings[term] = (docs, (idf * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32))
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, text: str, k: int = 3, filters: dict = None) -> List[Tuple[float, dict]]:
+        """
+        Top-k chunks as (score, chunk), best first, among chunks passing
+        ``filters``; chunks sharing no term are left out.
+        """
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for term in set(tokenize(text)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        candidates = self.metadata.candidates(filters)
+        hits = np.flatnonzero(scores > 0) if candidates is None else candidates[scores[candidates] > 0]
+        if k <= 0 or hits.size == 0:
+            return []
+        if hits.size > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(float(scores[i]), self.chunks[i]) for i in hits]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[dict]], k: int = 3, rrf_k: int = RRF_K) -> List[dict]:
+    """Fuse ranked chunk lists (best first) into the top ``k``; chunks are matched by content."""
+    fused: Dict[str, float] = {}
+    chunks: Dict[str, dict] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            content = chunk.get("content", "")
+            if content:
+                fused[content] = fused.get(content, 0.0) + 1.0 / (rrf_k + rank)
+                chunks.setdefault(content, chunk)
+    best = sorted(fused, key=lambda content: -fused[content])[:k]
+    return [chunks[content] for content in best]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def lexical_index() -> BM25Index:
+    """
+    The process-wide BM25 index over the knowledge base files, built on
+    first use. Used when there is no vector store; a loaded store brings
+    its own (see IndexSnapshot.lexical), which follows re-indexing.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                chunks = knowledge_chunks()
+                _index = BM25Index(chunks)
+                print(f"📚 BM25 index built: {len(chunks)} chunks, {len(_index.postings)} terms")
+    return _index
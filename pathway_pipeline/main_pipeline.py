@@ -1,5 +1,6 @@
 import pathway as pw
 import os
+import json
 from dotenv import load_dotenv
 
 # Import our modules
@@ -7,56 +8,224 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from pathway_pipeline.soil_twin_state import SoilState, get_status
-from pathway_pipeline.ingest import load_soil_health_card
-from pathway_pipeline.streaming_logic import apply_rain_logic, apply_fertilizer_logic, apply_irrigation_logic, apply_crop_logic, apply_amendment_logic
+from pathway_pipeline.soil_twin_state import SoilState, status_expression
+from pathway_pipeline.ingest import load_soil_health_card, load_event_log
+from pathway_pipeline.event_log import EventLog, migrate_legacy_streams
+from pathway_pipeline.compaction import SHC_PATH, read_manifest
+from pathway_pipeline.streaming_logic import EVENT_EFFECTS, HARVEST_REMOVAL, AMENDMENT_CHANNELS
 
 load_dotenv()
 
 DATA_DIR = "./data"
 
-class RainSchema(pw.Schema):
-    timestamp: str
-    rain_mm: float
-    note: str
-    user_id: str
+# Checkpointing: operator state + input offsets, so a restart resumes from
+# the last snapshot instead of replaying the whole event log
+PERSISTENCE_DIR = os.getenv("PIPELINE_PERSISTENCE_DIR", f"{DATA_DIR}/pathway_state")
+SNAPSHOT_INTERVAL_MS = int(os.getenv("PIPELINE_SNAPSHOT_INTERVAL_MS", "10000"))
+
+# Live state queries: the API asks GET /state?user_id=X on this port and the
+# answer comes straight from the in-memory final_state table
+QUERY_HOST = os.getenv("PIPELINE_QUERY_HOST", "127.0.0.1")
+QUERY_PORT = int(os.getenv("PIPELINE_QUERY_PORT", "8090"))
+QUERY_COMMIT_MS = int(os.getenv("PIPELINE_QUERY_COMMIT_MS", "10"))
+# current_state.csv is now an audit trail (and the live_stream.py feed), not the API's source
+STATE_CSV = os.getenv("PIPELINE_STATE_CSV", "1") != "0"
+
+# Workers: PATHWAY_THREADS per process, several processes via `pathway spawn`
+# (start.sh passes PIPELINE_THREADS / PIPELINE_PROCESSES). Every process builds
+# the same graph; groupby and join rows are sharded across all workers by
+# user_id. The event log is still read by a single connector (see
+# ingest.EventLogSubject), so only the reducers scale. Side effects outside
+# the graph run on the first process only.
+WORKER_THREADS = int(os.getenv("PATHWAY_THREADS", "1"))
+WORKER_PROCESSES = int(os.getenv("PATHWAY_PROCESSES", "1"))
+PROCESS_ID = int(os.getenv("PATHWAY_PROCESS_ID", "0"))
+
+def persistence_config(path: str = PERSISTENCE_DIR, interval_ms: int = SNAPSHOT_INTERVAL_MS):
+    """
+    Filesystem-backed Pathway persistence for pw.run, or None when it is
+    switched off (PIPELINE_PERSISTENCE=0). Pathway only enables persistence
+    with a (free) PATHWAY_LICENSE_KEY; without one we warn and replay.
+    """
+    if os.getenv("PIPELINE_PERSISTENCE", "1") == "0":
+        return None
+    if not os.getenv("PATHWAY_LICENSE_KEY"):
+        print("⚠️  PATHWAY_LICENSE_KEY not set: running without persistence (restarts replay the full event log)")
+        return None
+    print(f"💾 Pipeline checkpoints: {path} (every {interval_ms} ms)")
+    return pw.persistence.Config(
+        pw.persistence.Backend.filesystem(path),
+        snapshot_interval_ms=interval_ms,
+        persistence_mode=pw.PersistenceMode.OPERATOR_PERSISTING,
+    )
 
 class LiveRainSchema(pw.Schema):
     timestamp: str
     rain_mm: float
     note: str
 
-class IrriSchema(pw.Schema):
+class EventLogSchema(pw.Schema):
+    """Flattened event-log record (see event_log.pipeline_event)."""
     timestamp: str
-    water_liters: float
-    note: str
+    event_type: str
     user_id: str
-
-class FertSchema(pw.Schema):
-    timestamp: str
-    type: str
-    amount_kg: float
+    amount: float
+    subtype: str
     note: str
+    event_id: str          # set by the API at ingest ("" for imported/legacy events)
+    ingested_at: float     # unix seconds the API accepted the event (0.0 if unknown)
+
+class StateQuerySchema(pw.Schema):
+    """GET /state?user_id=... on the pipeline's query port."""
     user_id: str
 
-class CropSchema(pw.Schema):
-    timestamp: str
-    event: str
-    crop_name: str
-    yield_tons: float
-    note: str
-    # user_id: str # Not using right now
+def event_channel_expression(event_type, subtype):
+    """
+    Native version of simulation_engine.event_channel: maps an event to its
+    EVENT_EFFECTS channel without calling back into Python per row.
+    """
+    subtype = subtype.str.lower()
 
-class AmendmentSchema(pw.Schema):
-    timestamp: str
-    type: str
-    amount_kg: float
-    note: str
-    # user_id: str
+    def contains(word):
+        return subtype.str.find(word) >= 0
+
+    harvest = "harvest:generic"
+    for crop in reversed([c for c in HARVEST_REMOVAL if c != "generic"]):
+        harvest = pw.if_else(contains(crop), f"harvest:{crop}", harvest)
+
+    amendment = pw.if_else(subtype == "", "amendment:manure", "amendment:none")
+    for keyword, channel in reversed(AMENDMENT_CHANNELS):
+        amendment = pw.if_else(contains(keyword), channel, amendment)
+
+    return pw.if_else(
+        event_type == "fertilizer", "fertilizer:" + subtype,
+        pw.if_else(
+            event_type == "harvest", harvest,
+            pw.if_else(event_type == "amendment", amendment, event_type)
+        )
+    )
+
+def effect_expression(channel, field):
+    """Per-unit EVENT_EFFECTS[channel][field] as a native lookup (0.0 for no effect)."""
+    coefficient = 0.0
+    for name, effects in EVENT_EFFECTS.items():
+        if effects.get(field):
+            coefficient = pw.if_else(channel == name, effects[field], coefficient)
+    return coefficient
+
+def compute_event_effects(events):
+    """
+    Summed N/P/K/moisture deltas per user, plus the id and ingest time of
+    the newest event folded in (for end-to-end latency; event ids sort by
+    ingest time, so both maxima come from the same event).
+
+    Every event is keyed to its channel and its units (amount, or 1 per
+    harvest) are scaled by the channel's coefficients with native
+    expressions, then summed once per user, so the whole computation stays
+    inside the Rust engine. The sum reads append-only event rows directly:
+    in streaming mode Pathway's float sum does not follow retractions from
+    an upstream reducer, so a (user, channel) pre-aggregate froze at its
+    first value once the pipeline went live.
+    """
+    keyed = events.select(
+        user_id=pw.this.user_id,
+        event_id=pw.this.event_id,
+        ingested_at=pw.this.ingested_at,
+        channel=event_channel_expression(pw.this.event_type, pw.this.subtype),
+        units=pw.if_else(pw.this.event_type == "harvest", 1.0, pw.this.amount),
+    )
+    deltas = keyed.select(
+        user_id=pw.this.user_id,
+        event_id=pw.this.event_id,
+        ingested_at=pw.this.ingested_at,
+        d_n=pw.this.units * effect_expression(pw.this.channel, "nitrogen"),
+        d_p=pw.this.units * effect_expression(pw.this.channel, "phosphorus"),
+        d_k=pw.this.units * effect_expression(pw.this.channel, "potassium"),
+        d_m=pw.this.units * effect_expression(pw.this.channel, "moisture"),
+    )
+    return deltas.groupby(pw.this.user_id).reduce(
+        pw.this.user_id,
+        d_n=pw.reducers.sum(pw.this.d_n),
+        d_p=pw.reducers.sum(pw.this.d_p),
+        d_k=pw.reducers.sum(pw.this.d_k),
+        d_m=pw.reducers.sum(pw.this.d_m),
+        last_event_id=pw.reducers.max(pw.this.event_id),
+        last_ingested_at=pw.reducers.max(pw.this.ingested_at),
+    )
+
+def apply_event_effects(shc_table, event_effects):
+    """Soil Health Card baseline + accumulated event deltas, with status columns."""
+    moisture = pw.this.base_m + pw.this.d_m
+    return shc_table.join_left(
+        event_effects,
+        pw.left.user_id == pw.right.user_id,
+    ).select(
+        user_id=pw.left.user_id,
+        location=pw.left.location,
+        base_n=pw.left.nitrogen,
+        base_p=pw.left.phosphorus,
+        base_k=pw.left.potassium,
+        base_m=pw.left.moisture,
+        ph=pw.left.ph,
+        organic_carbon=pw.left.organic_carbon,
+        d_n=pw.coalesce(pw.right.d_n, 0.0),
+        d_p=pw.coalesce(pw.right.d_p, 0.0),
+        d_k=pw.coalesce(pw.right.d_k, 0.0),
+        d_m=pw.coalesce(pw.right.d_m, 0.0),
+        last_event_id=pw.coalesce(pw.right.last_event_id, ""),
+        last_ingested_at=pw.coalesce(pw.right.last_ingested_at, 0.0),
+    ).select(
+        user_id=pw.this.user_id,
+        location=pw.this.location,
+        nitrogen=pw.this.base_n + pw.this.d_n,
+        phosphorus=pw.this.base_p + pw.this.d_p,
+        potassium=pw.this.base_k + pw.this.d_k,
+        moisture=pw.if_else(moisture > 100.0, 100.0, pw.if_else(moisture < 0.0, 0.0, moisture)),
+        ph=pw.this.ph,
+        organic_carbon=pw.this.organic_carbon,
+        last_event_id=pw.this.last_event_id,
+        last_ingested_at=pw.this.last_ingested_at,
+    ).select(
+        *pw.this,
+        status_n=status_expression(pw.this.nitrogen, "nitrogen"),
+        status_p=status_expression(pw.this.phosphorus, "phosphorus"),
+        status_k=status_expression(pw.this.potassium, "potassium"),
+        status_m=status_expression(pw.this.moisture, "moisture"),
+    )
+
+def serve_state_queries(final_state, host: str = QUERY_HOST, port: int = QUERY_PORT):
+    """
+    Answer "state for user_id X" over HTTP from the live final_state table.
+
+    Each query row is joined against final_state inside the engine, so the
+    reply is the consolidated row as of that commit (no CSV hop, no
+    retraction rows to fold). Unknown users get ``null``.
+    """
+    columns = final_state.column_names()
+
+    def as_row(*values):
+        return dict(zip(columns, values)) if values[0] is not None else None
+
+    queries, respond = pw.io.http.rest_connector(
+        host=host,
+        port=port,
+        route="/state",
+        schema=StateQuerySchema,
+        methods=("GET",),
+        autocommit_duration_ms=QUERY_COMMIT_MS,
+        delete_completed_queries=True,
+    )
+    answers = queries.join_left(
+        final_state, pw.left.user_id == pw.right.user_id, id=pw.left.id
+    ).select(
+        result=pw.apply_with_type(as_row, pw.Json | None, *[pw.right[c] for c in columns]),
+    )
+    respond(answers)
+    print(f"🔎 Serving live state queries on http://{host}:{port}/state?user_id=...")
 
 def run_pipeline():
     # 1. Load Static Data (The "Twin" base)
-    shc_table = load_soil_health_card(f"{DATA_DIR}/soil_health_card/sample_shc.csv")
+    shc_table = load_soil_health_card(SHC_PATH)
     shc_table = shc_table.select(
         user_id=pw.this.uid, 
         location=pw.this.location,
@@ -67,12 +236,8 @@ def run_pipeline():
         ph=pw.this.ph,
         moisture=pw.this.moisture
     )
-    pw.io.csv.write(shc_table, f"{DATA_DIR}/debug_shc.csv")
+    pw.io.csv.write(shc_table, f"{DATA_DIR}/debug_shc.csv", name="debug_shc")
     
-    # Helper to get constant UID with string type hint for Pathway
-    def get_uid(t: str) -> str:
-        return "SHC001"
-
     # LIVE WEATHER API INTEGRATION
     # Fetch and append current weather before loading the stream
     from pathway_pipeline.weather_api import stream_weather_to_jsonl
@@ -86,184 +251,61 @@ def run_pipeline():
     
     # Fetch live weather and append to stream
     live_weather_file = f"{DATA_DIR}/simulated_streams/live_weather.jsonl"
-    print(f"🌦️  Fetching live weather for {location}...")
-    stream_weather_to_jsonl(location, live_weather_file)
+    if PROCESS_ID == 0:
+        print(f"🌦️  Fetching live weather for {location}...")
+        stream_weather_to_jsonl(location, live_weather_file)
     
     # Load both live and historical rainfall data
     # Use live_weather.jsonl as primary source
     
-    # helper to add user_id if missing (for live weather which is location based, we assume "farmer" for now or broadcast)
-    # Actually live weather is just one stream. We can duplicate it for all users or just assign to one.
-    # For simplicity, assign live weather to 'farmer'
-    def add_user_farmer(x): return "farmer"
-
-    rain = pw.io.jsonlines.read(live_weather_file, schema=LiveRainSchema, mode="streaming")
+    # Live weather is location based, not per user: assign it to 'farmer' for now
+    # Short autocommit: a state query is answered only once every input has advanced
+    rain = pw.io.jsonlines.read(
+        live_weather_file, schema=LiveRainSchema, mode="streaming", name="live_weather",
+        autocommit_duration_ms=50,
+    )
+    compaction = read_manifest()
+    if compaction:
+        # Older readings are already folded into the compacted SHC baseline
+        rain = rain.filter(pw.this.timestamp >= compaction["weather_before"])
     rain = rain.select(
         timestamp=pw.this.timestamp,
-        event_type=pw.apply(lambda x: "rain", pw.this.timestamp), 
-        data=pw.apply(lambda mm: {"amount": mm}, pw.this.rain_mm),
-        user_id=pw.apply(add_user_farmer, pw.this.timestamp)
+        event_type="rain",
+        user_id="farmer",
+        amount=pw.this.rain_mm,
+        subtype="",
+        event_id="",
+        ingested_at=0.0,
     )
 
-    # Historical Rain (The user_id one we just wrote)
-    rain_stream = pw.io.jsonlines.read(f"{DATA_DIR}/simulated_streams/rainfall_stream.jsonl", schema=RainSchema, mode="streaming")
-    rain_stream = rain_stream.select(
-        timestamp=pw.this.timestamp,
-        event_type=pw.apply(lambda x: "rain", pw.this.timestamp),
-        data=pw.apply(lambda mm: {"amount": mm}, pw.this.rain_mm),
-        user_id=pw.this.user_id
-    )
-    # Combine live and historical
-    rain = rain.promise_universes_are_disjoint(rain_stream).concat(rain_stream)
+    # Farm events (rain, irrigation, fertilizer, harvest, amendment) all come
+    # from the segmented event log the API appends to. The old per-type JSONL
+    # files are imported once on first start.
+    if PROCESS_ID == 0:
+        migrated = migrate_legacy_streams(EventLog())
+        if migrated:
+            print(f"📦 Imported {migrated} legacy stream events into the event log")
 
-    fert = pw.io.jsonlines.read(f"{DATA_DIR}/simulated_streams/fertilizer_events.jsonl", schema=FertSchema, mode="streaming")
-    fert = fert.select(
+    log_events = load_event_log(EventLogSchema)
+    log_events = log_events.select(
         timestamp=pw.this.timestamp,
-        event_type=pw.apply(lambda x: "fertilizer", pw.this.timestamp),
-        data=pw.apply(lambda t, a: {"type": t, "amount": a}, pw.this.type, pw.this.amount_kg),
-        user_id=pw.this.user_id
-    )
-    
-    irri = pw.io.jsonlines.read(f"{DATA_DIR}/simulated_streams/irrigation_events.jsonl", schema=IrriSchema, mode="streaming")
-    irri = irri.select(
-        timestamp=pw.this.timestamp,
-        event_type=pw.apply(lambda x: "irrigation", pw.this.timestamp),
-        data=pw.apply(lambda l: {"liters": l}, pw.this.water_liters),
-        user_id=pw.this.user_id
+        event_type=pw.this.event_type,
+        user_id=pw.this.user_id,
+        amount=pw.this.amount,
+        subtype=pw.this.subtype,
+        event_id=pw.this.event_id,
+        ingested_at=pw.this.ingested_at,
     )
 
-    # Note: crops still json? Let's leave it unless we migrate fully.
-    # We will just not use crops for now to avoid breaking if schema mismatch
-    # (Or we can just comment out crop/amend if they aren't critical for the demo yet)
-    # Let's keep them but assume they might fail if no user_id. 
-    # Actually, let's skip crop/amend for now to ensure stability of the main 3 streams.
-    
-    # Union all events
-    # Promise universes are disjoint for static files (safe here)
-    events = rain.promise_universes_are_disjoint(fert).concat(fert)
-    events = events.promise_universes_are_disjoint(irri).concat(irri)
+    # Union live weather with the logged events
+    events = rain.promise_universes_are_disjoint(log_events).concat(log_events)
     
     # print("DEBUG: Events Columns:", events.keys())
 
     # 3. Stateful Reducer
-    # We iterate over events, grouped by UID, and update the state.
-    
-    # Define helper to compute deltas per event
-    def compute_deltas(event_type, data):
-        dn, dp, dk, dm = 0.0, 0.0, 0.0, 0.0
-        
-        # Rain
-        if event_type == "rain":
-            # data is a Json object, use [] access
-            mm = data["amount"] if "amount" in data else 0
-            dm += (mm * 0.4)
-            dn -= (mm * 0.8) # Leaching
-        
-        # Irrigation
-        elif event_type == "irrigation":
-            liters = data["liters"] if "liters" in data else 0
-            dm += (liters / 10000.0 * 5.0)
-        
-        # Consultant
-        elif event_type == "fertilizer":
-            ftype = data["type"].lower() if "type" in data else ""
-            amt = data["amount"] if "amount" in data else 0
-            if ftype == 'urea': dn += (amt * 0.46)
-            elif ftype == 'dap': 
-                dn += (amt * 0.18)
-                dp += (amt * 0.46)
-            elif ftype == 'potash': dk += (amt * 0.60)
-            
-        # Harvest
-        elif event_type == "harvest":
-            cname = data["crop"].lower() if "crop" in data else ""
-            if "wheat" in cname:
-                dn -= 80.0
-                dp -= 15.0
-                dk -= 60.0
-            elif "rice" in cname:
-                dn -= 90.0
-                dp -= 20.0
-                dk -= 70.0
-            else:
-                dn -= 50.0
-                dp -= 10.0
-                dk -= 40.0
-
-        # Amendment
-        elif event_type == "amendment":
-            atype = data["type"].lower() if "type" in data else ""
-            amt = data["amount"] if "amount" in data else 0
-            if "manure" in atype:
-                dn += (amt * 0.005)
-                dp += (amt * 0.002)
-                dk += (amt * 0.005)
-            
-        return (dn, dp, dk, dm)
-
-    # Apply compute_deltas to get a struct/tuple of changes
-    events_processed = events.select(
-        user_id=pw.this.user_id,
-        deltas=pw.apply(compute_deltas, pw.this.event_type, pw.this.data)
-    )
-
-    # Now reduce by summing and casting to float (since applies return ANY)
-    event_effects = events_processed.groupby(pw.this.user_id).reduce(
-        d_n=pw.reducers.sum(pw.apply(float, pw.this.deltas[0])),
-        d_p=pw.reducers.sum(pw.apply(float, pw.this.deltas[1])),
-        d_k=pw.reducers.sum(pw.apply(float, pw.this.deltas[2])),
-        d_m=pw.reducers.sum(pw.apply(float, pw.this.deltas[3]))
-    )
-    
-    # Materialize 'user_id' in event_effects as ANY type to match Join (STR vs ANY)
-    event_effects = event_effects.select(
-        d_n=pw.this.d_n,
-        d_p=pw.this.d_p,
-        d_k=pw.this.d_k,
-        d_m=pw.this.d_m,
-        user_id=pw.apply(lambda x: x, pw.this.id) # Casts to ANY
-    )
-    
-    # Also cast shc_table user_id to ANY to match event_effects
-    shc_table_view = shc_table.select(
-        user_id=pw.apply(lambda x: x, pw.this.user_id),
-        location=pw.this.location,
-        base_n=pw.this.nitrogen,
-        base_p=pw.this.phosphorus,
-        base_k=pw.this.potassium,
-        base_m=pw.this.moisture,
-        base_ph=pw.this.ph,
-        base_oc=pw.this.organic_carbon
-    )
-    
-    # Join Effects with Initial State
-    # Left join ensuring we satisfy all UIDs in SHC
-    final_state = shc_table_view.join_left(
-        event_effects,
-        pw.left.user_id == pw.right.user_id,
-    ).select(
-        user_id=pw.left.user_id, # ANY type now
-        location=pw.left.location,
-        nitrogen=pw.this.base_n + pw.coalesce(pw.this.d_n, 0.0),
-        phosphorus=pw.this.base_p + pw.coalesce(pw.this.d_p, 0.0),
-        potassium=pw.this.base_k + pw.coalesce(pw.this.d_k, 0.0),
-        moisture=pw.apply(lambda m, d: min(100.0, max(0.0, m + d)), pw.this.base_m, pw.coalesce(pw.this.d_m, 0.0)),
-        ph=pw.this.base_ph,
-        organic_carbon=pw.this.base_oc,
-    ).select(
-        user_id=pw.this.user_id,
-        location=pw.this.location,
-        nitrogen=pw.this.nitrogen,
-        phosphorus=pw.this.phosphorus,
-        potassium=pw.this.potassium,
-        moisture=pw.this.moisture,
-        ph=pw.this.ph,
-        organic_carbon=pw.this.organic_carbon,
-        status_n=pw.apply(lambda v: get_status(v, "nitrogen"), pw.this.nitrogen),
-        status_p=pw.apply(lambda v: get_status(v, "phosphorus"), pw.this.phosphorus),
-        status_k=pw.apply(lambda v: get_status(v, "potassium"), pw.this.potassium),
-        status_m=pw.apply(lambda v: get_status(v, "moisture"), pw.this.moisture)
-    )
+    # Per-user sums of table-driven deltas, applied on top of the SHC baseline
+    event_effects = compute_event_effects(events)
+    final_state = apply_event_effects(shc_table, event_effects)
     
     # Expose as a table for API to query
     
@@ -273,17 +315,23 @@ def run_pipeline():
     events_log = events.select(
         timestamp=events.timestamp,
         event_type=events.event_type,
-        details=pw.apply(str, events.data), # Convert dict to string for CSV
-        user_id=events.user_id
+        amount=events.amount,
+        subtype=events.subtype,
+        user_id=events.user_id,
+        event_id=events.event_id,
+        ingested_at=events.ingested_at,
     )
-    pw.io.csv.write(events_log, f"{DATA_DIR}/recent_events.csv")
+    pw.io.csv.write(events_log, f"{DATA_DIR}/recent_events.csv", name="recent_events")
     
-    # Write Current State to CSV for API to read
-    # Write Current State to CSV for API to read
-    pw.io.csv.write(final_state, f"{DATA_DIR}/current_state.csv")
+    # The API reads state through the query endpoint; the CSV is an optional audit sink
+    serve_state_queries(final_state)
+    if STATE_CSV:
+        pw.io.csv.write(final_state, f"{DATA_DIR}/current_state.csv", name="current_state")
     
     return final_state
 
 if __name__ == "__main__":
+    if PROCESS_ID == 0:
+        print(f"⚙️  Pathway workers: {WORKER_PROCESSES} process(es) x {WORKER_THREADS} thread(s)")
     run_pipeline()
-    pw.run()
+    pw.run(persistence_config=persistence_config())
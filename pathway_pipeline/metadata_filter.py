@@ -0,0 +1,107 @@
+"""
+Metadata Filter
+Inverted index over chunk metadata, and retrieval filters derived from the live soil state
+
+Seed knowledge chunks carry structured metadata (nutrient, crop, region,
+collection, weather_sensitive, ...). ``MetadataIndex`` maps each
+(field, value) to the chunk ids that have it, so a filter resolves to a
+candidate id array with a few boolean-mask operations, and vector
+scoring then runs over that subset only.
+
+A filter is {field: allowed values}. A chunk passes a field if it has
+one of the allowed values or does not have the field at all: general
+guidance (no ``crop``) stays eligible when the farmer grows wheat, while
+rice-specific rules are pruned.
+"""
+
+import re
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+STATUS_NUTRIENTS = {"status_n": "nitrogen", "status_p": "phosphorus", "status_k": "potassium"}
+FILTER_STATUSES = ("red",)           # statuses that narrow retrieval to that nutrient
+NUTRIENT_WORDS = {
+    "nitrogen": ("nitrogen", "urea", "yellowing"),
+    "phosphorus": ("phosphorus", "phosphate", "dap", "ssp"),
+    "potassium": ("potassium", "potash", "mop"),
+}
+CROP_WORDS = ("wheat", "rice", "paddy", "maize", "cotton", "sugarcane", "mustard", "soybean", "pulses")
+CROP_ALIASES = {"paddy": "rice"}
+COUNTRY_CODES = {"IN": "india"}
+
+WORD_RE = re.compile(r"\w+")
+
+
+def _normalize(value) -> str:
+    return str(value).strip().lower()
+
+
+class MetadataIndex:
+    """(field, value) -> chunk ids, over a fixed list of chunks."""
+
+    def __init__(self, chunks: List[dict]):
+        self.size = len(chunks)
+        postings: Dict[str, Dict[str, List[int]]] = {}
+        for i, chunk in enumerate(chunks):
+            for field, value in (chunk.get("metadata") or {}).items():
+                if value is not None and value != "":
+                    postings.setdefault(field, {}).setdefault(_normalize(value), []).append(i)
+        # field -> value -> chunk ids, and field -> ids of every chunk that has the field
+        self._values = {field: {value: np.array(ids, dtype=np.int64) for value, ids in values.items()}
+                        for field, values in postings.items()}
+        self._has_field = {field: np.concatenate(list(values.values())) for field, values in self._values.items()}
+
+    def candidates(self, filters: Optional[Dict[str, Set[str]]]) -> Optional[np.ndarray]:
+        """Sorted ids of chunks passing ``filters``; None when nothing is filtered out."""
+        excluded = np.zeros(self.size, dtype=bool)
+        for field, allowed in (filters or {}).items():
+            having = self._has_field.get(field)
+            if having is None or not allowed:
+                continue
+            # Chunks with this field but none of the allowed values
+            field_excluded = np.zeros(self.size, dtype=bool)
+            field_excluded[having] = True
+            for value in allowed:
+                ids = self._values[field].get(_normalize(value))
+                if ids is not None:
+                    field_excluded[ids] = False
+            excluded |= field_excluded
+        if not excluded.any():
+            return None
+        return np.flatnonzero(~excluded)
+
+
+def filter_from_state(state: Optional[dict], question: str = "") -> Dict[str, Set[str]]:
+    """
+    Retrieval filter for a farmer: nutrients flagged red in the live state
+    (plus any the question names), the crop from the state or question, and
+    the country of the farm's location. Fields with nothing to go on are
+    left unfiltered.
+    """
+    state = state if isinstance(state, dict) else {}
+    words = set(WORD_RE.findall(question.lower()))
+    filters: Dict[str, Set[str]] = {}
+
+    nutrients = {nutrient for column, nutrient in STATUS_NUTRIENTS.items()
+                 if _normalize(state.get(column, "")) in FILTER_STATUSES}
+    if nutrients:
+        # A question about another nutrient widens the filter rather than missing its answer
+        nutrients |= {nutrient for nutrient, cues in NUTRIENT_WORDS.items() if words.intersection(cues)}
+        filters["nutrient"] = nutrients
+
+    crops = {_normalize(state["crop"])} if state.get("crop") else set()
+    crops |= {CROP_ALIASES.get(crop, crop) for crop in CROP_WORDS if crop in words}
+    if crops:
+        filters["crop"] = crops
+
+    location = str(state.get("location") or "").split()
+    country = COUNTRY_CODES.get(location[-1].upper()) if location else None
+    if country:
+        filters["region"] = {country, _normalize(" ".join(location[:-1]))}
+        filters["country"] = {country}
+    return filters
+
+
+def describe(filters: Dict[str, Set[str]]) -> str:
+    return ", ".join(f"{field}={'|'.join(sorted(values))}" for field, values in sorted(filters.items())) or "none"
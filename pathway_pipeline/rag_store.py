@@ -45,6 +45,9 @@ def setup_rag_store(docs_folder: str = "./docs"):
             # Fallback to local embeddings
             from pathway_pipeline.embedding_service import EmbeddingService
             local_embedder = EmbeddingService(provider="local")
+            if not local_embedder.provider:
+                # No sentence-transformers/torch: hashed n-gram embeddings still give usable retrieval
+                local_embedder = EmbeddingService(provider="mock")
             
             # Create custom Pathway embedder wrapper
             class LocalEmbedder:
@@ -127,8 +130,9 @@ def query_vector_store(vector_store, question: str, k: int = 3):
     Query the Pathway vector store for relevant documents.
 
     Uses the Pathway VectorStoreClient to send an HTTP query to the
-    running VectorStoreServer (default port 8666). Falls back to direct
-    file loading if the server is not yet available.
+    running VectorStoreServer (default port 8666). Falls back to BM25
+    over the docs and seed knowledge chunks if the server is not yet
+    available.
 
     Args:
         vector_store: VectorStoreServer instance (used to confirm initialisation)
@@ -169,20 +173,15 @@ def query_vector_store(vector_store, question: str, k: int = 3):
     except Exception as http_err:
         print(f"⚠️  HTTP RAG query error: {http_err}. Falling back to file loading.")
 
-    # --- Tertiary: direct file loading (offline fallback) ---
+    # --- Tertiary: in-process BM25 over the knowledge chunks (offline fallback) ---
     try:
-        import os
-        docs_folder = "./docs"
-        all_text = []
-        for fname in os.listdir(docs_folder):
-            if fname.endswith(".txt"):
-                with open(os.path.join(docs_folder, fname), "r", encoding="utf-8") as fh:
-                    all_text.append(fh.read())
-        if all_text:
-            print("📄 Using direct docs file loading as RAG fallback")
-            return all_text[:k]
+        from pathway_pipeline.lexical_index import lexical_index
+        chunks = [chunk["content"] for _, chunk in lexical_index().search(question, k)]
+        if chunks:
+            print(f"📄 BM25 fallback retrieved {len(chunks)} chunks")
+            return chunks
     except Exception as file_err:
-        print(f"❌ File fallback error: {file_err}")
+        print(f"❌ BM25 fallback error: {file_err}")
 
     return []
 
@@ -47,3 +47,18 @@ def get_status(value: float, nutrient: str) -> str:
         return "green" # High/Sufficient (Note: Too high might differ, but for simplicity green)
     else:
         return "yellow" # Medium
+
+def status_expression(value, nutrient: str):
+    """
+    Same rules as get_status, built as a native Pathway expression so the
+    status columns are computed by the engine instead of a Python UDF.
+    """
+    if nutrient not in THRESHOLDS:
+        return "unknown"
+    
+    t = THRESHOLDS[nutrient]
+    
+    if nutrient == 'ph':
+        return pw.if_else((value >= t['min']) & (value <= t['max']), "green", "red")
+    
+    return pw.if_else(value < t['low'], "red", pw.if_else(value > t['high'], "green", "yellow"))
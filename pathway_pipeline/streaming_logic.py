@@ -1,4 +1,5 @@
-import pathway as pw
+# Pure rule definitions: the Pathway pipeline and the NumPy forward
+# simulator (backend/simulation_engine.py) share these coefficients.
 
 # Fertilizer conversion factors (Source: FCO India)
 # How much of the nutrient is available in 1kg of fertilizer?
@@ -20,6 +21,54 @@ MOISTURE_IRRIGATION_FACTOR = 0.0005 # % increase per liter? No, let's say per li
 # Simplified: 1mm rain ~ 10,000 liters/hectare. 
 # Let's keep logic simple: Input is likely just "Irrigation Event" or "Liters".
 # If liters, we need area. Assume 2 acres (0.8 ha) from profile.
+# Simplified: 10k liters = ~5% moisture boost for demo
+IRRIGATION_MOISTURE_PER_LITER = 5.0 / 10000.0
+
+# Nutrient removal (kg/ha) per harvest, by crop
+HARVEST_REMOVAL = {
+    'wheat': {'nitrogen': 80.0, 'phosphorus': 15.0, 'potassium': 60.0},
+    'rice': {'nitrogen': 90.0, 'phosphorus': 20.0, 'potassium': 70.0},
+    'generic': {'nitrogen': 50.0, 'phosphorus': 10.0, 'potassium': 40.0},
+}
+
+# pH change per kg of amendment (1 ton lime = +1 pH, 1 ton gypsum = -0.5 pH)
+LIME_PH_PER_KG = 1.0 / 1000.0
+GYPSUM_PH_PER_KG = -0.5 / 1000.0
+
+# Manure / compost: 1 ton ~ +0.05% OC, plus roughly 0.5-0.2-0.5 NPK %
+MANURE_EFFECT = {'organic_carbon': 0.05 / 1000.0, 'nitrogen': 0.005, 'phosphorus': 0.002, 'potassium': 0.005}
+
+def harvest_crop_key(crop_name):
+    """Which HARVEST_REMOVAL row applies to a crop name."""
+    crop = crop_name.lower()
+    if "wheat" in crop:
+        return 'wheat'
+    if "rice" in crop:
+        return 'rice'
+    return 'generic'
+
+# Amendment keyword -> effect channel (first match wins)
+AMENDMENT_CHANNELS = (
+    ('lime', 'amendment:lime'),
+    ('gypsum', 'amendment:gypsum'),
+    ('manure', 'amendment:manure'),
+    ('compost', 'amendment:manure'),
+)
+
+# Per-unit effect of every event "channel" on the soil state. Channels are
+# rain (per mm), irrigation (per liter), fertilizer:<type> and
+# amendment:<kind> (per kg) and harvest:<crop> (per harvest). The pipeline
+# compiles it into native lookup expressions and the forward simulator turns
+# it into a matrix, so both always apply the same rules.
+EVENT_EFFECTS = {
+    'rain': {'nitrogen': -LEACHING_COEFF_N, 'moisture': MOISTURE_RAIN_FACTOR},
+    'irrigation': {'moisture': IRRIGATION_MOISTURE_PER_LITER},
+    **{f'fertilizer:{name}': dict(comp) for name, comp in TRANSFORMATIONS.items()},
+    **{f'harvest:{crop}': {k: -v for k, v in removal.items()} for crop, removal in HARVEST_REMOVAL.items()},
+    'amendment:lime': {'ph': LIME_PH_PER_KG},
+    'amendment:gypsum': {'ph': GYPSUM_PH_PER_KG},
+    'amendment:manure': dict(MANURE_EFFECT),
+}
 
 def apply_rain_logic(state, rain_mm):
     """
@@ -77,8 +126,7 @@ def apply_irrigation_logic(state, liters):
     """
     Simple moisture boost.
     """
-    # Simplified: 10k liters = ~5% moisture boost for demo
-    boost = (liters / 10000.0) * 5.0 
+    boost = liters * IRRIGATION_MOISTURE_PER_LITER
     new_m = min(100.0, state['moisture'] + boost)
     return state.with_columns(moisture=new_m)
 
@@ -87,26 +135,14 @@ def apply_crop_logic(state, crop_event, crop_name):
     Simulates nutrient removal during Harvest.
     """
     event = crop_event.lower()
-    crop = crop_name.lower()
     
     updates = {}
     
     if event == "harvest":
         # Nutrient removal (kg/ha) estimates for typical yield
-        # Wheat: ~100kg N, ~20kg P, ~80kg K per harvest (Simulated)
-        if "wheat" in crop:
-            updates['nitrogen'] = max(0.0, state['nitrogen'] - 80.0)
-            updates['phosphorus'] = max(0.0, state['phosphorus'] - 15.0)
-            updates['potassium'] = max(0.0, state['potassium'] - 60.0)
-        elif "rice" in crop:
-            updates['nitrogen'] = max(0.0, state['nitrogen'] - 90.0)
-            updates['phosphorus'] = max(0.0, state['phosphorus'] - 20.0)
-            updates['potassium'] = max(0.0, state['potassium'] - 70.0)
-        else:
-            # Generic
-            updates['nitrogen'] = max(0.0, state['nitrogen'] - 50.0)
-            updates['phosphorus'] = max(0.0, state['phosphorus'] - 10.0)
-            updates['potassium'] = max(0.0, state['potassium'] - 40.0)
+        removal = HARVEST_REMOVAL[harvest_crop_key(crop_name)]
+        for nutrient, kg in removal.items():
+            updates[nutrient] = max(0.0, state[nutrient] - kg)
             
     return state.with_columns(**updates)
 
@@ -120,23 +156,15 @@ def apply_amendment_logic(state, amendment_type, amount_kg):
     # pH Modification
     if "lime" in atype:
         # Lime increases pH. Rate: 100kg ~ +0.1 pH (Approx demo rule)
-        pH_change = (amount_kg / 1000.0) * 1.0 # 1 ton = +1 pH
-        updates['ph'] = min(14.0, state['ph'] + pH_change)
+        updates['ph'] = min(14.0, state['ph'] + amount_kg * LIME_PH_PER_KG)
         
     elif "gypsum" in atype:
         # Gypsum reduces pH (for alkaline soil). 
-        pH_change = (amount_kg / 1000.0) * 0.5 
-        updates['ph'] = max(0.0, state['ph'] - pH_change)
+        updates['ph'] = max(0.0, state['ph'] + amount_kg * GYPSUM_PH_PER_KG)
         
     elif "manure" in atype or "compost" in atype:
         # Organic Carbon boost + some nutrients
-        # 1 ton (1000kg) ~ +0.05% OC
-        oc_change = (amount_kg / 1000.0) * 0.05
-        updates['organic_carbon'] = state['organic_carbon'] + oc_change
-        
-        # Manure also adds NPK (roughly 0.5-0.2-0.5 NPK %)
-        updates['nitrogen'] = state['nitrogen'] + (amount_kg * 0.005)
-        updates['phosphorus'] = state['phosphorus'] + (amount_kg * 0.002)
-        updates['potassium'] = state['potassium'] + (amount_kg * 0.005)
+        for field, per_kg in MANURE_EFFECT.items():
+            updates[field] = state[field] + (amount_kg * per_kg)
         
     return state.with_columns(**updates)
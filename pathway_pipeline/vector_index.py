@@ -0,0 +1,294 @@
+"""
+In-Process Vector Index
+Top-k retrieval over the precomputed chunk embeddings in cache/rag_index/, without a vector server hop
+
+The index is the memory-mapped store written by vector_store: a query
+scans the int8 matrix in blocks (matrix-vector product, ``argpartition``),
+then rescores the best RESCORE_CANDIDATES rows against their float32
+vectors, so the ranking that comes back is exact cosine. A legacy
+rag_vectors.json (``documents`` + ``embeddings``) still loads into an
+in-memory float32 matrix. The manifest (or JSON file) is re-stat'ed at
+most once per RELOAD_CHECK_SECONDS and swapped in atomically when it
+changes, so re-indexing never needs an API restart.
+
+``hybrid_query`` fuses these results with BM25 over the knowledge base
+(lexical_index) by reciprocal rank fusion, and still answers from BM25
+alone when no embedder or cache file is available. Both rankings can be
+restricted to the chunks passing a metadata filter (metadata_filter),
+in which case only that subset is scored.
+
+The index also records the ``provider`` and ``model`` that embedded it;
+queries are embedded with the same provider, and refused (with a warning)
+if the model no longer matches. It is (re)built from docs/ and the seed
+knowledge base by the indexer:
+
+    python pathway_pipeline/indexer.py [--watch]
+"""
+
+import json
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from pathway_pipeline.metadata_filter import MetadataIndex
+from pathway_pipeline.vector_store import MANIFEST, RAG_INDEX_DIR, load_store, normalize, read_embedder_state
+
+RAG_VECTORS_PATH = os.getenv("RAG_VECTORS_PATH", RAG_INDEX_DIR)     # store directory, or a legacy .json cache
+RELOAD_CHECK_SECONDS = 1.0
+HYBRID_CANDIDATES = 20       # depth of each ranked list fed to the fusion
+RESCORE_CANDIDATES = 32      # int8 scan shortlist rescored in float32 (at least 4 x k)
+SCAN_BLOCK_ROWS = 512        # int8 rows widened to float32 at a time (stays in L2 cache)
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first."""
+    if k < scores.shape[0]:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(scores.shape[0])
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class IndexSnapshot:
+    """
+    One immutable load of the index. ``matrix`` holds unit rows (in memory
+    or memory-mapped); with ``quantized`` / ``scales`` the search scans the
+    int8 copy and only reads ``matrix`` rows to rescore its shortlist.
+    """
+
+    def __init__(self, documents: List[dict], matrix, signature: tuple, provider: str = "auto",
+                 model: Optional[str] = None, quantized=None, scales=None):
+        self.matrix = matrix
+        self.quantized = quantized
+        self.scales = scales
+        self.documents = documents
+        self.metadata = MetadataIndex(documents)
+        self.signature = signature
+        self.provider = provider
+        self.model = model
+        self._lexical = None
+
+    @classmethod
+    def from_embeddings(cls, documents: List[dict], embeddings, signature: tuple, provider: str = "auto",
+                        model: Optional[str] = None) -> "IndexSnapshot":
+        return cls(documents, normalize(embeddings, len(documents)), signature, provider, model)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    @property
+    def lexical(self):
+        """BM25 over this snapshot's chunks, built on first use, so it is swapped along with the vectors."""
+        if self._lexical is None:
+            from pathway_pipeline.lexical_index import BM25Index
+            self._lexical = BM25Index(self.documents)
+        return self._lexical
+
+    @property
+    def storage(self) -> str:
+        return "json" if self.quantized is None else "mmap-int8"
+
+    def _scan(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Approximate cosine from the int8 matrix, for all rows or just ``rows``."""
+        total = len(self.documents) if rows is None else rows.shape[0]
+        scores = np.empty(total, dtype=np.float32)
+        for start in range(0, total, SCAN_BLOCK_ROWS):
+            end = min(total, start + SCAN_BLOCK_ROWS)
+            selection = slice(start, end) if rows is None else rows[start:end]
+            scores[start:end] = (self.quantized[selection].astype(np.float32) @ query) * self.scales[selection]
+        return scores
+
+    def search(self, vector, k: int, filters: dict = None) -> List[Tuple[float, dict]]:
+        """Cosine top-k as (score, document), best first, among documents passing ``filters``."""
+        candidates = self.metadata.candidates(filters)
+        n = len(self.documents) if candidates is None else candidates.shape[0]
+        if n == 0 or k <= 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32).ravel()
+        if query.shape[0] != self.dim:
+            return []
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+
+        if self.quantized is None:
+            matrix = self.matrix if candidates is None else self.matrix[candidates]
+            scores = matrix @ query
+            top = _top(scores, k)
+            rows = top if candidates is None else candidates[top]
+            return [(float(score), self.documents[row]) for score, row in zip(scores[top], rows)]
+
+        shortlist = _top(self._scan(query, candidates), max(RESCORE_CANDIDATES, 4 * k))
+        rows = np.sort(shortlist if candidates is None else candidates[shortlist])
+        exact = np.asarray(self.matrix[rows], dtype=np.float32) @ query
+        return [(float(exact[i]), self.documents[rows[i]]) for i in _top(exact, k)]
+
+
+class VectorIndex:
+    """
+    Hot-reloading wrapper around IndexSnapshot. Queries read whatever
+    snapshot is current; a reload builds the new one off to the side and
+    replaces the reference in one assignment.
+    """
+
+    def __init__(self, path: str = RAG_VECTORS_PATH, embedder=None):
+        self.path = path
+        self.snapshot: Optional[IndexSnapshot] = None
+        self._embedder = embedder
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self.reloads = 0
+        self._mismatch_warned = False
+        self._owns_embedder = embedder is None
+        self.hybrid_queries = 0
+        self.lexical_only = 0
+        self.filtered_queries = 0
+
+    def _signature(self) -> Optional[tuple]:
+        path = os.path.join(self.path, MANIFEST) if os.path.isdir(self.path) else self.path
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def refresh(self, force: bool = False) -> Optional[IndexSnapshot]:
+        """Reload the index if it changed since the last load."""
+        now = time.monotonic()
+        if not force and self.snapshot is not None and now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return self.snapshot
+        with self._lock:
+            self._checked_at = now
+            signature = self._signature()
+            if signature is None:
+                return self.snapshot
+            if not force and self.snapshot is not None and self.snapshot.signature == signature:
+                return self.snapshot
+            try:
+                snapshot = self._load(signature)
+            except (OSError, ValueError, KeyError) as e:
+                # Half-written or malformed index: keep serving the previous snapshot
+                print(f"⚠️  Could not load {self.path}: {e}")
+                return self.snapshot
+            self.snapshot = snapshot
+            self.reloads += 1
+            self._mismatch_warned = False
+            print(f"📚 Vector index loaded: {len(snapshot.documents)} chunks x {snapshot.dim} dims "
+                  f"({snapshot.storage}) from {self.path}")
+            return snapshot
+
+    def _load(self, signature: tuple) -> IndexSnapshot:
+        if os.path.isdir(self.path):
+            manifest, documents, quantized, scales, matrix = load_store(self.path)
+            return IndexSnapshot(documents, matrix, signature, manifest.get("provider", "auto"),
+                                 manifest.get("model"), quantized, scales)
+        with open(self.path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        return IndexSnapshot.from_embeddings(cache.get("documents", []), cache.get("embeddings", []), signature,
+                                             cache.get("provider", "auto"), cache.get("model"))
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            from pathway_pipeline.embedding_service import EmbeddingService
+            provider = self.snapshot.provider if self.snapshot is not None else "auto"
+            self._embedder = EmbeddingService(provider=provider, hashing_model=self._hashing_model())
+        return self._embedder
+
+    def _hashing_model(self):
+        """The hashing embedder the store was built with, so queries use its IDF."""
+        if not os.path.isdir(self.path):
+            return None
+        try:
+            state = read_embedder_state(self.path)
+            if state:
+                from pathway_pipeline.hashing_embedder import HashingEmbedder
+                return HashingEmbedder(state=state)
+        except (OSError, KeyError, TypeError, ValueError) as e:
+            print(f"⚠️  Could not load the store's hashing IDF: {e}")
+        return None
+
+    def search(self, vector, k: int = 3, filters: dict = None) -> List[Tuple[float, dict]]:
+        snapshot = self.refresh()
+        return snapshot.search(vector, k, filters) if snapshot is not None else []
+
+    def query(self, text: str, k: int = 3) -> List[str]:
+        """Chunk texts most similar to ``text``; empty if the index or embedder is unavailable."""
+        return [doc.get("content", "") for doc in self.search_text(text, k) if doc.get("content")]
+
+    def hybrid_query(self, text: str, k: int = 3, filters: dict = None) -> List[str]:
+        """
+        Chunk texts from vector and BM25 rankings fused by RRF; BM25 alone if
+        vectors are unavailable. ``filters`` (see metadata_filter) prunes
+        both rankings; if nothing passes it, the query is retried unfiltered.
+        """
+        from pathway_pipeline.lexical_index import lexical_index, reciprocal_rank_fusion
+
+        try:
+            semantic = self.search_text(text, HYBRID_CANDIDATES, filters)
+        except Exception as e:
+            print(f"⚠️  Vector search failed, using BM25 only: {e}")
+            semantic = []
+        snapshot = self.snapshot
+        bm25 = snapshot.lexical if snapshot is not None else lexical_index()
+        lexical = [chunk for _, chunk in bm25.search(text, HYBRID_CANDIDATES, filters)]
+        if filters and not semantic and not lexical:
+            return self.hybrid_query(text, k)
+        self.hybrid_queries += 1
+        if filters:
+            self.filtered_queries += 1
+        if not semantic:
+            self.lexical_only += 1
+        return [chunk["content"] for chunk in reciprocal_rank_fusion([semantic, lexical], k)]
+
+    def search_text(self, text: str, k: int = 3, filters: dict = None) -> List[dict]:
+        """Documents most similar to ``text``, best first, among those passing ``filters``."""
+        snapshot = self.refresh()
+        if snapshot is None:
+            return []
+        vector = self.embedder.embed(text)
+        if vector is None:
+            return []
+        model = getattr(self.embedder, "model_name", None)
+        if self._owns_embedder and snapshot.model and model and model != snapshot.model and not self._mismatch_warned:
+            # Re-indexed with another model (or, for hashing embeddings, a new corpus IDF): follow it
+            print(f"🔄 Index model changed from {model} to {snapshot.model}; reloading the embedder")
+            self._embedder = None
+            vector = self.embedder.embed(text)
+            if vector is None:
+                return []
+            model = getattr(self.embedder, "model_name", None)
+        if len(vector) != snapshot.dim or (snapshot.model and model and model != snapshot.model):
+            if not self._mismatch_warned:
+                self._mismatch_warned = True
+                print(f"⚠️  Query embeddings ({model}, {len(vector)} dims) do not match {self.path} "
+                      f"({snapshot.model or snapshot.provider}, {snapshot.dim} dims); re-index with the same provider")
+            return []
+        return [doc for _, doc in snapshot.search(vector, k, filters)]
+
+    def stats(self) -> dict:
+        snapshot = self.snapshot
+        cache = getattr(self._embedder, "cache", None)
+        return {
+            "path": self.path,
+            "chunks": len(snapshot.documents) if snapshot is not None else 0,
+            "dims": snapshot.dim if snapshot is not None else None,
+            "storage": snapshot.storage if snapshot is not None else None,
+            "model": snapshot.model if snapshot is not None else None,
+            "reloads": self.reloads,
+            "hybrid_queries": self.hybrid_queries,
+            "lexical_only_queries": self.lexical_only,
+            "filtered_queries": self.filtered_queries,
+            "embedder": getattr(self._embedder, "provider", None),
+            "embedding_cache": cache.stats() if cache is not None else None,
+        }
+
+
+# Shared by the API process; loads lazily on the first query
+rag_index = VectorIndex()
+
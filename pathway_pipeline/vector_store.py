@@ -0,0 +1,163 @@
+"""
+Vector Store
+Binary, memory-mapped chunk embeddings: int8 for scanning, float32 for rescoring, plus a chunk table
+
+Layout under cache/rag_index/:
+    manifest.json          current version, provider, model, count, dims, source files
+    <version>.i8.npy       (count, dims) int8, each row scaled to +-127
+    <version>.scale.npy    (count,) float32 per-row scale back to unit length
+    <version>.f32.npy      (count, dims) float32 unit vectors, read only for rescoring
+    <version>.chunks.json  filename, chunk_id, content, metadata per row
+    <version>.embedder.json  fitted hashing embedder (IDF), if it embedded the store
+
+The .npy files are opened with ``np.load(mmap_mode="r")``, so loading is a
+few page-table entries rather than a JSON parse, and every uvicorn worker
+shares the same page-cache copy instead of holding its own. Scans touch the
+int8 matrix (a quarter of float32); only the few rows that reach the
+rescoring step are read from the float32 file.
+
+A write puts a new version's files next to the old ones and then replaces
+manifest.json in one rename, so readers see either the old index or the new
+one. Files older than the previous version are removed afterwards.
+"""
+
+import json
+import os
+import sys
+import time
+from typing import List, Optional
+
+import numpy as np
+
+RAG_INDEX_DIR = "./cache/rag_index"
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def quantize(matrix: np.ndarray):
+    """Unit rows -> (int8 rows, per-row float32 scale) with row ~= int8 * scale."""
+    peaks = np.abs(matrix).max(axis=1)
+    peaks[peaks == 0] = 1.0
+    scales = (peaks / 127.0).astype(np.float32)
+    quantized = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales
+
+
+def normalize(embeddings, count: int) -> np.ndarray:
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(count, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _write_atomic(path: str, write):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_manifest(root: str = RAG_INDEX_DIR) -> Optional[dict]:
+    try:
+        with open(os.path.join(root, MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_store(documents: List[dict], embeddings, provider: str, model: str, root: str = RAG_INDEX_DIR,
+                sources: Optional[dict] = None, embedder_state: Optional[dict] = None) -> dict:
+    """
+    Write a new version of the store and make it current; returns its
+    manifest. ``sources`` (file name -> size / mtime / sha256, see indexer)
+    is recorded so the next incremental run can skip unchanged files.
+    ``embedder_state`` (HashingEmbedder.state()) pins the hashing IDF, so
+    queries and later incremental runs embed exactly as this version did.
+    """
+    if not documents:
+        raise ValueError("refusing to write an empty vector store")
+    os.makedirs(root, exist_ok=True)
+    matrix = normalize(embeddings, len(documents))
+    quantized, scales = quantize(matrix)
+    version = f"{time.time_ns():016x}"
+    files = {
+        "int8": f"{version}.i8.npy",
+        "scale": f"{version}.scale.npy",
+        "float32": f"{version}.f32.npy",
+        "chunks": f"{version}.chunks.json",
+    }
+    for key, array in (("int8", quantized), ("scale", scales), ("float32", matrix)):
+        _write_atomic(os.path.join(root, files[key]), lambda f, a=array: np.save(f, a))
+    _write_atomic(
+        os.path.join(root, files["chunks"]),
+        lambda f: f.write(json.dumps(documents, ensure_ascii=False, separators=(",", ":")).encode("utf-8")),
+    )
+    if embedder_state is not None:
+        files["embedder"] = f"{version}.embedder.json"
+        _write_atomic(
+            os.path.join(root, files["embedder"]),
+            lambda f: f.write(json.dumps(embedder_state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")),
+        )
+
+    previous = read_manifest(root)
+    manifest = {
+        "format": FORMAT_VERSION,
+        "version": version,
+        "provider": provider,
+        "model": model,
+        "count": len(documents),
+        "dims": int(matrix.shape[1]),
+        "files": files,
+        "sources": sources or {},
+        "created_at": time.time(),
+    }
+    _write_atomic(os.path.join(root, MANIFEST), lambda f: f.write(json.dumps(manifest, indent=2).encode("utf-8")))
+
+    # Keep the previous version for readers that read its manifest a moment ago
+    keep = set(files.values()) | set((previous or {}).get("files", {}).values()) | {MANIFEST}
+    for name in os.listdir(root):
+        if name not in keep and not name.endswith(".tmp") and name.split(".")[-1] in ("npy", "json"):
+            try:
+                os.remove(os.path.join(root, name))
+            except OSError:
+                pass
+    return manifest
+
+
+def read_embedder_state(root: str = RAG_INDEX_DIR, manifest: Optional[dict] = None) -> Optional[dict]:
+    """The hashing embedder state the current version was built with, or None."""
+    manifest = manifest if manifest is not None else read_manifest(root)
+    name = (manifest or {}).get("files", {}).get("embedder")
+    if not name:
+        return None
+    with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_store(root: str = RAG_INDEX_DIR):
+    """(manifest, documents, int8 memmap, scales, float32 memmap) for the current version."""
+    manifest = read_manifest(root)
+    if manifest is None:
+        raise FileNotFoundError(os.path.join(root, MANIFEST))
+    files = manifest["files"]
+    with open(os.path.join(root, files["chunks"]), "r", encoding="utf-8") as f:
+        documents = json.load(f)
+    quantized = np.load(os.path.join(root, files["int8"]), mmap_mode="r")
+    scales = np.load(os.path.join(root, files["scale"]))
+    matrix = np.load(os.path.join(root, files["float32"]), mmap_mode="r")
+    if not (len(documents) == quantized.shape[0] == scales.shape[0] == matrix.shape[0]):
+        raise ValueError(f"{root} version {manifest['version']} has mismatched row counts")
+    return manifest, documents, quantized, scales, matrix
+
+
+if __name__ == "__main__":
+    # Convert a legacy rag_vectors.json (documents + embeddings) without re-embedding
+    source = sys.argv[1] if len(sys.argv) > 1 else "./cache/rag_vectors.json"
+    target = sys.argv[2] if len(sys.argv) > 2 else RAG_INDEX_DIR
+    with open(source, "r", encoding="utf-8") as f:
+        cache = json.load(f)
+    manifest = write_store(cache.get("documents", []), cache.get("embeddings", []),
+                           cache.get("provider", "auto"), cache.get("model"), target)
+    print(f"✅ Wrote {manifest['count']} chunks x {manifest['dims']} dims to {target} (version {manifest['version']})")
@@ -131,6 +131,7 @@ def get_forecast(location="Karnal,IN", days=5):
                 "timestamp": item.get("dt_txt"),
                 "temperature": item.get("main", {}).get("temp"),
                 "rainfall_mm": item.get("rain", {}).get("3h", 0.0),
+                "rain_probability": item.get("pop", 0.0),  # 0-1 chance of precipitation
                 "description": item.get("weather", [{}])[0].get("description", "")
             })
         
@@ -140,6 +141,22 @@ def get_forecast(location="Karnal,IN", days=5):
         return []
 
 
+def get_daily_rain_forecast(location="Karnal,IN", days=5):
+    """
+    Forecast rolled up to one entry per day: total rain (mm) and the highest
+    3-hourly chance of rain. Returns [] if the forecast is unavailable.
+    """
+    daily = {}
+    for item in get_forecast(location, days):
+        date = (item.get("timestamp") or "")[:10]
+        if not date:
+            continue
+        day = daily.setdefault(date, {"date": date, "rain_mm": 0.0, "rain_probability": 0.0})
+        day["rain_mm"] += item.get("rainfall_mm") or 0.0
+        day["rain_probability"] = max(day["rain_probability"], item.get("rain_probability") or 0.0)
+    return [daily[d] for d in sorted(daily)][:days]
+
+
 if __name__ == "__main__":
     # Test the API
     print("Testing Weather API...")
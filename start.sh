@@ -57,12 +57,14 @@ stop_servers() {
     
     # Kill by port
     kill_port 8000
+    kill_port 8765
     kill_port 5173
     
     # Kill by process name
     pkill -9 -f "uvicorn main:app" 2>/dev/null || true
     pkill -9 -f "vite" 2>/dev/null || true
     pkill -9 -f "pathway_pipeline/main_pipeline.py" 2>/dev/null || true
+    pkill -9 -f "pathway_pipeline/indexer.py" 2>/dev/null || true
     
     # Clean PID files
     rm -f "$PID_DIR"/*.pid
@@ -95,6 +97,49 @@ start_backend() {
     fi
 }
 
+# Start live soil-state push server (WebSocket, port 8765)
+start_live_stream() {
+    log_info "Starting live stream server..."
+    
+    cd "$PROJECT_DIR"
+    
+    nohup python3 -m uvicorn backend.live_stream:app --port 8765 \
+        > "$LOGS_DIR/live_stream.log" 2>&1 &
+    
+    local pid=$!
+    echo $pid > "$PID_DIR/live_stream.pid"
+    
+    if check_health "http://localhost:8765/" 15; then
+        log_info "✅ Live stream started on ws://localhost:8765/live"
+        return 0
+    else
+        log_warn "Live stream failed to start; dashboards will not receive push updates"
+        return 1
+    fi
+}
+
+# Start knowledge base watcher (re-embeds changed docs/ chunks into cache/rag_index/)
+start_indexer() {
+    log_info "Starting knowledge indexer..."
+    
+    cd "$PROJECT_DIR"
+    
+    nohup python3 pathway_pipeline/indexer.py --watch \
+        > "$LOGS_DIR/indexer.log" 2>&1 &
+    
+    local pid=$!
+    echo $pid > "$PID_DIR/indexer.pid"
+    
+    sleep 1
+    if kill -0 $pid 2>/dev/null; then
+        log_info "✅ Knowledge indexer watching docs/ and seed_knowledge.json"
+        return 0
+    else
+        log_warn "Knowledge indexer failed to start; docs/ edits need a manual re-index"
+        return 1
+    fi
+}
+
 # Start frontend server
 start_frontend() {
     log_info "Starting frontend server..."
@@ -137,7 +182,10 @@ start_pipeline() {
     # main_pipeline might need project root in path.
     export PYTHONPATH=$PYTHONPATH:.
     
-    nohup python3 pathway_pipeline/main_pipeline.py \
+    # Worker threads per process and process count (see PIPELINE_THREADS in .env.example)
+    nohup python3 -m pathway spawn \
+        --threads "${PIPELINE_THREADS:-1}" --processes "${PIPELINE_PROCESSES:-1}" \
+        python3 pathway_pipeline/main_pipeline.py \
         > "$LOGS_DIR/pipeline.log" 2>&1 &
         
     local pid=$!
@@ -200,6 +248,12 @@ start() {
         exit 1
     fi
     
+    # Start live push channel (non-fatal)
+    start_live_stream || true
+    
+    # Start knowledge indexer (non-fatal)
+    start_indexer || true
+    
     sleep 2
     
     # Start frontend